@@ -0,0 +1,443 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import metabar
+
+
+ETAPAS = ['separa_corridas', 'aplica_threshold', 'aplica_threshold_agrupado', 'conta_ocorrencias_gerais', 'separa_filtros',
+          'conta_ocorrencias', 'calcula_reads_especie', 'constroi_tabela_final', 'consolida_resultados', 'salva_resultados']
+
+
+def gera_tabela(linhas, corridas=4, areas=5, amostradores=2, pontos=6, taxons=500, idioma='eng', semente=0):
+    """Generates a synthetic table of metabarcoding results after Blast, with the columns of the input files.
+
+    Taxa follow a Zipf distribution (a few very common taxa and a long tail of rare ones) and reads follow a
+    lognormal distribution, so most OTUs/ASVs have few reads and a few have many, as in real runs.
+
+    Parameters:
+    linhas (int): Number of rows (OTUs/ASVs).
+    corridas (int): Number of sequencing samples.
+    areas (int): Number of sampling areas.
+    amostradores (int): Number of samplers.
+    pontos (int): Number of points per area.
+    taxons (int): Number of distinct taxa.
+    idioma (str): Column names of the table, Portuguese ("pt-br") or English ("eng").
+    semente (int): Seed of the random generator.
+
+    Returns:
+    df (DataFrame): Synthetic table, with the curated taxon column filled with the taxon.
+    """
+    gerador = np.random.default_rng(semente)
+
+    nomes_amostradores = ['MQ', 'MC'] + [f'S{i}' for i in range(3, amostradores + 1)]
+    nomes_amostradores = np.array(nomes_amostradores[:amostradores])
+    nomes_corridas = np.array([f'P{i:02d}' for i in range(1, corridas + 1)])
+    nomes_taxons = np.array([f'Taxon {i}' for i in range(1, taxons + 1)])
+
+    area = gerador.integers(1, areas + 1, linhas)
+    amostrador = gerador.integers(0, amostradores, linhas)
+    area_amostrador = pd.Series(area).astype(str).radd('A') + '_' + nomes_amostradores[amostrador]
+    taxon = (gerador.zipf(1.3, linhas) - 1) % taxons
+    reads = np.ceil(gerador.lognormal(2.0, 2.0, linhas)).astype('int64')
+
+    if idioma == 'pt-br':
+        colunas = ['amostra_sequenciamento', 'barcode', 'tag', 'area_amostrador', 'ponto', 'aliquota', 'otu/asv', 'n_reads', '%_id',
+                   'taxon', 'taxon_final_curada']
+    else:
+        colunas = ['sequencing_sample', 'barcode', 'tag', 'area_sampler', 'point', 'aliquot', 'otu/asv', 'n_reads', '%_id', 'taxon',
+                   'final_taxon_curated']
+
+    valores = [nomes_corridas[gerador.integers(0, corridas, linhas)], '12SrRNA', gerador.integers(0, 26, linhas).astype(str),
+               area_amostrador, gerador.integers(1, pontos + 1, linhas), 1, np.arange(1, linhas + 1), reads,
+               np.round(gerador.uniform(97, 100, linhas), 2), nomes_taxons[taxon], nomes_taxons[taxon]]
+
+    df = pd.DataFrame(dict(zip(colunas, valores)))
+    return df
+
+
+def versao_repositorio():
+    """Identifies the code being measured.
+
+    Returns:
+    versao (str): Current git commit (with "+" when there are uncommitted changes), or "" outside a git repository.
+    """
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=pasta, capture_output=True, text=True, check=True).stdout.strip()
+        alterado = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=pasta, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+    return commit + ('+' if alterado else '')
+
+
+def mede(funcao, repeticoes):
+    """Measures the run time and the peak memory of a function.
+
+    Time is the best of the repetitions, measured without tracing; peak memory is measured on a separate
+    traced run, as the highest memory allocated by Python and NumPy above the memory in use at its start.
+
+    Parameters:
+    funcao (callable): Function without arguments.
+    repeticoes (int): Number of timed runs.
+
+    Returns:
+    resultado: Value returned by the function.
+    segundos (float): Best run time, in seconds.
+    pico_mb (float): Peak memory, in MiB.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return resultado, min(tempos), pico / 1024 ** 2
+
+
+def executa_tamanho(df, amostradores=False, areas=True, repeticoes=3, formato='xlsx', threshold_perc=0.05):
+    """Measures every stage function on one synthetic table.
+
+    The stages are run in the order of the program, each one on the output of the previous ones.
+
+    Parameters:
+    df (DataFrame): Synthetic table (see gera_tabela).
+    amostradores (bool): Indicates filtering by sampler.
+    areas (bool): Indicates filtering by area.
+    repeticoes (int): Number of timed runs of each stage.
+    formato (str): Extension of the results saved by salva_resultados.
+    threshold_perc (float): Percentage value for threshold calculation.
+
+    Returns:
+    medidas (list): One dictionary per stage with the stage, rows in, rows out, time and peak memory.
+    """
+    df = metabar.normaliza_tabela(df)
+    medidas = []
+
+    def registra(etapa, funcao, linhas_entrada, linhas_saida=None):
+        resultado, segundos, pico_mb = mede(funcao, repeticoes)
+        if callable(linhas_saida):
+            linhas_saida = linhas_saida(resultado)
+        medidas.append({'stage': etapa, 'rows_in': int(linhas_entrada), 'rows_out': None if linhas_saida is None else int(linhas_saida),
+                        'seconds': segundos, 'peak_mb': pico_mb})
+        return resultado
+
+    def conta_linhas(tabelas):
+        if isinstance(tabelas, pd.DataFrame):
+            return len(tabelas)
+        if isinstance(tabelas, dict):
+            return sum(conta_linhas(tabela) for tabela in tabelas.values())
+        return sum(conta_linhas(tabela) for tabela in tabelas)
+
+    corridas = registra('separa_corridas', lambda: metabar.separa_corridas(df), len(df), conta_linhas)
+    selecionados, _, _ = registra('aplica_threshold', lambda: metabar.aplica_threshold(corridas, threshold_perc), len(df),
+                                  lambda resultado: conta_linhas(resultado[0]))
+    registra('aplica_threshold_agrupado', lambda: metabar.aplica_threshold_agrupado(df, threshold_perc), len(df),
+             lambda resultado: len(resultado[0]))
+
+    curada = metabar.concatena_dfs(selecionados)
+    lista_areas = sorted(metabar.define_areas(curada))
+    if 'area_amostrador' in curada.columns:
+        coluna_area_amostrador = 'area_amostrador'
+    elif 'area_sampler' in curada.columns:
+        coluna_area_amostrador = 'area_sampler'
+    lista_amostradores = sorted({valor.split('_', 1)[-1] for valor in curada[coluna_area_amostrador].unique()})
+
+    registra('conta_ocorrencias_gerais', lambda: metabar.conta_ocorrencias_gerais(curada, lista_areas), len(curada), len)
+
+    def separa_filtros():
+        indice = metabar.indexa_particoes(curada)
+        if amostradores and areas:
+            return metabar.separa_areas(lista_areas, amostradores=metabar.separa_amostradores(curada, lista_amostradores, indice))
+        elif amostradores:
+            return metabar.separa_amostradores(curada, lista_amostradores, indice)
+        return metabar.separa_areas(lista_areas, df=curada, indice=indice)
+
+    dfs = registra('separa_filtros', separa_filtros, len(curada), conta_linhas)
+    ocorrencias = registra('conta_ocorrencias', lambda: metabar.conta_ocorrencias(dfs, amostradores, areas), len(curada), conta_linhas)
+    reads = registra('calcula_reads_especie', lambda: metabar.calcula_reads_especie(dfs, amostradores, areas), len(curada), conta_linhas)
+    tabelas_finais = registra('constroi_tabela_final', lambda: metabar.constroi_tabela_final(reads, ocorrencias, amostradores, areas),
+                              conta_linhas(reads), conta_linhas)
+    registra('consolida_resultados', lambda: metabar.consolida_resultados(curada, lista_areas, lista_amostradores, amostradores, areas),
+             len(curada), conta_linhas)
+
+    with tempfile.TemporaryDirectory(prefix='ednanalyzer_benchmark_') as pasta:
+        caminho = os.path.join(pasta, f'resultados.{formato}')
+        registra('salva_resultados', lambda: metabar.salva_resultados(tabelas_finais, caminho, amostrador=amostradores, area=areas),
+                 conta_linhas(tabelas_finais))
+
+    return medidas
+
+
+def executa_benchmark(tamanhos, repeticoes=3, por_amostrador=False, por_area=True, formato='xlsx', etapas=None, **configuracoes):
+    """Runs the benchmark for several table sizes.
+
+    Parameters:
+    tamanhos (list): Numbers of rows of the synthetic tables.
+    repeticoes (int): Number of timed runs of each stage.
+    por_amostrador (bool): Indicates filtering by sampler.
+    por_area (bool): Indicates filtering by area.
+    formato (str): Extension of the results saved by salva_resultados.
+    etapas (list): Stages kept in the report (all when None).
+    **configuracoes: Shape of the synthetic tables (see gera_tabela).
+
+    Returns:
+    relatorio (dict): Code version, environment, settings and one measurement per stage and size.
+    """
+    medidas = []
+    for linhas in tamanhos:
+        df = gera_tabela(linhas, **configuracoes)
+        for medida in executa_tamanho(df, por_amostrador, por_area, repeticoes, formato):
+            if etapas is None or medida['stage'] in etapas:
+                medidas.append({'rows': linhas, **medida})
+
+    relatorio = {'version': versao_repositorio(), 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                 'pandas': pd.__version__, 'numpy': np.__version__, 'platform': platform.platform(),
+                 'settings': {'sizes': list(tamanhos), 'repeat': repeticoes, 'by_sampler': por_amostrador, 'by_area': por_area,
+                              'format': formato, **configuracoes},
+                 'results': medidas}
+    return relatorio
+
+
+def compara_resultados(resultado, referencia, verificacao):
+    """Checks that two stage results (dataframes, or tuples, lists and dictionaries of them) are identical.
+
+    Parameters:
+    resultado: Result being checked.
+    referencia: Reference result.
+    verificacao (str): Description of the check, shown when the results differ.
+    """
+    if isinstance(referencia, pd.DataFrame):
+        try:
+            pd.testing.assert_frame_equal(resultado, referencia, check_exact=True)
+        except AssertionError as erro:
+            raise AssertionError(f'{verificacao}: {erro}') from None
+    elif isinstance(referencia, dict):
+        assert list(resultado) == list(referencia), f'{verificacao}: keys {list(resultado)} != {list(referencia)}'
+        for chave in referencia:
+            compara_resultados(resultado[chave], referencia[chave], verificacao)
+    elif isinstance(referencia, (list, tuple)):
+        assert len(resultado) == len(referencia), f'{verificacao}: {len(resultado)} != {len(referencia)} items'
+        for item, item_referencia in zip(resultado, referencia):
+            compara_resultados(item, item_referencia, verificacao)
+    else:
+        assert resultado == referencia, f'{verificacao}: {resultado!r} != {referencia!r}'
+
+
+def verifica_paridade(linhas, vazios=0.05, threshold_perc=0.05, **configuracoes):
+    """Checks that every way of reading a table gives the same results on a table with empty cells.
+
+    The synthetic table gets empty curated taxon and n_reads cells, as in real spreadsheets, and is saved as .csv,
+    .xlsx and .otus. The pyarrow CSV parser, the .xlsx reader and the compact kernels must give the same threshold and
+    consolidation by sampler and area as the C parser, the polars and duckdb engines the same consolidation as pandas,
+    and the streaming threshold must write the same files as the in-memory one. The grouped threshold of the downcast
+    table, with an integer percentage, must also match aplica_threshold on the table as generated and on small reads
+    whose sums overflow int16, and each row of the threshold sweep must match aplica_threshold_agrupado at its
+    percentage, with the n_reads of the first row also emptied.
+
+    Parameters:
+    linhas (int): Number of rows of the synthetic table.
+    vazios (float): Fraction of the rows with an empty curated taxon (a tenth of it also gets an empty n_reads).
+    threshold_perc (float): Percentage value for threshold calculation.
+    **configuracoes: Shape of the synthetic table (see gera_tabela).
+
+    Returns:
+    verificacoes (list): Description of each check, all passed (AssertionError is raised on the first difference).
+    """
+    df = gera_tabela(linhas, **configuracoes)
+    gerador = np.random.default_rng(configuracoes.get('semente', 0) + 1)
+    df.loc[gerador.random(linhas) < vazios, df.columns[-1]] = np.nan
+    df.loc[gerador.random(linhas) < vazios / 10, 'n_reads'] = np.nan
+    coluna_area_amostrador = df.columns[3]
+    lista_amostradores = sorted({valor.split('_', 1)[-1] for valor in df[coluna_area_amostrador].unique()})
+
+    verificacoes = []
+    motor_csv = metabar.MOTOR_CSV
+    with tempfile.TemporaryDirectory(prefix='ednanalyzer_check_') as pasta:
+        entradas = {formato: os.path.join(pasta, f'entrada.{formato}') for formato in ('csv', 'xlsx', 'otus')}
+        for caminho in entradas.values():
+            metabar.salva_tabela(df, caminho, index=False)
+
+        def executa(caminho, **kwargs):
+            threshold = metabar.executa_threshold(caminho, threshold_perc, **kwargs)[:3]
+            consolidacao = metabar.executa_consolidacao(caminho, lista_amostradores, True, True, **kwargs)[:2]
+            return threshold, consolidacao
+
+        try:
+            metabar.MOTOR_CSV = 'c'
+            referencia = executa(entradas['csv'])
+            if importlib.util.find_spec('pyarrow') is not None:
+                metabar.MOTOR_CSV = 'pyarrow'
+                compara_resultados(executa(entradas['csv']), referencia, f'{linhas} rows, .csv read with the pyarrow parser')
+                verificacoes.append(f'{linhas} rows, .csv read with the pyarrow parser')
+        finally:
+            metabar.MOTOR_CSV = motor_csv
+        for formato in ('xlsx', 'otus'):
+            compara_resultados(executa(entradas[formato]), referencia, f'{linhas} rows, .{formato} input')
+            verificacoes.append(f'{linhas} rows, .{formato} input')
+
+        for motor in metabar.MOTORES_PROCESSAMENTO[1:]:
+            verificacao = f'{linhas} rows, consolidation with {motor}'
+            compara_resultados(metabar.executa_consolidacao(entradas['csv'], lista_amostradores, True, True, motor=motor)[:2],
+                               referencia[1], verificacao)
+            verificacoes.append(verificacao)
+
+        saidas = {}
+        for streaming in (False, True):
+            saidas[streaming] = [os.path.join(pasta, f'{nome}_{streaming}.csv') for nome in ('selecionados', 'nao_selecionados', 'thresholds')]
+            metabar.processa_threshold(entradas['csv'], threshold_perc, *saidas[streaming], streaming=streaming)
+        for caminho, caminho_referencia in zip(saidas[True], saidas[False]):
+            with open(caminho, 'rb') as arquivo, open(caminho_referencia, 'rb') as arquivo_referencia:
+                assert arquivo.read() == arquivo_referencia.read(), f'{linhas} rows, streaming threshold: {os.path.basename(caminho)} differs'
+        verificacoes.append(f'{linhas} rows, streaming threshold')
+
+    motores = [motor for motor in metabar.MOTORES_PROCESSAMENTO if motor != 'duckdb']
+    tabelas = {f'{linhas} rows': df.dropna().astype({'n_reads': 'int64'}),
+               'int16 reads': pd.DataFrame({df.columns[0]: 'P01', 'n_reads': [7000, 7000, 100, 50]})}
+    for nome, tabela in tabelas.items():
+        selecionados, _, thresholds = metabar.aplica_threshold(metabar.separa_corridas(tabela), 5)
+        for motor in motores:
+            verificacao = f'{nome}, grouped threshold of 5% with {motor}'
+            selecionados_agrupado, _, thresholds_agrupado = metabar.aplica_threshold_agrupado(metabar.normaliza_tabela(tabela), 5,
+                                                                                               motor=motor)
+            compara_resultados(thresholds_agrupado['Threshold'].to_dict(), thresholds['Threshold'].to_dict(), verificacao)
+            compara_resultados({corrida: len(tabela) for corrida, tabela in selecionados_agrupado.items()},
+                               {corrida: len(tabela) for corrida, tabela in selecionados.items()}, verificacao)
+            verificacoes.append(verificacao)
+
+    tabela = metabar.normaliza_tabela(df.assign(n_reads=df['n_reads'].mask(df.index == 0)))
+    percentuais = [threshold_perc, 1, 5]
+    varredura = metabar.varredura_threshold(tabela, percentuais)
+    assert varredura['Reads'].dtype == 'int64', f'{linhas} rows, threshold sweep: Reads is {varredura["Reads"].dtype}'
+    for perc in percentuais:
+        verificacao = f'{linhas} rows, threshold sweep at {perc}%'
+        selecionados, _, thresholds = metabar.aplica_threshold_agrupado(tabela, perc)
+        linhas_varredura = varredura[varredura['Threshold (%)'] == perc]
+        compara_resultados({corrida: (threshold, otus, reads) for corrida, threshold, otus, reads in
+                            zip(linhas_varredura[df.columns[0]], linhas_varredura['Threshold'], linhas_varredura['OTUs/ASVs'],
+                                linhas_varredura['Reads'])},
+                           {corrida: (threshold, len(selecionados.get(corrida, [])),
+                                      int(selecionados[corrida]['n_reads'].sum()) if corrida in selecionados else 0)
+                            for corrida, threshold in thresholds['Threshold'].items()}, verificacao)
+        verificacoes.append(verificacao)
+
+    return verificacoes
+
+
+def compara_relatorios(relatorio, referencia):
+    """Compares the measurements of two benchmark reports, stage by stage and size by size.
+
+    Parameters:
+    relatorio (dict): Current report.
+    referencia (dict): Report used as reference, usually from an earlier commit.
+
+    Returns:
+    df_comparacao (DataFrame): Time and peak memory of both reports and their ratio (current / reference).
+    """
+    atual = pd.DataFrame(relatorio['results']).set_index(['stage', 'rows'])[['seconds', 'peak_mb']]
+    anterior = pd.DataFrame(referencia['results']).set_index(['stage', 'rows'])[['seconds', 'peak_mb']]
+
+    df_comparacao = anterior.join(atual, how='inner', lsuffix='_reference', rsuffix='_current')
+    df_comparacao['time_ratio'] = df_comparacao['seconds_current'] / df_comparacao['seconds_reference']
+    df_comparacao['memory_ratio'] = df_comparacao['peak_mb_current'] / df_comparacao['peak_mb_reference']
+    return df_comparacao
+
+
+def cria_parser():
+    """Builds the command line parser of the benchmark.
+
+    Returns:
+    parser (ArgumentParser): Parser for the command line arguments.
+    """
+    parser = argparse.ArgumentParser(prog='benchmark',
+                                     description='Measures the time and peak memory of the metabar stage functions on synthetic tables.')
+    parser.add_argument('--sizes', dest='tamanhos', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Numbers of rows of the synthetic tables (default: 1000 10000 100000).')
+    parser.add_argument('--repeat', dest='repeticoes', type=int, default=3, help='Timed runs of each stage; the best is kept (default: 3).')
+    parser.add_argument('--runs', dest='corridas', type=int, default=4, help='Sequencing samples (default: 4).')
+    parser.add_argument('--areas', dest='areas', type=int, default=5, help='Sampling areas (default: 5).')
+    parser.add_argument('--samplers', dest='amostradores', type=int, default=2, help='Samplers (default: 2).')
+    parser.add_argument('--points', dest='pontos', type=int, default=6, help='Points per area (default: 6).')
+    parser.add_argument('--taxa', dest='taxons', type=int, default=500, help='Distinct taxa (default: 500).')
+    parser.add_argument('--language', dest='idioma', choices=['eng', 'pt-br'], default='eng', help='Column names of the tables (default: eng).')
+    parser.add_argument('--seed', dest='semente', type=int, default=0, help='Seed of the random generator (default: 0).')
+    parser.add_argument('--by-sampler', dest='por_amostrador', action='store_true', help='Measures the consolidation by sampler.')
+    parser.add_argument('--by-area', dest='por_area', action='store_true',
+                        help='Measures the consolidation by area (the default when --by-sampler is not given).')
+    parser.add_argument('--format', dest='formato', choices=['xlsx', 'zip', 'parquet', 'feather', 'arrow'], default='xlsx',
+                        help='Format of the saved results (default: xlsx).')
+    parser.add_argument('--stages', dest='etapas', nargs='+', choices=ETAPAS, help='Stages kept in the report (default: all).')
+    parser.add_argument('-o', '--output', dest='saida', help='JSON file where the report is saved.')
+    parser.add_argument('--compare', dest='referencia', help='JSON report of an earlier run to compare with.')
+    parser.add_argument('--check', dest='verificar', action='store_true',
+                        help='Checks that the input formats, parsers, streaming threshold and grouped threshold give the same results on '
+                             'tables with empty cells, instead of measuring the stages.')
+    return parser
+
+
+def main(argv=None):
+    """Runs the benchmark from the command line.
+
+    Parameters:
+    argv (list): Command line arguments (sys.argv is used when None).
+
+    Returns:
+    codigo (int): Exit status, 0 on success.
+    """
+    argumentos = cria_parser().parse_args(argv)
+    por_area = argumentos.por_area or not argumentos.por_amostrador
+
+    if argumentos.verificar:
+        try:
+            for linhas in argumentos.tamanhos:
+                for verificacao in verifica_paridade(linhas, corridas=argumentos.corridas, areas=argumentos.areas,
+                                                     amostradores=argumentos.amostradores, pontos=argumentos.pontos,
+                                                     taxons=argumentos.taxons, idioma=argumentos.idioma, semente=argumentos.semente):
+                    print(f'ok {verificacao}')
+        except AssertionError as erro:
+            print(f'FAILED {erro}', file=sys.stderr)
+            return 1
+        return 0
+
+    relatorio = executa_benchmark(argumentos.tamanhos, argumentos.repeticoes, argumentos.por_amostrador, por_area, argumentos.formato,
+                                  argumentos.etapas, corridas=argumentos.corridas, areas=argumentos.areas,
+                                  amostradores=argumentos.amostradores, pontos=argumentos.pontos, taxons=argumentos.taxons,
+                                  idioma=argumentos.idioma, semente=argumentos.semente)
+
+    with pd.option_context('display.width', 160, 'display.max_rows', None, 'display.max_columns', None, 'display.float_format', '{:.4f}'.format):
+        print(pd.DataFrame(relatorio['results']).set_index(['stage', 'rows']).unstack('rows')[['seconds', 'peak_mb']])
+
+        if argumentos.referencia:
+            with open(argumentos.referencia, encoding='utf-8') as arquivo:
+                referencia = json.load(arquivo)
+            print(f"\nCompared with {referencia.get('version') or argumentos.referencia}:")
+            print(compara_relatorios(relatorio, referencia))
+
+    if argumentos.saida:
+        with open(argumentos.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
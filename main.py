@@ -1,12 +1,60 @@
-from metabar import *
+import time
+INICIO_PROGRAMA = time.perf_counter()
+
 import tkinter as tk
 from tkinter.filedialog import askopenfilename, asksaveasfilename
 from tkinter import ttk
-import pandas as pd
 from PIL import Image, ImageTk
+import importlib.util
+import multiprocessing
 import os
+import shutil
+import sys
+import tempfile
 import threading
 import queue
+import zipfile
+
+TEMPO_IMPORTACAO_INTERFACE = time.perf_counter() - INICIO_PROGRAMA
+
+META_INICIO = 1.0
+RELATORIO_INICIO = '--import-report' in sys.argv or os.environ.get('EDNANALYZER_IMPORT_REPORT') == '1'
+PERFIL_EXECUCAO = '--profile' in sys.argv or os.environ.get('EDNANALYZER_PROFILE') == '1'
+POLARS_DISPONIVEL = importlib.util.find_spec('polars') is not None
+DUCKDB_DISPONIVEL = importlib.util.find_spec('duckdb') is not None
+LIMITE_STREAMING = int(os.environ.get('EDNANALYZER_STREAMING_BYTES', 2 * 1024 ** 3))
+
+
+COMPRESSOES_ZIP = {
+    'eng': {'Stored (fastest)': (zipfile.ZIP_STORED, None),
+            'Deflate - fast': (zipfile.ZIP_DEFLATED, 1),
+            'Deflate - balanced': (zipfile.ZIP_DEFLATED, 6),
+            'Deflate - smallest': (zipfile.ZIP_DEFLATED, 9),
+            'LZMA - smallest, slow': (zipfile.ZIP_LZMA, None)},
+    'pt-br': {'Sem compressão (mais rápido)': (zipfile.ZIP_STORED, None),
+              'Deflate - rápido': (zipfile.ZIP_DEFLATED, 1),
+              'Deflate - equilibrado': (zipfile.ZIP_DEFLATED, 6),
+              'Deflate - menor arquivo': (zipfile.ZIP_DEFLATED, 9),
+              'LZMA - menor arquivo, lento': (zipfile.ZIP_LZMA, None)},
+}
+
+
+ETAPAS_PRIMARIAS = ['leitura', 'threshold', 'concatenacao']
+ETAPAS_SECUNDARIAS = ['leitura', 'lista_geral', 'consolidacao']
+ETAPAS_PIPELINE = ['leitura', 'threshold', 'concatenacao', 'lista_geral', 'consolidacao']
+
+NOMES_ETAPAS = {
+    'eng': {'leitura': 'Reading file', 'threshold': 'Applying threshold', 'concatenacao': 'Joining tables',
+            'lista_geral': 'Building general list', 'consolidacao': 'Consolidating results', 'curadoria': 'Applying curation',
+            'gravacao': 'Saving file', 'cache': 'Result cache', 'transferencia': 'Sending tables'},
+    'pt-br': {'leitura': 'Lendo arquivo', 'threshold': 'Aplicando threshold', 'concatenacao': 'Juntando tabelas',
+              'lista_geral': 'Montando lista geral', 'consolidacao': 'Consolidando resultados', 'curadoria': 'Aplicando curadoria',
+              'gravacao': 'Salvando arquivo', 'cache': 'Cache de resultados', 'transferencia': 'Enviando tabelas'},
+}
+
+
+TIPOS_COLUNARES = [("Parquet files", "*.parquet"), ("Arrow IPC files", "*.arrow"), ("Feather files", "*.feather")]
+TIPOS_COMPACTOS = [("Compact OTU tables", "*.otus")]
 
 
 def resource_path(relative_path):
@@ -19,12 +67,35 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
+def processamento():
+    """Returns the processing module, importing metabar and pandas on first use.
+
+    The import is started in the background as soon as the language window is shown, so by the time a process
+    is run the module is usually loaded already; otherwise the caller waits for the import to finish.
+
+    Returns:
+    metabar (module): The processing module.
+    """
+    import metabar
+    return metabar
+
+
 class Janelas:
     def __init__(self):
         self.idioma = tk.Tk()
         self.idioma.resizable(False, False)
         self.idioma.title('eDNAnalyzer')
         self.var_caminho_arquivo = tk.StringVar()
+        self.var_processo_isolado = tk.BooleanVar(value=False)
+        self.var_motor_polars = tk.BooleanVar(value=os.environ.get('EDNANALYZER_ENGINE') == 'polars' and POLARS_DISPONIVEL)
+        self.var_motor_duckdb = tk.BooleanVar(value=os.environ.get('EDNANALYZER_ENGINE') == 'duckdb' and DUCKDB_DISPONIVEL)
+        self.motor_execucao = 'pandas'
+        self.var_caminho_curadoria = tk.StringVar()
+        self.processo = None
+        self.processo_cancelado = False
+        self.pasta_transferencia = None
+        self.instrumentacao = None
+        self.quadro_instrumentacao = None
         self.idioma.rowconfigure(0, weight=1)
         self.idioma.columnconfigure([0, 1], weight=1)
         self.logo = ImageTk.PhotoImage(Image.open(resource_path('img/logo_ednanalyzer_sem_nome.png')))
@@ -47,6 +118,29 @@ class Janelas:
         botao_english.image = bandeira_uk
         botao_english.grid(row=1, column=2, padx=10, pady=10, sticky='nsew')
 
+        self.idioma.after_idle(self._carrega_processamento)
+
+    def _carrega_processamento(self):
+        """Starts importing the processing module in the background once the language window is shown."""
+        self.tempo_janela = time.perf_counter() - INICIO_PROGRAMA
+
+        thread_importacao = threading.Thread(target=self._importa_processamento)
+        thread_importacao.daemon = True
+        thread_importacao.start()
+
+    def _importa_processamento(self):
+        """Imports the processing module and prints the startup report when requested."""
+        inicio_importacao = time.perf_counter()
+        processamento()
+        tempo_importacao = time.perf_counter() - inicio_importacao
+
+        if RELATORIO_INICIO:
+            situacao = 'ok' if self.tempo_janela <= META_INICIO else 'above target'
+            print('eDNAnalyzer startup report\n'
+                  f'  tkinter and PIL imports: {TEMPO_IMPORTACAO_INTERFACE:.3f} s\n'
+                  f'  language window shown: {self.tempo_janela:.3f} s (target {META_INICIO:.3f} s: {situacao})\n'
+                  f'  metabar and pandas imports (background): {tempo_importacao:.3f} s', file=sys.stderr)
+
     def janela_principal(self, idioma):
         """Initializes the window for process selection and manual access.
 
@@ -74,6 +168,21 @@ class Janelas:
             botao_selecionar_funcionalidade2 = tk.Button(principal, text='Results consolidation', font=('Arial', 16), command=lambda: self.proc_tabelas_consolidadas('eng'))
             botao_selecionar_funcionalidade2.grid(row=3, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
 
+            botao_limpar_cache = tk.Button(principal, text='Clear cache', font=('Arial', 12), command=lambda: processamento().limpa_cache())
+            botao_limpar_cache.grid(row=4, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
+
+            check_processo = tk.Checkbutton(principal, text='Run processing in a separate process', font=('Arial', 12),
+                                            variable=self.var_processo_isolado)
+            check_processo.grid(row=5, column=0, padx=10, pady=5, sticky='w', columnspan=3)
+
+            check_polars = tk.Checkbutton(principal, text='Use the Polars engine', font=('Arial', 12), variable=self.var_motor_polars,
+                                          state='normal' if POLARS_DISPONIVEL else 'disabled')
+            check_polars.grid(row=6, column=0, padx=10, pady=5, sticky='w', columnspan=3)
+
+            check_duckdb = tk.Checkbutton(principal, text='Consolidate with DuckDB (large files, low memory)', font=('Arial', 12),
+                                          variable=self.var_motor_duckdb, state='normal' if DUCKDB_DISPONIVEL else 'disabled')
+            check_duckdb.grid(row=7, column=0, padx=10, pady=5, sticky='w', columnspan=3)
+
         elif idioma == 'pt-br':
             principal.title("Escolhendo o processo")
 
@@ -94,6 +203,21 @@ class Janelas:
                                                          font=('Arial', 16), command=lambda: self.proc_tabelas_consolidadas('pt-br'))
             botao_selecionar_funcionalidade2.grid(row=3, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
 
+            botao_limpar_cache = tk.Button(principal, text='Limpar cache', font=('Arial', 12), command=lambda: processamento().limpa_cache())
+            botao_limpar_cache.grid(row=4, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
+
+            check_processo = tk.Checkbutton(principal, text='Rodar o processamento em um processo separado', font=('Arial', 12),
+                                            variable=self.var_processo_isolado)
+            check_processo.grid(row=5, column=0, padx=10, pady=5, sticky='w', columnspan=3)
+
+            check_polars = tk.Checkbutton(principal, text='Usar o motor Polars', font=('Arial', 12), variable=self.var_motor_polars,
+                                          state='normal' if POLARS_DISPONIVEL else 'disabled')
+            check_polars.grid(row=6, column=0, padx=10, pady=5, sticky='w', columnspan=3)
+
+            check_duckdb = tk.Checkbutton(principal, text='Consolidar com o DuckDB (arquivos grandes, pouca memória)', font=('Arial', 12),
+                                          variable=self.var_motor_duckdb, state='normal' if DUCKDB_DISPONIVEL else 'disabled')
+            check_duckdb.grid(row=7, column=0, padx=10, pady=5, sticky='w', columnspan=3)
+
     def abrir_manual(self, idioma):
         """Opens the program manual file.
 
@@ -215,6 +339,244 @@ class Janelas:
                                     command=lambda: self.roda_analise_primaria(caixa_threshold, 'pt-br', nova_janela))
             botao_run.grid(row=3, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
 
+    def _cria_progresso(self, contexto, idioma, etapas):
+        """Adds a determinate progress bar, a status label and a Cancel button to a processing window.
+
+        Parameters:
+        contexto (tkinter Toplevel widget): Context to add new widgets to the GUI.
+        idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
+        etapas (list): Stages of the run, in order, used to turn the progress events into a fraction of the whole run.
+
+        Returns:
+        progresso (dict): Widgets, stages and start time of the run.
+        """
+        self.cancelamento = threading.Event()
+
+        barra = ttk.Progressbar(contexto, mode='determinate', maximum=100)
+        barra.grid(row=4, column=0, padx=10, pady=10, sticky='nsew', columnspan=2)
+
+        botao_cancelar = tk.Button(contexto, text='Cancel' if idioma == 'eng' else 'Cancelar', font=('Arial', 12),
+                                   command=self._cancela)
+        botao_cancelar.grid(row=4, column=2, padx=10, pady=10, sticky='nsew')
+
+        rotulo = tk.Label(contexto, text='', font=('Arial', 12))
+        rotulo.grid(row=5, column=0, padx=10, pady=5, sticky='nsew', columnspan=3)
+
+        return {'barra': barra, 'cancelar': botao_cancelar, 'rotulo': rotulo, 'etapas': etapas, 'inicio': time.perf_counter()}
+
+    def _emissor_progresso(self, fila):
+        """Builds the progress callback used by the worker thread.
+
+        Parameters:
+        fila (Queue): Queue read by the GUI, which receives ("progresso", event) items.
+
+        Returns:
+        emite (callable): Callback for the processing functions; it returns False after Cancel is pressed.
+        """
+        def emite(evento):
+            if self.cancelamento.is_set():
+                return False
+            fila.put(('progresso', evento))
+
+        return emite
+
+    def _cancela(self):
+        """Cancels the running job: a worker thread stops at its next progress event, a worker process is killed."""
+        self.cancelamento.set()
+        if self.processo is not None and self.processo.is_alive():
+            self.processo.terminate()
+            self.processo.join()
+            self.processo_cancelado = True
+
+    def _proxima_mensagem(self, fila):
+        """Returns the next message of the running job.
+
+        A killed worker process may leave a partial message in its queue, so cancellation and unexpected exits
+        of the worker are reported from the process state instead of the queue.
+
+        Parameters:
+        fila (Queue): Queue of the running job.
+
+        Returns:
+        mensagem (tuple): ("progresso", event), ("instrumentacao", stages), ("sucesso", *result), ("streaming", *result) (see
+        _processamento_streaming_thread), ("erro", error type) or ("cancelado",).
+        """
+        if self.processo_cancelado:
+            self.processo_cancelado = False
+            return ('cancelado',)
+        try:
+            return fila.get_nowait()
+        except queue.Empty:
+            if self.processo is not None and not self.processo.is_alive() and fila.empty():
+                return ('erro', 'Exception')
+            raise
+
+    def _motor(self, funcao='executa_threshold'):
+        """Returns the engine chosen for the grouped aggregations of a stage function.
+
+        Parameters:
+        funcao (str): Name of the stage function in metabar.
+
+        Returns:
+        motor (str): "duckdb" for the consolidation when DuckDB is checked, "polars" when the Polars engine is checked, otherwise "pandas".
+        """
+        if funcao == 'executa_consolidacao' and self.var_motor_duckdb.get():
+            return 'duckdb'
+        return 'polars' if self.var_motor_polars.get() else 'pandas'
+
+    def _inicia_processo(self, funcao, argumentos):
+        """Starts a stage function in a separate worker process.
+
+        The worker does not share the interpreter with Tk, so heavy pandas work cannot freeze the window and
+        Cancel can kill it. The result tables come back as memory-mapped Arrow files in a temporary folder and the
+        stage measurements of the worker are added to self.instrumentacao.
+
+        Parameters:
+        funcao (str): Name of the stage function in metabar, "executa_threshold", "executa_consolidacao" or "executa_pipeline".
+        argumentos (tuple): Positional arguments of the stage function.
+
+        Returns:
+        fila (multiprocessing Queue): Queue with the progress events and the result of the worker.
+        """
+        metabar = processamento()
+        contexto_processo = multiprocessing.get_context('spawn')
+
+        self.fila_processo = contexto_processo.Queue()
+        self.pasta_transferencia = tempfile.mkdtemp(prefix='ednanalyzer_')
+        caminho_perfil = None
+        if self.instrumentacao.perfil is not None:
+            caminho_perfil = os.path.join(metabar.PASTA_LOGS, self.instrumentacao.nome + '_processo.prof')
+            os.makedirs(metabar.PASTA_LOGS, exist_ok=True)
+        self.processo = contexto_processo.Process(target=metabar.executa_em_processo,
+                                                  args=(getattr(metabar, funcao), argumentos, self.fila_processo, self.pasta_transferencia),
+                                                  kwargs={'caminho_perfil': caminho_perfil, 'motor': self.motor_execucao})
+        self.processo.daemon = True
+        self.processo.start()
+        return self.fila_processo
+
+    def _finaliza_processo(self, dados):
+        """Loads the result tables sent by a worker process and removes its temporary folder.
+
+        Parameters:
+        dados (list): Result items received from the worker.
+
+        Returns:
+        dados (list): Result items with the dataframes loaded.
+        """
+        if self.processo is not None:
+            dados = processamento().importa_tabelas(list(dados))
+            self.processo.join()
+            self.processo = None
+        if self.pasta_transferencia is not None:
+            shutil.rmtree(self.pasta_transferencia, ignore_errors=True)
+            self.pasta_transferencia = None
+        return dados
+
+    def _atualiza_progresso(self, progresso, evento, idioma):
+        """Shows a progress event in the bar and in the status label, with the estimated remaining time.
+
+        Parameters:
+        progresso (dict): Widgets, stages and start time of the run.
+        evento (dict): Progress event (see metabar.emite_progresso).
+        idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
+        """
+        etapas = progresso['etapas']
+        if evento['etapa'] not in etapas:
+            return
+
+        parcial = evento['feitos'] / evento['total'] if evento['total'] else 0
+        fracao = (etapas.index(evento['etapa']) + parcial) / len(etapas)
+        progresso['barra']['value'] = fracao * 100
+
+        texto = NOMES_ETAPAS[idioma][evento['etapa']]
+        if evento['total']:
+            texto += f" ({evento['feitos']}/{evento['total']})"
+        if fracao > 0:
+            decorrido = time.perf_counter() - progresso['inicio']
+            restante = decorrido * (1 - fracao) / fracao
+            texto += f' - ETA {restante:.0f} s' if idioma == 'eng' else f' - restam {restante:.0f} s'
+        progresso['rotulo'].config(text=texto)
+
+    def _remove_progresso(self, progresso):
+        """Removes the progress widgets of a finished run.
+
+        Parameters:
+        progresso (dict): Widgets, stages and start time of the run.
+        """
+        for widget in ('barra', 'cancelar', 'rotulo'):
+            progresso[widget].grid_forget()
+
+    def _mostrar_cancelamento(self, idioma, contexto):
+        """Shows the message of a cancelled run.
+
+        Parameters:
+        idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
+        contexto (tkinter Toplevel widget): Context to add new widgets to the GUI.
+        """
+        texto = 'Processing cancelled.' if idioma == 'eng' else 'Processamento cancelado.'
+        msg_cancelado = tk.Label(contexto, text=texto, font=('Arial', 14, 'bold'), fg='#cc6600')
+        msg_cancelado.grid(row=5, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
+
+    def _mostrar_instrumentacao(self, status, idioma, contexto):
+        """Saves the run log and adds a collapsible table with the measurements of each stage to the window.
+
+        Parameters:
+        status (str): How the run ended, "sucesso", "streaming", "erro" or "cancelado".
+        idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
+        contexto (tkinter Toplevel widget): Context to add new widgets to the GUI.
+        """
+        try:
+            caminho_log = self.instrumentacao.salva(status=status, arquivo=self.var_caminho_arquivo.get(),
+                                                    processo_isolado=self.var_processo_isolado.get(), motor=self.motor_execucao)
+        except OSError:
+            caminho_log = None
+
+        if self.quadro_instrumentacao is not None:
+            self.quadro_instrumentacao.destroy()
+        self.quadro_instrumentacao = quadro = tk.Frame(contexto)
+        quadro.grid(row=6, column=0, padx=10, pady=5, sticky='nsew', columnspan=3)
+
+        if idioma == 'eng':
+            titulo = 'Timing summary'
+            colunas = {'etapa': 'Stage', 'tempo': 'Time (s)', 'tempo_cpu': 'CPU (s)', 'pico_memoria_mb': 'Peak memory (MiB)',
+                       'linhas_entrada': 'Rows in', 'linhas_saida': 'Rows out'}
+            texto_log = f'Run log: {caminho_log}' if caminho_log else 'Run log not saved'
+        else:
+            titulo = 'Resumo dos tempos'
+            colunas = {'etapa': 'Etapa', 'tempo': 'Tempo (s)', 'tempo_cpu': 'CPU (s)', 'pico_memoria_mb': 'Pico de memória (MiB)',
+                       'linhas_entrada': 'Linhas de entrada', 'linhas_saida': 'Linhas de saída'}
+            texto_log = f'Log da execução: {caminho_log}' if caminho_log else 'Log da execução não salvo'
+
+        tabela = ttk.Treeview(quadro, columns=list(colunas), show='headings', height=max(1, min(len(self.instrumentacao.etapas), 10)))
+        for coluna, nome in colunas.items():
+            tabela.heading(coluna, text=nome)
+            tabela.column(coluna, width=150 if coluna == 'etapa' else 110, anchor='w' if coluna == 'etapa' else 'e')
+        for registro in self.instrumentacao.etapas:
+            valores = [NOMES_ETAPAS[idioma].get(registro['etapa'], registro['etapa'])]
+            for coluna in ('tempo', 'tempo_cpu', 'pico_memoria_mb'):
+                valores.append('' if registro[coluna] is None else f'{registro[coluna]:.3f}')
+            for coluna in ('linhas_entrada', 'linhas_saida'):
+                valores.append('' if registro[coluna] is None else f'{registro[coluna]:,}')
+            tabela.insert('', tk.END, values=valores)
+        rotulo_log = tk.Label(quadro, text=texto_log, font=('Arial', 10))
+
+        def alterna():
+            if tabela.winfo_ismapped():
+                tabela.grid_remove()
+                rotulo_log.grid_remove()
+                botao.config(text=f'\u25b8 {titulo}')
+            else:
+                tabela.grid()
+                rotulo_log.grid()
+                botao.config(text=f'\u25be {titulo}')
+
+        botao = tk.Button(quadro, text=f'\u25b8 {titulo}', font=('Arial', 12), relief='flat', command=alterna)
+        botao.grid(row=0, column=0, sticky='w')
+        tabela.grid(row=1, column=0, sticky='nsew')
+        rotulo_log.grid(row=2, column=0, sticky='w')
+        tabela.grid_remove()
+        rotulo_log.grid_remove()
+
     def roda_analise_primaria(self, caixa_threshold, idioma, contexto):
         """Runs threshold processing for OTUS/ASVs.
 
@@ -224,10 +586,10 @@ class Janelas:
         contexto (tkinter Toplevel widget): Context to add new widgets to the GUI.
         """
         self.fila_resultados = queue.Queue()
+        self.instrumentacao = processamento().Instrumentacao(perfil=PERFIL_EXECUCAO)
+        self.motor_execucao = self._motor()
 
-        progressbar = ttk.Progressbar(contexto, mode='indeterminate')
-        progressbar.grid(row=4, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
-        progressbar.start()
+        progresso = self._cria_progresso(contexto, idioma, ETAPAS_PRIMARIAS)
 
         botao_run = contexto.grid_slaves(row=3, column=0)[0]
         botao_run.config(state='disabled')
@@ -235,14 +597,29 @@ class Janelas:
         caminho_arquivo = self.var_caminho_arquivo.get()
         string_threshold = caixa_threshold.get()
 
-        thread_processamento = threading.Thread(
-            target=self._processamento_primario_thread,
-            args=(caminho_arquivo, string_threshold, idioma, contexto)
-        )
-        thread_processamento.daemon = True
-        thread_processamento.start()
+        if caminho_arquivo.lower().endswith('.csv') and os.path.isfile(caminho_arquivo) and \
+                os.path.getsize(caminho_arquivo) > LIMITE_STREAMING:
+            thread_processamento = threading.Thread(
+                target=self._processamento_streaming_thread,
+                args=(caminho_arquivo, string_threshold)
+            )
+            thread_processamento.daemon = True
+            thread_processamento.start()
+        elif self.var_processo_isolado.get():
+            try:
+                threshold = 0.05 if string_threshold == '' else float(string_threshold)
+                self.fila_resultados = self._inicia_processo('executa_threshold', (caminho_arquivo, threshold))
+            except ValueError:
+                self.fila_resultados.put(('erro', 'ValueError'))
+        else:
+            thread_processamento = threading.Thread(
+                target=self._processamento_primario_thread,
+                args=(caminho_arquivo, string_threshold, idioma, contexto)
+            )
+            thread_processamento.daemon = True
+            thread_processamento.start()
 
-        contexto.after(100, self._verifica_processamento_primario, progressbar, botao_run, idioma, contexto)
+        contexto.after(100, self._verifica_processamento_primario, progresso, botao_run, idioma, contexto)
 
     def _processamento_primario_thread(self, caminho_arquivo, string_threshold, idioma, contexto):
         """Runs threshold processing for OTUS/ASVs in a separate thread.
@@ -253,65 +630,149 @@ class Janelas:
         contexto (tkinter Toplevel widget): Context to add new widgets to the GUI.
         """
         try:
-            if '.xlsx' in caminho_arquivo:
-                df = pd.read_excel(caminho_arquivo)
-            elif '.csv' in caminho_arquivo:
-                df = pd.read_csv(caminho_arquivo, sep=None, engine='python', encoding='utf-8-sig')
+            metabar = processamento()
+            emite = self._emissor_progresso(self.fila_resultados)
 
             threshold = 0.05 if string_threshold == '' else float(string_threshold)
 
-            dfs_corridas = separa_corridas(df)
-            selecionados, nao_selecionados, thresholds = aplica_threshold(dfs_corridas, threshold)
+            resultado, origem = metabar.executa_com_cache(metabar.executa_threshold, (caminho_arquivo, threshold), emite,
+                                                          instrumentacao=self.instrumentacao, motor=self.motor_execucao)
+
+            self.fila_resultados.put(('sucesso', origem, *resultado))
+
+        except processamento().ProcessamentoCancelado:
+            self.fila_resultados.put(('cancelado',))
+        except (processamento().FormatoNaoSuportado, KeyError) as e:
+            self.fila_resultados.put(('erro', type(e).__name__))
+        except ValueError:
+            self.fila_resultados.put(('erro', 'ValueError'))
+        except Exception as e:
+            self.fila_resultados.put(('erro', 'Exception'))
 
-            resultado_tratado_geral = concatena_dfs(selecionados)
-            nao_selecionados_geral = concatena_dfs(nao_selecionados)
+    def _processamento_streaming_thread(self, caminho_arquivo, string_threshold):
+        """Runs threshold processing for a CSV file above LIMITE_STREAMING in chunks, in a separate thread.
 
-            self.fila_resultados.put(('sucesso', resultado_tratado_geral, nao_selecionados_geral, thresholds))
+        The selected and removed OTUs/ASVs are written to CSV files in a temporary folder, so memory use does not
+        grow with the file size; they are moved to the paths chosen by the user when the run finishes. The run
+        is never sent to a worker process, since the table is not held in memory.
 
-        except UnboundLocalError:
-            self.fila_resultados.put(('erro', 'UnboundLocalError'))
+        Parameters:
+        caminho_arquivo (str): Path to the CSV file to be processed.
+        string_threshold (str): Percentage for threshold calculation provided by the user.
+        """
+        pasta_streaming = tempfile.mkdtemp(prefix='ednanalyzer_')
+        try:
+            metabar = processamento()
+            emite = self._emissor_progresso(self.fila_resultados)
+
+            threshold = 0.05 if string_threshold == '' else float(string_threshold)
+
+            caminho_selecionados = os.path.join(pasta_streaming, 'selecionados.csv')
+            caminho_nao_selecionados = os.path.join(pasta_streaming, 'nao_selecionados.csv')
+            inicio = time.perf_counter()
+            thresholds = metabar.processa_threshold(caminho_arquivo, threshold, caminho_selecionados, caminho_nao_selecionados,
+                                                    streaming=True, progresso=emite, instrumentacao=self.instrumentacao)
+
+            self.fila_resultados.put(('streaming', pasta_streaming, caminho_selecionados, caminho_nao_selecionados, thresholds,
+                                      time.perf_counter() - inicio))
+            return
+
+        except processamento().ProcessamentoCancelado:
+            self.fila_resultados.put(('cancelado',))
+        except (processamento().FormatoNaoSuportado, KeyError) as e:
+            self.fila_resultados.put(('erro', type(e).__name__))
         except ValueError:
             self.fila_resultados.put(('erro', 'ValueError'))
         except Exception as e:
             self.fila_resultados.put(('erro', 'Exception'))
+        shutil.rmtree(pasta_streaming, ignore_errors=True)
 
-    def _verifica_processamento_primario(self, progressbar, botao_run, idioma, contexto):
-        """Periodically checks whether primary processing has finished.
+    def _verifica_processamento_primario(self, progresso, botao_run, idioma, contexto):
+        """Periodically shows the progress of primary processing and checks whether it has finished.
 
         Parameters:
-        progressbar (tkinter widget): Progressbar widget.
+        progresso (dict): Progress widgets of the run (see _cria_progresso).
         botao_run (tkinter widget): Run button widget.
         idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
         contexto (tkinter Toplevel widget): Context to add new widgets to the GUI.
         """
         try:
-            resultado = self.fila_resultados.get_nowait()
+            resultado = self._proxima_mensagem(self.fila_resultados)
+            while resultado[0] in ('progresso', 'instrumentacao'):
+                if resultado[0] == 'progresso':
+                    self._atualiza_progresso(progresso, resultado[1], idioma)
+                else:
+                    self.instrumentacao.etapas.extend(resultado[1])
+                resultado = self._proxima_mensagem(self.fila_resultados)
             status, *dados = resultado
 
-            progressbar.stop()
-            progressbar.grid_forget()
+            self._remove_progresso(progresso)
 
             botao_run.config(state='normal')
 
             if status == 'sucesso':
-                resultado_tratado_geral, nao_selecionados_geral, thresholds = dados
+                dados = self._finaliza_processo(dados)
+            else:
+                self._finaliza_processo([])
+
+            if status == 'cancelado':
+                self._mostrar_cancelamento(idioma, contexto)
+
+            elif status == 'sucesso':
+                origem, resultado_tratado_geral, nao_selecionados_geral, thresholds, tempo_leitura, linhas_por_segundo = dados
+
+                msg_fim = tk.Label(contexto, text=self._mensagem_conclusao(origem, tempo_leitura, linhas_por_segundo, idioma),
+                                   font=('Arial', 14, 'bold'), fg='#009900')
+                msg_fim.grid(row=5, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
+
+                self._salvar_arquivos_primarios(resultado_tratado_geral, nao_selecionados_geral, thresholds, idioma)
+
+            elif status == 'streaming':
+                pasta_streaming, caminho_selecionados, caminho_nao_selecionados, thresholds, tempo_total = dados
 
                 if idioma == 'eng':
-                    msg_fim = tk.Label(contexto, text='Processing completed successfully!',
-                                       font=('Arial', 14, 'bold'), fg='#009900')
+                    texto = f'Processing completed successfully!\nFile processed in chunks in {tempo_total:.2f} s'
                 else:
-                    msg_fim = tk.Label(contexto, text='Processamento concluído com sucesso!',
-                                       font=('Arial', 14, 'bold'), fg='#009900')
+                    texto = f'Processamento concluído com sucesso!\nArquivo processado em blocos em {tempo_total:.2f} s'
+                msg_fim = tk.Label(contexto, text=texto, font=('Arial', 14, 'bold'), fg='#009900')
                 msg_fim.grid(row=5, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
 
-                self._salvar_arquivos_primarios(resultado_tratado_geral, nao_selecionados_geral, thresholds, idioma)
+                self._salvar_arquivos_streaming(caminho_selecionados, caminho_nao_selecionados, thresholds, idioma)
+                shutil.rmtree(pasta_streaming, ignore_errors=True)
 
             else:
                 tipo_erro = dados[0]
                 self._mostrar_erro_primario(tipo_erro, idioma, contexto)
 
+            self._mostrar_instrumentacao(status, idioma, contexto)
+
         except queue.Empty:
-            contexto.after(100, self._verifica_processamento_primario, progressbar, botao_run, idioma, contexto)
+            contexto.after(100, self._verifica_processamento_primario, progresso, botao_run, idioma, contexto)
+
+    def _mensagem_conclusao(self, origem, tempo_leitura, linhas_por_segundo, idioma):
+        """Builds the message shown when a run finishes successfully.
+
+        Parameters:
+        origem (str): "memoria" or "disco" when the result came from the result cache, "" when it was computed.
+        tempo_leitura (float): Time spent reading the input file, in seconds.
+        linhas_por_segundo (float): Input rows read per second.
+        idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
+
+        Returns:
+        texto (str): Message text.
+        """
+        if idioma == 'eng':
+            if origem == 'memoria':
+                return 'Processing completed successfully!\nResult loaded from cache (this session)'
+            elif origem == 'disco':
+                return 'Processing completed successfully!\nResult loaded from cache (disk)'
+            return f'Processing completed successfully!\nFile read in {tempo_leitura:.2f} s ({linhas_por_segundo:,.0f} rows/s)'
+        else:
+            if origem == 'memoria':
+                return 'Processamento concluído com sucesso!\nResultado carregado do cache (esta sessão)'
+            elif origem == 'disco':
+                return 'Processamento concluído com sucesso!\nResultado carregado do cache (disco)'
+            return f'Processamento concluído com sucesso!\nArquivo lido em {tempo_leitura:.2f} s ({linhas_por_segundo:,.0f} linhas/s)'
 
     def _mostrar_erro_primario(self, tipo_erro, idioma, contexto):
         """Shows error messages.
@@ -322,14 +783,14 @@ class Janelas:
         contexto (tkinter Toplevel widget): Context to add new widgets to the GUI.
         """
         if idioma == 'eng':
-            if tipo_erro == 'UnboundLocalError':
+            if tipo_erro in ('FormatoNaoSuportado', 'KeyError'):
                 texto = 'ERROR: No file loaded or invalid input!'
             elif tipo_erro == 'ValueError':
                 texto = 'ERROR: Invalid threshold value!'
             else:
                 texto = 'An ERROR occurred!'
         else:
-            if tipo_erro == 'UnboundLocalError':
+            if tipo_erro in ('FormatoNaoSuportado', 'KeyError'):
                 texto = 'ERRO: Nenhum arquivo carregado ou input inválido!'
             elif tipo_erro == 'ValueError':
                 texto = 'ERRO: Valor inválido para threshold!'
@@ -339,7 +800,7 @@ class Janelas:
         msg_erro = tk.Label(contexto, text=texto, font=('Arial', 14, 'bold'), fg='#ff0000')
         msg_erro.grid(row=5, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
 
-    def _salvar_arquivos_primarios(self, resultado_tratado_geral, nao_selecionados_geral, thresholds, idioma):
+    def _salvar_arquivos_primarios(self, resultado_tratado_geral, nao_selecionados_geral, thresholds, idioma, curada=False):
         """Saves the files
 
         Parameters:
@@ -347,75 +808,98 @@ class Janelas:
         nao_selecionados_geral (data frame): OTUs/ASVs excluded, under or equal the threshold.
         thresholds (data frame): Threshold values per sequencing sample.
         idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
+        curada (bool): Indicates that the curated taxon column is already filled (pipeline mode) and must be kept.
         """
+        metabar = processamento()
 
         if idioma == 'eng':
             caminho_salvar_resultado = asksaveasfilename(title='Save the results table',
                                                          initialfile='processed_results',
                                                          defaultextension='.*',
-                                                         filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"),
+                                                         filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"), *TIPOS_COLUNARES, *TIPOS_COMPACTOS,
                                                                     ("All files", "*.*")))
 
-            resultado_tratado_geral['final_taxon_curated'] = ''
+            if not curada:
+                resultado_tratado_geral['final_taxon_curated'] = ''
 
-            if ".xlsx" in caminho_salvar_resultado:
-                resultado_tratado_geral.to_excel(caminho_salvar_resultado, index=False)
-            elif ".csv" in caminho_salvar_resultado:
-                resultado_tratado_geral.to_csv(caminho_salvar_resultado, sep=';', encoding='utf-8-sig', index=False)
+            with metabar.mede_etapa(self.instrumentacao, 'gravacao', len(resultado_tratado_geral), 1):
+                metabar.salva_tabela(resultado_tratado_geral, caminho_salvar_resultado, index=False)
 
             caminho_salvar_resultado = asksaveasfilename(title='Save the table with deleted OTUS/ASVs',
                                                          initialfile='deleted_otus_asvs',
                                                          defaultextension='.*',
-                                                         filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"),
+                                                         filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"), *TIPOS_COLUNARES, *TIPOS_COMPACTOS,
                                                                     ("All files", "*.*")))
-            if ".xlsx" in caminho_salvar_resultado:
-                nao_selecionados_geral.to_excel(caminho_salvar_resultado, index=False)
-            elif ".csv" in caminho_salvar_resultado:
-                nao_selecionados_geral.to_csv(caminho_salvar_resultado, sep=';', encoding='utf-8-sig', index=False)
+            with metabar.mede_etapa(self.instrumentacao, 'gravacao', len(nao_selecionados_geral), 1):
+                metabar.salva_tabela(nao_selecionados_geral, caminho_salvar_resultado, index=False)
 
             caminho_salvar_thresholds = asksaveasfilename(title='Save the thresholds table',
                                                           initialfile='thresholds',
                                                           defaultextension='.*',
-                                                          filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"),
+                                                          filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"), *TIPOS_COLUNARES,
                                                                      ("All files", "*.*")))
-            if ".xlsx" in caminho_salvar_resultado:
-                thresholds.to_excel(caminho_salvar_thresholds)
-            elif ".csv" in caminho_salvar_resultado:
-                thresholds.to_csv(caminho_salvar_thresholds, sep=';', encoding='utf-8-sig')
+            with metabar.mede_etapa(self.instrumentacao, 'gravacao', len(thresholds), 1):
+                metabar.salva_tabela(thresholds, caminho_salvar_thresholds)
         elif idioma == 'pt-br':
             caminho_salvar_resultado = asksaveasfilename(title='Salve as tabelas dos resultados',
                                                          initialfile='resultados_processados',
                                                          defaultextension='.*',
-                                                         filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"),
+                                                         filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"), *TIPOS_COLUNARES, *TIPOS_COMPACTOS,
                                                                     ("All files", "*.*")))
-            resultado_tratado_geral['taxon_final_curada'] = ''
+            if not curada:
+                resultado_tratado_geral['taxon_final_curada'] = ''
 
-            if ".xlsx" in caminho_salvar_resultado:
-                resultado_tratado_geral.to_excel(caminho_salvar_resultado, index=False)
-            elif ".csv" in caminho_salvar_resultado:
-                resultado_tratado_geral.to_csv(caminho_salvar_resultado, sep=';', encoding='utf-8-sig', index=False)
+            with metabar.mede_etapa(self.instrumentacao, 'gravacao', len(resultado_tratado_geral), 1):
+                metabar.salva_tabela(resultado_tratado_geral, caminho_salvar_resultado, index=False)
 
             caminho_salvar_resultado = asksaveasfilename(title='Salve tabelas com as OTUS/ASVs excluídas',
                                                          initialfile='otus_asvs_excluídas',
                                                          defaultextension='.*',
-                                                         filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"),
+                                                         filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"), *TIPOS_COLUNARES, *TIPOS_COMPACTOS,
                                                                     ("All files", "*.*")))
 
-            if ".xlsx" in caminho_salvar_resultado:
-                nao_selecionados_geral.to_excel(caminho_salvar_resultado, index=False)
-            elif ".csv" in caminho_salvar_resultado:
-                nao_selecionados_geral.to_csv(caminho_salvar_resultado, sep=';', encoding='utf-8-sig', index=False)
+            with metabar.mede_etapa(self.instrumentacao, 'gravacao', len(nao_selecionados_geral), 1):
+                metabar.salva_tabela(nao_selecionados_geral, caminho_salvar_resultado, index=False)
 
             caminho_salvar_thresholds = asksaveasfilename(title='Salve a tabela de thresholds',
                                                           initialfile='thresholds',
                                                           defaultextension='.*',
-                                                          filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"),
+                                                          filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"), *TIPOS_COLUNARES,
                                                                      ("All files", "*.*")))
 
-            if ".xlsx" in caminho_salvar_resultado:
-                thresholds.to_excel(caminho_salvar_thresholds)
-            elif ".csv" in caminho_salvar_resultado:
-                thresholds.to_csv(caminho_salvar_thresholds, sep=';', encoding='utf-8-sig')
+            with metabar.mede_etapa(self.instrumentacao, 'gravacao', len(thresholds), 1):
+                metabar.salva_tabela(thresholds, caminho_salvar_thresholds)
+
+    def _salvar_arquivos_streaming(self, caminho_selecionados, caminho_nao_selecionados, thresholds, idioma):
+        """Saves the files of a streaming run, moving the CSV files written by the run to the chosen paths.
+
+        Parameters:
+        caminho_selecionados (str): Temporary CSV file with the OTUs/ASVs selected, above the threshold.
+        caminho_nao_selecionados (str): Temporary CSV file with the OTUs/ASVs excluded, under or equal the threshold.
+        thresholds (data frame): Threshold values per sequencing sample.
+        idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
+        """
+        metabar = processamento()
+
+        if idioma == 'eng':
+            titulos = ('Save the results table', 'Save the table with deleted OTUS/ASVs', 'Save the thresholds table')
+            nomes = ('processed_results', 'deleted_otus_asvs', 'thresholds')
+        else:
+            titulos = ('Salve as tabelas dos resultados', 'Salve tabelas com as OTUS/ASVs excluídas', 'Salve a tabela de thresholds')
+            nomes = ('resultados_processados', 'otus_asvs_excluídas', 'thresholds')
+
+        for caminho_temporario, titulo, nome in zip((caminho_selecionados, caminho_nao_selecionados), titulos, nomes):
+            caminho_salvar_resultado = asksaveasfilename(title=titulo, initialfile=nome, defaultextension='.csv',
+                                                         filetypes=(("CSV files", "*.csv"),))
+            if caminho_salvar_resultado:
+                with metabar.mede_etapa(self.instrumentacao, 'gravacao', grupos_entrada=1):
+                    shutil.move(caminho_temporario, caminho_salvar_resultado)
+
+        caminho_salvar_thresholds = asksaveasfilename(title=titulos[2], initialfile=nomes[2], defaultextension='.*',
+                                                      filetypes=(("Excel files", "*.xlsx"), ("CSV files", "*.csv"), *TIPOS_COLUNARES,
+                                                                 ("All files", "*.*")))
+        with metabar.mede_etapa(self.instrumentacao, 'gravacao', len(thresholds), 1):
+            metabar.salva_tabela(thresholds, caminho_salvar_thresholds)
 
     def proc_tabelas_consolidadas(self, idioma):
         """Runs the results consolidation process.
@@ -483,7 +967,41 @@ class Janelas:
             caixa_amostradores = tk.Text(frame_amostradores, font=('Arial', 14), width=10, height=5)
             caixa_amostradores.grid(row=1, column=1, padx=10, pady=10, columnspan=3)
 
-            botao_run = tk.Button(nova_janela, text='RUN',  font=('Arial', 14, 'bold'), width=44, command=lambda: self.roda_analise_secundaria(caixa_amostradores, var_amostrador, var_area, 'eng', nova_janela))
+            frame_compressao = tk.LabelFrame(frame, text='ZIP compression', font=('Arial', 15))
+            frame_compressao.grid(row=4, column=0)
+
+            caixa_compressao = ttk.Combobox(frame_compressao, values=list(COMPRESSOES_ZIP['eng']), state='readonly', font=('Arial', 14), width=25)
+            caixa_compressao.current(0)
+            caixa_compressao.grid(row=0, column=0, padx=10, pady=10)
+
+            frame_pipeline = tk.LabelFrame(frame, text='Threshold in the same run', font=('Arial', 15))
+            frame_pipeline.grid(row=5, column=0)
+
+            self.var_pipeline = tk.BooleanVar(frame_pipeline)
+            botao_pipeline = tk.Checkbutton(frame_pipeline, text='Apply the threshold to the loaded file first', variable=self.var_pipeline,
+                                            font=('Arial', 14))
+            botao_pipeline.grid(row=0, column=0, sticky='w', columnspan=2)
+
+            label_threshold_pipeline = tk.Label(frame_pipeline, text='Threshold (%):', font=('Arial', 14))
+            label_threshold_pipeline.grid(row=1, column=0, padx=10, pady=5, sticky='w')
+
+            self.caixa_threshold_pipeline = tk.Entry(frame_pipeline, font=('Arial', 14), width=8)
+            self.caixa_threshold_pipeline.grid(row=1, column=1, padx=10, pady=5, sticky='w')
+
+            self.var_caminho_curadoria.set('')
+            botao_curadoria = tk.Button(frame_pipeline, text='Load curation table (optional)', font=('Arial', 14),
+                                        command=lambda: self.seleciona_curadoria('eng'))
+            botao_curadoria.grid(row=2, column=0, padx=10, pady=5, sticky='nsew', columnspan=2)
+
+            self.label_curadoria = tk.Label(frame_pipeline, text='No curation table: assigned taxa are kept', font=('Arial', 12))
+            self.label_curadoria.grid(row=3, column=0, padx=10, pady=5, columnspan=2)
+
+            self.var_intermediarios = tk.BooleanVar(frame_pipeline)
+            botao_intermediarios = tk.Checkbutton(frame_pipeline, text='Also save the threshold tables', variable=self.var_intermediarios,
+                                                  font=('Arial', 14))
+            botao_intermediarios.grid(row=4, column=0, sticky='w', columnspan=2)
+
+            botao_run = tk.Button(nova_janela, text='RUN',  font=('Arial', 14, 'bold'), width=44, command=lambda: self.roda_analise_secundaria(caixa_amostradores, var_amostrador, var_area, 'eng', nova_janela, caixa_compressao))
             botao_run.grid(row=2, column=0, padx=10, pady=10, columnspan=3)
 
         elif idioma == 'pt-br':
@@ -548,9 +1066,46 @@ class Janelas:
             caixa_amostradores = tk.Text(frame_amostradores, font=('Arial', 14), width=10, height=5)
             caixa_amostradores.grid(row=1, column=1, padx=10, pady=10, columnspan=3)
 
+            frame_compressao = tk.LabelFrame(frame, text='Compressão do ZIP', font=('Arial', 15))
+            frame_compressao.grid(row=4, column=0)
+
+            caixa_compressao = ttk.Combobox(frame_compressao, values=list(COMPRESSOES_ZIP['pt-br']), state='readonly',
+                                            font=('Arial', 14), width=25)
+            caixa_compressao.current(0)
+            caixa_compressao.grid(row=0, column=0, padx=10, pady=10)
+
+            frame_pipeline = tk.LabelFrame(frame, text='Threshold na mesma execução', font=('Arial', 15))
+            frame_pipeline.grid(row=5, column=0)
+
+            self.var_pipeline = tk.BooleanVar(frame_pipeline)
+            botao_pipeline = tk.Checkbutton(frame_pipeline, text='Aplicar antes o threshold ao arquivo carregado',
+                                            variable=self.var_pipeline, font=('Arial', 14))
+            botao_pipeline.grid(row=0, column=0, sticky='w', columnspan=2)
+
+            label_threshold_pipeline = tk.Label(frame_pipeline, text='Threshold (%):', font=('Arial', 14))
+            label_threshold_pipeline.grid(row=1, column=0, padx=10, pady=5, sticky='w')
+
+            self.caixa_threshold_pipeline = tk.Entry(frame_pipeline, font=('Arial', 14), width=8)
+            self.caixa_threshold_pipeline.grid(row=1, column=1, padx=10, pady=5, sticky='w')
+
+            self.var_caminho_curadoria.set('')
+            botao_curadoria = tk.Button(frame_pipeline, text='Carregar tabela de curadoria (opcional)', font=('Arial', 14),
+                                        command=lambda: self.seleciona_curadoria('pt-br'))
+            botao_curadoria.grid(row=2, column=0, padx=10, pady=5, sticky='nsew', columnspan=2)
+
+            self.label_curadoria = tk.Label(frame_pipeline, text='Sem tabela de curadoria: os táxons atribuídos são mantidos',
+                                            font=('Arial', 12))
+            self.label_curadoria.grid(row=3, column=0, padx=10, pady=5, columnspan=2)
+
+            self.var_intermediarios = tk.BooleanVar(frame_pipeline)
+            botao_intermediarios = tk.Checkbutton(frame_pipeline, text='Salvar também as tabelas do threshold',
+                                                  variable=self.var_intermediarios, font=('Arial', 14))
+            botao_intermediarios.grid(row=4, column=0, sticky='w', columnspan=2)
+
             botao_run = tk.Button(nova_janela, text='RODAR', font=('Arial', 14, 'bold'), width=44,
                                   command=lambda: self.roda_analise_secundaria(caixa_amostradores, var_amostrador,
-                                                                               var_area, 'pt-br', nova_janela))
+                                                                               var_area, 'pt-br', nova_janela,
+                                                                               caixa_compressao))
             botao_run.grid(row=2, column=0, padx=10, pady=10, columnspan=3)
 
     def seleciona_arquivo(self, idioma):
@@ -560,19 +1115,38 @@ class Janelas:
         idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
         """
         if idioma == 'eng':
-            tipos_de_arquivo = [('Excel file', '*.xlsx'), ('CSV file', '*.csv')]
+            tipos_de_arquivo = [('Excel file', '*.xlsx'), ('CSV file', '*.csv'), *TIPOS_COLUNARES, *TIPOS_COMPACTOS]
             caminho_arquivo = askopenfilename(title='Load a file', filetypes=tipos_de_arquivo)
             self.var_caminho_arquivo.set(caminho_arquivo)
             if caminho_arquivo:
                 label_arquivo_selecionado['text'] = f'Loaded file {caminho_arquivo}'
         elif idioma == 'pt-br':
-            tipos_de_arquivo = [('Arquivo de Excel', '*.xlsx'), ('Arquivo CSV', '*.csv')]
+            tipos_de_arquivo = [('Arquivo de Excel', '*.xlsx'), ('Arquivo CSV', '*.csv'), *TIPOS_COLUNARES, *TIPOS_COMPACTOS]
             caminho_arquivo = askopenfilename(title='Carregue um arquivo', filetypes=tipos_de_arquivo)
             self.var_caminho_arquivo.set(caminho_arquivo)
             if caminho_arquivo:
                 label_arquivo_selecionado['text'] = f'Arquivo carregado {caminho_arquivo}'
 
-    def roda_analise_secundaria(self, caixa_amostradores, var_amostrador, var_area, idioma, contexto):
+    def seleciona_curadoria(self, idioma):
+        """Opens a dialog box for selecting the curation table (assigned taxon in the first column, curated taxon in the second).
+
+        Parameters:
+        idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
+        """
+        if idioma == 'eng':
+            tipos_de_arquivo = [('Excel file', '*.xlsx'), ('CSV file', '*.csv'), *TIPOS_COLUNARES]
+            caminho_curadoria = askopenfilename(title='Load the curation table', filetypes=tipos_de_arquivo)
+            if caminho_curadoria:
+                self.var_caminho_curadoria.set(caminho_curadoria)
+                self.label_curadoria['text'] = f'Curation table {caminho_curadoria}'
+        elif idioma == 'pt-br':
+            tipos_de_arquivo = [('Arquivo de Excel', '*.xlsx'), ('Arquivo CSV', '*.csv'), *TIPOS_COLUNARES]
+            caminho_curadoria = askopenfilename(title='Carregue a tabela de curadoria', filetypes=tipos_de_arquivo)
+            if caminho_curadoria:
+                self.var_caminho_curadoria.set(caminho_curadoria)
+                self.label_curadoria['text'] = f'Tabela de curadoria {caminho_curadoria}'
+
+    def roda_analise_secundaria(self, caixa_amostradores, var_amostrador, var_area, idioma, contexto, caixa_compressao):
         """Runs the second process of the program, filtering the taxonomic assignment table.
 
         Parameters:
@@ -581,118 +1155,131 @@ class Janelas:
         var_area (bool): "True" to filter by areas, "False" to not filter by areas.
         idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
         contexto (tkinter Toplevel widget): Context to add new widgets to the GUI.
+        caixa_compressao (ttk Combobox widget): Compression option chosen for .zip results.
         """
         self.fila_resultados_secundaria = queue.Queue()
+        self.compressao_zip = COMPRESSOES_ZIP[idioma][caixa_compressao.get()]
+        self.instrumentacao = processamento().Instrumentacao(perfil=PERFIL_EXECUCAO)
 
-        progressbar = ttk.Progressbar(contexto, mode='indeterminate')
-        progressbar.grid(row=4, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
-        progressbar.start()
+        self.pipeline_execucao = self.var_pipeline.get()
+        self.intermediarios_execucao = self.var_intermediarios.get()
+
+        progresso = self._cria_progresso(contexto, idioma, ETAPAS_PIPELINE if self.pipeline_execucao else ETAPAS_SECUNDARIAS)
 
         botao_run = contexto.grid_slaves(row=2, column=0)[0]
         botao_run.config(state='disabled')
 
         texto_amostradores = caixa_amostradores.get('1.0', tk.END)
-        lista_amostradores = texto_amostradores.split('\n')
-        lista_amostradores.pop(-1)
+        lista_amostradores = [amostrador.strip() for amostrador in texto_amostradores.split('\n') if amostrador.strip()]
 
         var_amostrador_val = var_amostrador.get()
         var_area_val = var_area.get()
+        self.var_amostrador_execucao = var_amostrador_val
+        self.var_area_execucao = var_area_val
+
+        funcao = 'executa_consolidacao'
+        argumentos = (self.var_caminho_arquivo.get(), lista_amostradores, var_amostrador_val, var_area_val)
+        if self.pipeline_execucao:
+            funcao = 'executa_pipeline'
+            string_threshold = self.caixa_threshold_pipeline.get()
+            try:
+                threshold = 0.05 if string_threshold == '' else float(string_threshold)
+            except ValueError:
+                self.fila_resultados_secundaria.put(('erro', 'ValueError'))
+                contexto.after(100, self._verifica_processamento_secundario, progresso, botao_run, idioma, contexto)
+                return
+            argumentos = (self.var_caminho_arquivo.get(), threshold, self.var_caminho_curadoria.get() or None,
+                          lista_amostradores, var_amostrador_val, var_area_val)
+        self.motor_execucao = self._motor(funcao)
+
+        if self.var_processo_isolado.get():
+            self.fila_resultados_secundaria = self._inicia_processo(funcao, argumentos)
+        else:
+            thread_processamento = threading.Thread(
+                target=self._processamento_secundario_thread,
+                args=(funcao, argumentos)
+            )
+            thread_processamento.daemon = True
+            thread_processamento.start()
 
-        thread_processamento = threading.Thread(
-            target=self._processamento_secundario_thread,
-            args=(lista_amostradores, var_amostrador_val, var_area_val, idioma)
-        )
-        thread_processamento.daemon = True
-        thread_processamento.start()
-
-        contexto.after(100, self._verifica_processamento_secundario, progressbar, botao_run, idioma, contexto)
+        contexto.after(100, self._verifica_processamento_secundario, progresso, botao_run, idioma, contexto)
 
-    def _processamento_secundario_thread(self, lista_amostradores, var_amostrador, var_area, idioma):
+    def _processamento_secundario_thread(self, funcao, argumentos):
         """Runs the second process of the program, filtering the taxonomic assignment table in a separate thread.
 
         Parameters:
-        lista_amostradores (list): List of samplers.
-        var_amostrador (bool): Indicates the choice to filter by samplers.
-        var_area (bool): Indicates the choice to filter by areas.
-        idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
+        funcao (str): Name of the stage function in metabar, "executa_consolidacao" or "executa_pipeline".
+        argumentos (tuple): Positional arguments of the stage function.
         """
         try:
-            if '.xlsx' in self.var_caminho_arquivo.get():
-                df = pd.read_excel(self.var_caminho_arquivo.get())
-            elif '.csv' in self.var_caminho_arquivo.get():
-                df = pd.read_csv(self.var_caminho_arquivo.get(), sep=None, encoding='utf-8-sig', engine='python')
-
-            lista_areas = define_areas(df)
-
-            ocorrencias_geral = conta_ocorrencias_gerais(df, lista_areas)
-            reads_gerais = conta_reads_gerais(df)
-            lista_geral = cria_lista_geral(ocorrencias_geral, reads_gerais)
-
-            if var_amostrador and not var_area:
-                amostradores = separa_amostradores(df, lista_amostradores)
-                ocorrencias = conta_ocorrencias(amostradores, amostradores=True)
-                reads_especie = calcula_reads_especie(amostradores, amostrador=True)
-                tabelas_finais = constroi_tabela_final(reads_especie, ocorrencias, amostradores=True)
-
-            elif var_area and not var_amostrador:
-                areas = separa_areas(lista_areas, df=df)
-                ocorrencias = conta_ocorrencias(areas, areas=True)
-                reads_especie = calcula_reads_especie(areas, area=True)
-                tabelas_finais = constroi_tabela_final(reads_especie, ocorrencias, areas=True)
-
-            elif var_amostrador and var_area:
-                amostradores = separa_amostradores(df, lista_amostradores)
-                lista_areas = define_areas(df)
-                areas = separa_areas(lista_areas, amostradores=amostradores)
-                ocorrencias_area = conta_ocorrencias(areas, amostradores=True, areas=True)
-                reads_especie = calcula_reads_especie(areas, amostrador=True, area=True)
-                tabelas_finais = constroi_tabela_final(reads_especie, ocorrencias_area, amostradores=True, areas=True)
-            else:
-                tabelas_finais = None
+            metabar = processamento()
+            emite = self._emissor_progresso(self.fila_resultados_secundaria)
+
+            resultado, origem = metabar.executa_com_cache(getattr(metabar, funcao), argumentos, emite, instrumentacao=self.instrumentacao,
+                                                          motor=self.motor_execucao)
 
-            self.fila_resultados_secundaria.put(('sucesso', lista_geral, tabelas_finais, var_amostrador, var_area))
+            self.fila_resultados_secundaria.put(('sucesso', origem, *resultado))
 
-        except (UnboundLocalError, KeyError) as e:
-            self.fila_resultados_secundaria.put(('erro', 'UnboundLocalError'))
+        except processamento().ProcessamentoCancelado:
+            self.fila_resultados_secundaria.put(('cancelado',))
+        except (processamento().FormatoNaoSuportado, KeyError) as e:
+            self.fila_resultados_secundaria.put(('erro', type(e).__name__))
         except Exception as e:
             self.fila_resultados_secundaria.put(('erro', 'Exception'))
 
-    def _verifica_processamento_secundario(self, progressbar, botao_run, idioma, contexto):
-        """Periodically checks whether secondary processing has finished.
+    def _verifica_processamento_secundario(self, progresso, botao_run, idioma, contexto):
+        """Periodically shows the progress of secondary processing and checks whether it has finished.
 
         Parameters:
-        progressbar (tkinter widget): progressbar widget.
+        progresso (dict): Progress widgets of the run (see _cria_progresso).
         botao_run (tkinter widget): run button widget.
         idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
         contexto (tkinter Toplevel widget): Context to add new widgets to the GUI.
         """
         try:
-            resultado = self.fila_resultados_secundaria.get_nowait()
+            resultado = self._proxima_mensagem(self.fila_resultados_secundaria)
+            while resultado[0] in ('progresso', 'instrumentacao'):
+                if resultado[0] == 'progresso':
+                    self._atualiza_progresso(progresso, resultado[1], idioma)
+                else:
+                    self.instrumentacao.etapas.extend(resultado[1])
+                resultado = self._proxima_mensagem(self.fila_resultados_secundaria)
             status, *dados = resultado
 
-            progressbar.stop()
-            progressbar.grid_forget()
+            self._remove_progresso(progresso)
             botao_run.config(state='normal')
 
             if status == 'sucesso':
-                lista_geral, tabelas_finais, var_amostrador, var_area = dados
+                dados = self._finaliza_processo(dados)
+            else:
+                self._finaliza_processo([])
 
-                if idioma == 'eng':
-                    msg_fim = tk.Label(contexto, text='Processing completed successfully!',
-                                       font=('Arial', 14, 'bold'), fg='#009900')
+            if status == 'cancelado':
+                self._mostrar_cancelamento(idioma, contexto)
+
+            elif status == 'sucesso':
+                origem, *dados = dados
+                if self.pipeline_execucao:
+                    resultado_curado, nao_selecionados_geral, thresholds, lista_geral, tabelas_finais, tempo_leitura, linhas_por_segundo = dados
                 else:
-                    msg_fim = tk.Label(contexto, text='Processamento concluído com sucesso!',
-                                       font=('Arial', 14, 'bold'), fg='#009900')
+                    lista_geral, tabelas_finais, tempo_leitura, linhas_por_segundo = dados
+
+                msg_fim = tk.Label(contexto, text=self._mensagem_conclusao(origem, tempo_leitura, linhas_por_segundo, idioma),
+                                   font=('Arial', 14, 'bold'), fg='#009900')
                 msg_fim.grid(row=5, column=0, padx=10, pady=10, sticky='nsew', columnspan=3)
 
-                self._salvar_arquivos_secundarios(lista_geral, tabelas_finais, var_amostrador, var_area, idioma)
+                if self.pipeline_execucao and self.intermediarios_execucao:
+                    self._salvar_arquivos_primarios(resultado_curado, nao_selecionados_geral, thresholds, idioma, curada=True)
+                self._salvar_arquivos_secundarios(lista_geral, tabelas_finais, self.var_amostrador_execucao, self.var_area_execucao, idioma)
 
             else:
                 tipo_erro = dados[0]
                 self._mostrar_erro_secundario(tipo_erro, idioma, contexto)
 
+            self._mostrar_instrumentacao(status, idioma, contexto)
+
         except queue.Empty:
-            contexto.after(100, self._verifica_processamento_secundario, progressbar, botao_run, idioma, contexto)
+            contexto.after(100, self._verifica_processamento_secundario, progresso, botao_run, idioma, contexto)
 
     def _mostrar_erro_secundario(self, tipo_erro, idioma, contexto):
         """Shows error messages.
@@ -703,13 +1290,17 @@ class Janelas:
         contexto (tkinter Toplevel widget): Context to add new widgets to the GUI.
         """
         if idioma == 'eng':
-            if tipo_erro == 'UnboundLocalError':
+            if tipo_erro in ('FormatoNaoSuportado', 'KeyError'):
                 texto = 'ERROR: No file loaded, invalid input or invalid samplers entered!'
+            elif tipo_erro == 'ValueError':
+                texto = 'ERROR: Invalid threshold value!'
             else:
                 texto = 'An ERROR occurred!'
         else:
-            if tipo_erro == 'UnboundLocalError':
+            if tipo_erro in ('FormatoNaoSuportado', 'KeyError'):
                 texto = 'ERRO: Nenhum arquivo carregado, input inválido ou amostradores informados inválidos!'
+            elif tipo_erro == 'ValueError':
+                texto = 'ERRO: Valor inválido para threshold!'
             else:
                 texto = 'Houve algum ERRO!'
 
@@ -726,42 +1317,49 @@ class Janelas:
         var_area (bool): Indicates the choice to filter by areas.
         idioma (str): Indicates the chosen language, Portuguese ("pt-br") or English ("eng-us").
         """
+        metabar = processamento()
+
         if idioma == 'eng':
             caminho_lista_geral = asksaveasfilename(title='Save general list', initialfile='general_list',
                                                     defaultextension='.*', filetypes=(
-                    ("Excel files", "*.xlsx"), ("CSV file", "*.csv"), ("All files", "*.*")))
+                    ("Excel files", "*.xlsx"), ("CSV file", "*.csv"), *TIPOS_COLUNARES, ("All files", "*.*")))
         elif idioma == 'pt-br':
             caminho_lista_geral = asksaveasfilename(title='Salve lista geral', initialfile='lista_geral',
                                                     defaultextension='.*', filetypes=(
-                    ("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("All files", "*.*")))
+                    ("Excel files", "*.xlsx"), ("CSV files", "*.csv"), *TIPOS_COLUNARES, ("All files", "*.*")))
 
         if caminho_lista_geral:
-            if '.xlsx' in caminho_lista_geral:
-                lista_geral.to_excel(caminho_lista_geral)
-            elif '.csv' in caminho_lista_geral:
-                lista_geral.to_csv(caminho_lista_geral, sep=';', encoding='utf-8-sig')
+            with metabar.mede_etapa(self.instrumentacao, 'gravacao', len(lista_geral), 1):
+                metabar.salva_tabela(lista_geral, caminho_lista_geral)
 
         if var_amostrador or var_area:
             if idioma == 'eng':
                 caminho_resultado = asksaveasfilename(title='Save results', initialfile='results',
                                                       defaultextension='.*', filetypes=(
-                        ("Excel files", "*.xlsx"), ("ZIP for CSV files", "*.zip"), ("All files", "*.*")))
+                        ("Excel files", "*.xlsx"), ("ZIP for CSV files", "*.zip"), *TIPOS_COLUNARES, ("All files", "*.*")))
             elif idioma == 'pt-br':
                 caminho_resultado = asksaveasfilename(title='Salve os resultados', initialfile='resultados',
                                                       defaultextension='.*', filetypes=(
-                        ("Excel files", "*.xlsx"), ("ZIP for CSV files", "*.zip"), ("All files", "*.*")))
+                        ("Excel files", "*.xlsx"), ("ZIP for CSV files", "*.zip"), *TIPOS_COLUNARES, ("All files", "*.*")))
 
             if caminho_resultado:
-                if var_amostrador and not var_area:
-                    salva_resultados(tabelas_finais, caminho_resultado, amostrador=True)
-                elif var_area and not var_amostrador:
-                    salva_resultados(tabelas_finais, caminho_resultado, area=True)
-                elif var_amostrador and var_area:
-                    salva_resultados(tabelas_finais, caminho_resultado, amostrador=True, area=True)
+                compressao, nivel_compressao = self.compressao_zip
+                n_tabelas, n_linhas = metabar.conta_tabelas(tabelas_finais)
+                with metabar.mede_etapa(self.instrumentacao, 'gravacao', n_linhas, n_tabelas):
+                    if var_amostrador and not var_area:
+                        metabar.salva_resultados(tabelas_finais, caminho_resultado, amostrador=True,
+                                         compressao=compressao, nivel_compressao=nivel_compressao)
+                    elif var_area and not var_amostrador:
+                        metabar.salva_resultados(tabelas_finais, caminho_resultado, area=True,
+                                         compressao=compressao, nivel_compressao=nivel_compressao)
+                    elif var_amostrador and var_area:
+                        metabar.salva_resultados(tabelas_finais, caminho_resultado, amostrador=True, area=True,
+                                         compressao=compressao, nivel_compressao=nivel_compressao)
 
 
 def main():
     """Initializes the graphical interface and run the program."""
+    multiprocessing.freeze_support()
     janela = Janelas()
     janela.inicia_janela()
     janela.idioma.mainloop()
@@ -1,5 +1,564 @@
+import numpy as np
 import pandas as pd
 import zipfile
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import copy
+import cProfile
+import csv
+import glob
+import hashlib
+import importlib.util
+import io
+import itertools
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+TIPOS_COLUNAS = {
+    'amostra_sequenciamento': 'string',
+    'sequencing_sample': 'string',
+    'barcode': 'string',
+    'tag': 'string',
+    'area_amostrador': 'string',
+    'area_sampler': 'string',
+    'n_reads': 'Int64',
+    '%_id': 'float64',
+    'taxon': 'string',
+    'taxon_final_curada': 'string',
+    'final_taxon_curated': 'string',
+}
+
+MOTOR_CSV = 'pyarrow' if importlib.util.find_spec('pyarrow') is not None else 'c'
+MOTOR_XLSX_LEITURA = 'calamine' if importlib.util.find_spec('python_calamine') is not None else 'openpyxl'
+
+MOTORES_PROCESSAMENTO = ['pandas'] + [motor for motor in ('polars', 'duckdb') if importlib.util.find_spec(motor) is not None]
+MOTOR_PROCESSAMENTO = os.environ.get('EDNANALYZER_ENGINE', 'pandas')
+
+TIPOS_DUCKDB = {'string': 'VARCHAR', 'Int64': 'BIGINT', 'float64': 'DOUBLE'}
+VALORES_NULOS_CSV = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA',
+                     'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+LIMITE_MEMORIA_DUCKDB = os.environ.get('EDNANALYZER_DUCKDB_MEMORY')
+
+COLUNAS_CATEGORICAS = ['amostra_sequenciamento', 'sequencing_sample', 'barcode', 'tag', 'area_amostrador', 'area_sampler',
+                       'ponto', 'point', 'taxon', 'taxon_final_curada', 'final_taxon_curated']
+COLUNAS_INTEIRAS = ['n_reads', 'aliquota', 'aliquot', 'otu/asv']
+
+COLUNAS_THRESHOLD = [('sequencing_sample', 'amostra_sequenciamento'), ('n_reads',)]
+COLUNAS_CONSOLIDACAO = [('area_sampler', 'area_amostrador'), ('point', 'ponto'), ('final_taxon_curated', 'taxon_final_curada'), ('n_reads',)]
+
+SEM_POSICOES = np.array([], dtype=np.intp)
+
+EXTENSOES_COLUNARES = ['.parquet', '.feather', '.arrow']
+
+EXTENSAO_COMPACTA = '.otus'
+MAGICO_COMPACTA = b'EDNAOTU1'
+ALINHAMENTO_COMPACTA = 64
+
+MOTOR_XLSX = 'xlsxwriter' if importlib.util.find_spec('xlsxwriter') is not None else 'openpyxl'
+LIMITE_LINHAS_XLSX = 100000
+
+PASTA_CACHE = os.environ.get('EDNANALYZER_CACHE', os.path.join(os.path.expanduser('~'), '.ednanalyzer', 'cache'))
+LIMITE_CACHE = 2 * 1024 ** 3
+VERSAO_CACHE = 2
+
+PASTA_RESULTADOS = os.path.join(PASTA_CACHE, 'resultados')
+LIMITE_RESULTADOS_MEMORIA = 8
+RESULTADOS_MEMORIA = collections.OrderedDict()
+
+PASTA_LOGS = os.environ.get('EDNANALYZER_LOGS', os.path.join(os.path.expanduser('~'), '.ednanalyzer', 'logs'))
+
+COMPRESSOES_CLI = {'stored': zipfile.ZIP_STORED, 'deflated': zipfile.ZIP_DEFLATED, 'bzip2': zipfile.ZIP_BZIP2, 'lzma': zipfile.ZIP_LZMA}
+
+
+class ProcessamentoCancelado(Exception):
+    """Raised when a run is cancelled through its progress callback."""
+
+
+class FormatoNaoSuportado(ValueError):
+    """Raised when an input file is not in one of the formats read by le_tabela."""
+
+
+def emite_progresso(progresso, etapa, feitos, total, linhas=None):
+    """Sends a progress event to the callback of a run, cancelling the run when the callback returns False.
+
+    The event is a dict with the keys "etapa" (stage name), "feitos" and "total" (groups, tables or rows done
+    out of the stage total, None when unknown) and "linhas" (rows processed so far in the stage).
+
+    Parameters:
+    progresso (callable): Function that receives each event (nothing is sent when None).
+    etapa (str): Stage name, e.g. "leitura", "threshold", "lista_geral", "consolidacao" or "gravacao".
+    feitos (int): Units done in the stage.
+    total (int): Total units of the stage.
+    linhas (int): Rows processed so far in the stage.
+    """
+    if progresso is None:
+        return
+    if progresso({'etapa': etapa, 'feitos': feitos, 'total': total, 'linhas': linhas}) is False:
+        raise ProcessamentoCancelado(etapa)
+
+
+class Instrumentacao:
+    """Records the wall time, CPU time, peak memory and rows and groups in and out of each stage of a run.
+
+    Each stage is a dict with the keys "etapa", "tempo" and "tempo_cpu" (seconds), "pico_memoria_mb" (highest
+    memory allocated by Python and NumPy during the stage, traced with tracemalloc; None when memory is not
+    traced), "linhas_entrada", "linhas_saida", "grupos_entrada", "grupos_saida" (None when they do not apply)
+    and "concluida" (False when the stage raised). CPU time is the time of the whole process, so it includes
+    the threads started by pyarrow.
+    """
+
+    def __init__(self, memoria=True, perfil=False):
+        """
+        Parameters:
+        memoria (bool): Indicates that the peak memory of each stage is traced (tracing slows allocations down).
+        perfil (bool): Indicates that the stages are profiled with cProfile (see salva).
+        """
+        self.etapas = []
+        self.memoria = memoria
+        self.perfil = cProfile.Profile() if perfil else None
+        self.nome = time.strftime('%Y%m%d-%H%M%S') + f'_{os.getpid()}'
+        self.ativa = False
+
+    @contextlib.contextmanager
+    def etapa(self, nome, linhas_entrada=None, grupos_entrada=None):
+        """Measures the code run inside the with block as one stage.
+
+        The rows and groups out are set by the caller in the yielded dict. Stages started inside another stage
+        are timed, but neither traced nor profiled.
+
+        Parameters:
+        nome (str): Stage name, the same used in the progress events.
+        linhas_entrada (int): Rows given to the stage.
+        grupos_entrada (int): Groups (tables, sequencing samples, areas) given to the stage.
+
+        Returns:
+        registro (dict): Record of the stage.
+        """
+        registro = {'etapa': nome, 'tempo': None, 'tempo_cpu': None, 'pico_memoria_mb': None, 'linhas_entrada': linhas_entrada,
+                    'linhas_saida': None, 'grupos_entrada': grupos_entrada, 'grupos_saida': None, 'concluida': False}
+        externa = not self.ativa
+        rastreia = externa and self.memoria and not tracemalloc.is_tracing()
+
+        self.ativa = True
+        if rastreia:
+            tracemalloc.start()
+        if externa and self.perfil is not None:
+            self.perfil.enable()
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield registro
+            registro['concluida'] = True
+        finally:
+            registro['tempo'] = time.perf_counter() - inicio
+            registro['tempo_cpu'] = time.process_time() - inicio_cpu
+            if externa and self.perfil is not None:
+                self.perfil.disable()
+            if rastreia:
+                registro['pico_memoria_mb'] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+                tracemalloc.stop()
+            if externa:
+                self.ativa = False
+            self.etapas.append(registro)
+
+    def salva(self, caminho_log=None, caminho_perfil=None, **contexto):
+        """Saves the run log as JSON and, when profiling, the cProfile statistics (readable with pstats or snakeviz).
+
+        Parameters:
+        caminho_log (str): Path of the run log (a file named after the run in PASTA_LOGS when None).
+        caminho_perfil (str): Path of the profile (the run log path with the .prof extension when None).
+        **contexto: Values saved with the stages, e.g. the input file and the parameters of the run.
+
+        Returns:
+        caminho_log (str): Path of the JSON run log.
+        """
+        if caminho_log is None:
+            caminho_log = os.path.join(PASTA_LOGS, self.nome + '.json')
+        if os.path.dirname(caminho_log):
+            os.makedirs(os.path.dirname(caminho_log), exist_ok=True)
+
+        if self.perfil is not None:
+            if caminho_perfil is None:
+                caminho_perfil = os.path.splitext(caminho_log)[0] + '.prof'
+            self.perfil.dump_stats(caminho_perfil)
+            contexto['perfil'] = caminho_perfil
+
+        log = {'execucao': self.nome, 'contexto': contexto, 'etapas': self.etapas,
+               'tempo_total': sum(registro['tempo'] for registro in self.etapas),
+               'tempo_cpu_total': sum(registro['tempo_cpu'] for registro in self.etapas)}
+        with open(caminho_log, 'w', encoding='utf-8') as arquivo:
+            json.dump(log, arquivo, indent=2, default=str)
+        return caminho_log
+
+
+def mede_etapa(instrumentacao, nome, linhas_entrada=None, grupos_entrada=None):
+    """Measures a stage with an Instrumentacao, or does nothing when there is none.
+
+    Parameters:
+    instrumentacao (Instrumentacao): Instrumentation of the run (None disables the measurement).
+    nome (str): Stage name.
+    linhas_entrada (int): Rows given to the stage.
+    grupos_entrada (int): Groups given to the stage.
+
+    Returns:
+    contexto (context manager): Yields the record of the stage, where the rows and groups out are set.
+    """
+    if instrumentacao is None:
+        return contextlib.nullcontext({})
+    return instrumentacao.etapa(nome, linhas_entrada, grupos_entrada)
+
+
+def conta_tabelas(tabelas):
+    """Counts the dataframes and their rows in a result made of dicts and lists of dataframes.
+
+    Parameters:
+    tabelas: Dataframe, or dict or list of results.
+
+    Returns:
+    n_tabelas (int): Number of dataframes.
+    n_linhas (int): Total rows of the dataframes.
+    """
+    if isinstance(tabelas, pd.DataFrame):
+        return 1, len(tabelas)
+    if isinstance(tabelas, dict):
+        tabelas = list(tabelas.values())
+    if isinstance(tabelas, (list, tuple)):
+        contagens = [conta_tabelas(tabela) for tabela in tabelas]
+        return sum(n for n, _ in contagens), sum(linhas for _, linhas in contagens)
+    return 0, 0
+
+
+def detecta_separador(caminho_arquivo):
+    """Detects the column separator of a CSV file from its header line only.
+
+    Parameters:
+    caminho_arquivo (str): Path to the CSV file.
+
+    Returns:
+    separador (str): Column separator used in the file.
+    """
+    with open(caminho_arquivo, encoding='utf-8-sig', newline='') as arquivo:
+        cabecalho = arquivo.readline()
+
+    try:
+        separador = csv.Sniffer().sniff(cabecalho, delimiters=';,\t|').delimiter
+    except csv.Error:
+        separador = ','
+
+    return separador
+
+
+def ajusta_tipos_lidos(df, reads_nulos=None):
+    """Gives the columns read with the TIPOS_COLUNAS schema the dtypes pandas infers for them.
+
+    Text columns become object columns with NaN for the missing cells and the nullable integer columns become int64,
+    or float64 when they have missing values.
+
+    Parameters:
+    df (DataFrame): Dataframe read with the TIPOS_COLUNAS schema.
+    reads_nulos (bool): Whether the nullable integer columns become float64, so that every chunk of a file gets the same
+    dtype (decided from df when None).
+
+    Returns:
+    df (DataFrame): Dataframe with the adjusted dtypes.
+    """
+    for coluna in df.columns:
+        if isinstance(df[coluna].dtype, pd.StringDtype):
+            df[coluna] = df[coluna].astype(object).where(df[coluna].notna(), np.nan)
+        elif TIPOS_COLUNAS.get(coluna) == 'Int64':
+            nulos = df[coluna].hasnans if reads_nulos is None else reads_nulos
+            df[coluna] = df[coluna].astype('float64' if nulos else 'int64')
+
+    return df
+
+
+def le_csv(caminho_arquivo, **kwargs):
+    """Reads a CSV file with the C or pyarrow parser and an explicit dtype schema.
+
+    The separator is detected from the header line, so the file is parsed by a compiled engine instead of
+    the pure-Python parser used by sep=None. Chunks read with chunksize keep the nullable dtypes of the schema
+    (see ajusta_tipos_lidos).
+
+    Parameters:
+    caminho_arquivo (str): Path to the CSV file.
+    **kwargs: Extra arguments passed to pandas.read_csv (e.g. chunksize, which requires the C engine).
+
+    Returns:
+    df (DataFrame): Dataframe with the file contents.
+    """
+    separador = detecta_separador(caminho_arquivo)
+
+    with open(caminho_arquivo, encoding='utf-8-sig', newline='') as arquivo:
+        colunas = next(csv.reader(arquivo, delimiter=separador), [])
+    tipos = {coluna: TIPOS_COLUNAS[coluna] for coluna in colunas if coluna in TIPOS_COLUNAS}
+
+    if 'chunksize' in kwargs:
+        return pd.read_csv(caminho_arquivo, sep=separador, engine='c', encoding='utf-8-sig', dtype=tipos, **kwargs)
+
+    df = pd.read_csv(caminho_arquivo, sep=separador, engine=MOTOR_CSV, encoding='utf-8-sig', dtype=tipos, **kwargs)
+    return ajusta_tipos_lidos(df)
+
+
+def le_xlsx(caminho_arquivo):
+    """Reads the first sheet of an .xlsx file row by row into typed columns.
+
+    The python-calamine reader is used when installed. Otherwise the sheet is streamed with openpyxl in
+    read-only mode and each row is appended straight to its columns, skipping the generic text parser used
+    by pandas.read_excel.
+
+    Parameters:
+    caminho_arquivo (str): Path to the .xlsx file.
+
+    Returns:
+    df (DataFrame): Dataframe with the file contents.
+    """
+    if MOTOR_XLSX_LEITURA == 'calamine':
+        df = pd.read_excel(caminho_arquivo, engine='calamine')
+    else:
+        from openpyxl import load_workbook
+        livro = load_workbook(caminho_arquivo, read_only=True, data_only=True, keep_links=False)
+        try:
+            linhas = livro.worksheets[0].iter_rows(values_only=True)
+            cabecalho = next(linhas, ())
+            while cabecalho and cabecalho[-1] is None:
+                cabecalho = cabecalho[:-1]
+            cabecalho = [f'Unnamed: {i}' if nome is None else nome for i, nome in enumerate(cabecalho)]
+
+            colunas = [[] for _ in cabecalho]
+            for linha in linhas:
+                if all(valor is None or valor == '' for valor in linha):
+                    continue
+                for coluna, valor in itertools.zip_longest(colunas, linha[:len(colunas)]):
+                    if isinstance(valor, float) and valor.is_integer():
+                        valor = int(valor)
+                    coluna.append(np.nan if valor is None or valor == '' else valor)
+        finally:
+            livro.close()
+
+        df = pd.DataFrame({nome: pd.Series(valores, dtype=object).infer_objects() for nome, valores in zip(cabecalho, colunas)})
+
+    tipos = {coluna: TIPOS_COLUNAS[coluna] for coluna in df.columns if coluna in TIPOS_COLUNAS and TIPOS_COLUNAS[coluna] != 'string'}
+    df = df.astype(tipos)
+    return ajusta_tipos_lidos(df)
+
+
+def chave_cache(caminho_arquivo, configuracoes):
+    """Builds the cache key of an input file from its contents and the parser settings.
+
+    Parameters:
+    caminho_arquivo (str): Path to the input file.
+    configuracoes (dict): Parser settings used to read the file.
+
+    Returns:
+    chave (str): Hexadecimal SHA-256 digest identifying the parsed table.
+    """
+    hash_arquivo = hashlib.sha256()
+    with open(caminho_arquivo, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            hash_arquivo.update(bloco)
+
+    hash_arquivo.update(json.dumps(configuracoes, sort_keys=True, default=str).encode())
+    chave = hash_arquivo.hexdigest()
+    return chave
+
+
+def le_cache(chave, pasta_cache=PASTA_CACHE):
+    """Loads a parsed table from the cache, memory-mapping the stored Feather file.
+
+    Parameters:
+    chave (str): Cache key of the table.
+    pasta_cache (str): Cache directory.
+
+    Returns:
+    df (DataFrame): Cached dataframe, or None when the key is not in the cache.
+    """
+    caminho_cache = os.path.join(pasta_cache, f'{chave}.feather')
+    if not os.path.exists(caminho_cache):
+        return None
+
+    from pyarrow import feather
+    df = feather.read_table(caminho_cache, memory_map=True).to_pandas()
+    os.utime(caminho_cache)
+    return df
+
+
+def salva_cache(chave, df, pasta_cache=PASTA_CACHE, limite_cache=LIMITE_CACHE):
+    """Stores a parsed table in the cache and evicts the least recently used entries above the size limit.
+
+    Parameters:
+    chave (str): Cache key of the table.
+    df (DataFrame): Parsed dataframe.
+    pasta_cache (str): Cache directory.
+    limite_cache (int): Maximum size of the cache directory in bytes.
+    """
+    from pyarrow import feather
+    os.makedirs(pasta_cache, exist_ok=True)
+
+    caminho_cache = os.path.join(pasta_cache, f'{chave}.feather')
+    caminho_temporario = caminho_cache + '.tmp'
+    try:
+        feather.write_feather(df, caminho_temporario, compression='uncompressed')
+    except Exception:
+        if os.path.exists(caminho_temporario):
+            os.remove(caminho_temporario)
+        return
+    os.replace(caminho_temporario, caminho_cache)
+
+    entradas = [entrada for entrada in os.scandir(pasta_cache) if entrada.name.endswith('.feather')]
+    entradas.sort(key=lambda entrada: entrada.stat().st_mtime, reverse=True)
+    tamanho_total = 0
+    for entrada in entradas:
+        tamanho_total += entrada.stat().st_size
+        if tamanho_total > limite_cache and entrada.path != caminho_cache:
+            os.remove(entrada.path)
+
+
+def limpa_cache(pasta_cache=PASTA_CACHE):
+    """Removes all tables and results stored in the cache, on disk and in memory.
+
+    Parameters:
+    pasta_cache (str): Cache directory.
+    """
+    if os.path.isdir(pasta_cache):
+        for entrada in os.scandir(pasta_cache):
+            if entrada.name.endswith(('.feather', '.tmp')):
+                os.remove(entrada.path)
+        shutil.rmtree(os.path.join(pasta_cache, 'resultados'), ignore_errors=True)
+    RESULTADOS_MEMORIA.clear()
+
+
+def le_colunar(caminho_arquivo):
+    """Reads a table saved in Parquet, Feather or Arrow IPC format, keeping its dtypes and categoricals.
+
+    Parameters:
+    caminho_arquivo (str): Path to the .parquet, .feather or .arrow file.
+
+    Returns:
+    df (DataFrame): Dataframe with the file contents.
+    """
+    if '.parquet' in caminho_arquivo:
+        from pyarrow import parquet
+        tabela = parquet.read_table(caminho_arquivo, memory_map=True)
+    elif '.feather' in caminho_arquivo:
+        from pyarrow import feather
+        tabela = feather.read_table(caminho_arquivo, memory_map=True)
+    elif '.arrow' in caminho_arquivo:
+        import pyarrow
+        with pyarrow.memory_map(caminho_arquivo) as fonte:
+            tabela = pyarrow.ipc.open_file(fonte).read_all()
+
+    df = tabela.to_pandas()
+
+    metadados = tabela.schema.pandas_metadata or {}
+    for coluna in metadados.get('columns', []):
+        if coluna['pandas_type'] == 'categorical' and coluna['name'] in df.columns and df[coluna['name']].dtype != 'category':
+            df[coluna['name']] = df[coluna['name']].astype('category')
+
+    return df
+
+
+def le_tabela(caminho_arquivo, usar_cache=True):
+    """Reads an input table in .xlsx, .csv, .parquet, .feather, .arrow or compact .otus format.
+
+    When pyarrow is installed the parsed .xlsx/.csv table is cached by file contents and parser settings, so
+    reopening the same file in either stage memory-maps the cached copy instead of parsing it again.
+
+    Parameters:
+    caminho_arquivo (str): Path to the file to be read.
+    usar_cache (bool): Indicates whether the parsed-table cache is used.
+
+    Returns:
+    df (DataFrame): Dataframe with the file contents.
+
+    Raises:
+    FormatoNaoSuportado: When the file extension is not one of the formats above.
+    """
+    usar_cache = usar_cache and MOTOR_CSV == 'pyarrow' and os.path.isfile(caminho_arquivo) and \
+        ('.xlsx' in caminho_arquivo or '.csv' in caminho_arquivo)
+    if usar_cache:
+        configuracoes = {'versao': VERSAO_CACHE, 'extensao': os.path.splitext(caminho_arquivo)[1], 'tipos': TIPOS_COLUNAS,
+                         'leitor_xlsx': MOTOR_XLSX_LEITURA}
+        chave = chave_cache(caminho_arquivo, configuracoes)
+        df_cache = le_cache(chave)
+        if df_cache is not None:
+            return df_cache
+
+    if '.xlsx' in caminho_arquivo:
+        df = le_xlsx(caminho_arquivo)
+    elif '.csv' in caminho_arquivo:
+        df = le_csv(caminho_arquivo)
+    elif '.parquet' in caminho_arquivo or '.feather' in caminho_arquivo or '.arrow' in caminho_arquivo:
+        return le_colunar(caminho_arquivo)
+    elif EXTENSAO_COMPACTA in caminho_arquivo:
+        return le_compacta(caminho_arquivo).para_dataframe()
+    else:
+        raise FormatoNaoSuportado(f'unsupported file format: {caminho_arquivo!r}, use .xlsx, .csv, .parquet, .feather, .arrow or .otus')
+
+    if usar_cache:
+        salva_cache(chave, df)
+
+    return df
+
+
+def verifica_colunas(colunas, necessarias):
+    """Checks that a table has the columns required by a stage.
+
+    Parameters:
+    colunas (Index): Columns of the table.
+    necessarias (list): Required columns, each a tuple with its accepted names (see COLUNAS_THRESHOLD and COLUNAS_CONSOLIDACAO).
+
+    Raises:
+    KeyError: Naming the required columns missing from the table.
+    """
+    faltantes = ['/'.join(nomes) for nomes in necessarias if not any(nome in colunas for nome in nomes)]
+    if faltantes:
+        raise KeyError(', '.join(faltantes))
+
+
+def normaliza_tabela(df):
+    """Converts repeated text columns to categoricals and downcasts integer columns to the smallest fitting type.
+
+    Parameters:
+    df (DataFrame): Dataframe with metabarcoding results as read from the input file.
+
+    Returns:
+    df (DataFrame): Dataframe with the compact in-memory schema.
+    """
+    df = df.copy()
+    for coluna in df.columns:
+        if coluna in COLUNAS_CATEGORICAS:
+            df[coluna] = df[coluna].astype('category')
+        elif coluna in COLUNAS_INTEIRAS and pd.api.types.is_integer_dtype(df[coluna]):
+            df[coluna] = pd.to_numeric(df[coluna], downcast='integer')
+
+    return df
+
+
+def amplia_inteiros(serie):
+    """Widens an integer series to int64.
+
+    Grouped sums keep the dtype of their column, and normaliza_tabela downcasts n_reads to the smallest integer type that
+    fits its values, so sums of reads are widened before they are multiplied (e.g. by the threshold percentage).
+
+    Parameters:
+    serie (Series): Values computed from a normalized column.
+
+    Returns:
+    serie (Series): The same values, as int64 when they are integers.
+    """
+    if pd.api.types.is_integer_dtype(serie):
+        serie = serie.astype('int64')
+
+    return serie
+
 
 def separa_corridas(df):
     """Splits the complete dataframe into its individual sequencing samples.
@@ -61,6 +620,239 @@ def aplica_threshold(corridas, threshold_perc):
     return selecionados, nao_selecionados, df_thresholds
 
 
+def limites_threshold_polars(df, coluna_corrida, threshold_perc):
+    """Computes the read threshold of each sequencing sample and the mask of the selected OTUs/ASVs with Polars.
+
+    The read sums per sequencing sample, for each row and for each sample, run as lazy queries on all cores. The
+    sequencing samples are passed as integer codes, so the strings are not copied to Polars.
+
+    Parameters:
+    df (DataFrame): Database with metabarcoding results after Blast, without rows missing the sequencing sample.
+    coluna_corrida (str): Sequencing sample column.
+    threshold_perc (float): Percentage value for threshold calculation.
+
+    Returns:
+    thresholds (Series): Threshold per sequencing sample, in order of first appearance.
+    mascara (ndarray): True for the OTUs/ASVs above the threshold of their sequencing sample.
+    """
+    import polars as pl
+
+    codigos, _ = pd.factorize(df[coluna_corrida], sort=False)
+    tabela = pl.LazyFrame({'corrida': codigos, 'n_reads': pl.Series(df['n_reads'].to_numpy(), nan_to_null=True),
+                           'linha': np.arange(len(df))})
+
+    consulta_totais = tabela.select(pl.col('n_reads').sum().over('corrida'))
+    consulta_corridas = tabela.group_by('corrida', maintain_order=True).agg(pl.col('n_reads').sum(), pl.col('linha').first())
+    df_totais, df_corridas = pl.collect_all([consulta_totais, consulta_corridas])
+
+    # The percentage is applied with NumPy, in the same order of operations as pandas, so the floats are identical.
+    limites = df_totais.to_series().to_numpy() * threshold_perc / 100
+    mascara = df['n_reads'].to_numpy() > limites
+    indice = pd.Index(df[coluna_corrida].iloc[df_corridas['linha'].to_numpy()], name=coluna_corrida)
+    thresholds = pd.Series(df_corridas['n_reads'].to_numpy() * threshold_perc / 100, index=indice, name='n_reads')
+    return thresholds, mascara
+
+
+def aplica_threshold_agrupado(df, threshold_perc, progresso=None, motor=None):
+    """Applies the read threshold to all sequencing samples at once, without splitting the table first.
+
+    The total reads of each sequencing sample are computed with a single grouped transform and the rows are
+    split into selected and removed OTUs/ASVs with a single mask, giving the same results as
+    separa_corridas followed by aplica_threshold.
+
+    Parameters:
+    df (DataFrame): Database with metabarcoding results after Blast.
+    threshold_perc (float): Percentage value for threshold calculation.
+    progresso (callable): Receives the progress events of the "threshold" stage (see emite_progresso).
+    motor (str): Engine of the grouped sums, "pandas" or "polars" (MOTOR_PROCESSAMENTO when None).
+
+    Returns:
+    selecionados (dict): Dictionary with dataframes containing selected OTUs/ASVs.
+    nao_selecionados (dict): Dictionary with dataframes containing removed OTUs/ASVs.
+    df_thresholds (DataFrame): Dataframe with calculated threshold values per sequencing sample.
+    """
+    if 'amostra_sequenciamento' in df.columns:
+        coluna_corrida = 'amostra_sequenciamento'
+    elif 'sequencing_sample' in df.columns:
+        coluna_corrida = 'sequencing_sample'
+
+    df = df[df[coluna_corrida].notna()]
+    if (motor or MOTOR_PROCESSAMENTO) == 'polars':
+        thresholds, mascara = limites_threshold_polars(df, coluna_corrida, threshold_perc)
+    else:
+        agrupado = df.groupby(coluna_corrida, sort=False, observed=True)['n_reads']
+
+        thresholds = amplia_inteiros(agrupado.sum()) * threshold_perc / 100
+        limites = amplia_inteiros(agrupado.transform('sum')) * threshold_perc / 100
+        mascara = df['n_reads'] > limites
+
+    selecionados = {corrida: df.iloc[0:0] for corrida in thresholds.index}
+    nao_selecionados = dict(selecionados)
+
+    total = 2 * len(thresholds)
+    feitos = 0
+    linhas = 0
+    emite_progresso(progresso, 'threshold', feitos, total, linhas)
+    for tabelas, parte in ((selecionados, df[mascara]), (nao_selecionados, df[~mascara])):
+        grupos = parte.groupby(coluna_corrida, sort=False, observed=True)
+        for corrida, tabela in grupos:
+            tabelas[corrida] = tabela
+            feitos += 1
+            linhas += len(tabela)
+            emite_progresso(progresso, 'threshold', feitos, total, linhas)
+        if grupos.ngroups < len(thresholds):
+            feitos += len(thresholds) - grupos.ngroups
+            emite_progresso(progresso, 'threshold', feitos, total, linhas)
+
+    df_thresholds = thresholds.to_frame('Threshold').rename_axis(None)
+    return selecionados, nao_selecionados, df_thresholds
+
+
+def aplica_threshold_streaming(caminho_arquivo, threshold_perc, caminho_selecionados, caminho_nao_selecionados, tamanho_bloco=100000,
+                               progresso=None):
+    """Applies the read threshold to a CSV file in chunks, without loading the whole table into memory.
+
+    The first pass over the file collects the total reads per sequencing sample and the second pass writes
+    each chunk to the selected and removed OTUs/ASVs CSV files, so peak memory depends on tamanho_bloco and
+    not on the file size. Rows are written grouped by sequencing sample in the same order as the in-memory
+    path; when the rows of a sequencing sample are not contiguous in the input they are spooled to
+    temporary files and joined at the end.
+
+    Parameters:
+    caminho_arquivo (str): Path to the CSV file with metabarcoding results after Blast.
+    threshold_perc (float): Percentage value for threshold calculation.
+    caminho_selecionados (str): Path where the CSV with the selected OTUs/ASVs will be saved.
+    caminho_nao_selecionados (str): Path where the CSV with the removed OTUs/ASVs will be saved.
+    tamanho_bloco (int): Number of rows read per chunk.
+    progresso (callable): Receives the progress events of the "leitura" (first pass) and "threshold" (second pass, in rows) stages.
+
+    Returns:
+    df_thresholds (DataFrame): Dataframe with calculated threshold values per sequencing sample.
+
+    Raises:
+    FormatoNaoSuportado: When the input is not a .csv file.
+    """
+    if '.csv' not in caminho_arquivo:
+        raise FormatoNaoSuportado(f'streaming mode reads .csv files only: {caminho_arquivo!r}')
+
+    def le_blocos(reads_nulos):
+        return (ajusta_tipos_lidos(bloco, reads_nulos) for bloco in le_csv(caminho_arquivo, chunksize=tamanho_bloco))
+
+    totais = {}
+    vistas = set()
+    ultima_corrida = None
+    contiguo = True
+    reads_nulos = False
+    total_linhas = 0
+    for bloco in le_blocos(True):
+        total_linhas += len(bloco)
+        verifica_colunas(bloco.columns, COLUNAS_THRESHOLD)
+        reads_nulos = reads_nulos or bloco['n_reads'].hasnans
+        emite_progresso(progresso, 'leitura', total_linhas, None, total_linhas)
+        if 'amostra_sequenciamento' in bloco.columns:
+            coluna_corrida = 'amostra_sequenciamento'
+            coluna_curada = 'taxon_final_curada'
+        elif 'sequencing_sample' in bloco.columns:
+            coluna_corrida = 'sequencing_sample'
+            coluna_curada = 'final_taxon_curated'
+
+        bloco = bloco[bloco[coluna_corrida].notna()]
+        for corrida, reads in bloco.groupby(coluna_corrida, sort=False)['n_reads'].sum().items():
+            totais[corrida] = totais.get(corrida, 0) + reads
+
+        corridas = bloco[coluna_corrida]
+        for corrida in corridas[corridas.ne(corridas.shift())]:
+            if corrida == ultima_corrida:
+                continue
+            if corrida in vistas:
+                contiguo = False
+            vistas.add(corrida)
+            ultima_corrida = corrida
+
+    thresholds = {corrida: total * threshold_perc / 100 for corrida, total in totais.items()}
+
+    with tempfile.TemporaryDirectory() as pasta_temporaria, \
+            open(caminho_selecionados, 'w', encoding='utf-8-sig', newline='') as arquivo_selecionados, \
+            open(caminho_nao_selecionados, 'w', encoding='utf-8-sig', newline='') as arquivo_nao_selecionados:
+        saidas = {True: arquivo_selecionados, False: arquivo_nao_selecionados}
+        temporarios = {}
+        cabecalho = True
+        linhas = 0
+
+        for bloco in le_blocos(reads_nulos):
+            linhas += len(bloco)
+            bloco = bloco[bloco[coluna_corrida].notna()]
+            mascara = bloco['n_reads'] > bloco[coluna_corrida].map(thresholds)
+            tabelas = {True: bloco[mascara].assign(**{coluna_curada: ''}), False: bloco[~mascara]}
+
+            for selecionado, tabela in tabelas.items():
+                arquivo = saidas[selecionado]
+                if cabecalho:
+                    tabela.iloc[0:0].to_csv(arquivo, sep=';', index=False)
+                if contiguo:
+                    tabela.to_csv(arquivo, sep=';', index=False, header=False)
+                    continue
+                for corrida, tabela_corrida in tabela.groupby(coluna_corrida, sort=False):
+                    if (corrida, selecionado) not in temporarios:
+                        temporarios[(corrida, selecionado)] = os.path.join(pasta_temporaria, f'{len(temporarios)}.csv')
+                    tabela_corrida.to_csv(temporarios[(corrida, selecionado)], sep=';', index=False, header=False,
+                                          mode='a', encoding='utf-8')
+            cabecalho = False
+            emite_progresso(progresso, 'threshold', linhas, total_linhas, linhas)
+
+        for corrida in thresholds:
+            for selecionado, arquivo in saidas.items():
+                if (corrida, selecionado) in temporarios:
+                    with open(temporarios[(corrida, selecionado)], encoding='utf-8', newline='') as temporario:
+                        shutil.copyfileobj(temporario, arquivo)
+
+    df_thresholds = pd.DataFrame.from_dict(thresholds, orient='index')
+    df_thresholds = df_thresholds.rename(columns={0: 'Threshold'})
+    return df_thresholds
+
+
+def varredura_threshold(df, thresholds_perc):
+    """Evaluates several read thresholds at once, returning how many OTUs/ASVs and reads each one retains.
+
+    The reads of each sequencing sample are sorted once and the retained OTUs/ASVs and reads for every
+    threshold are taken from the cumulative sum of the sorted reads, so evaluating many thresholds costs
+    about the same as applying a single one. Empty n_reads cells count towards no total and are never
+    retained, as in aplica_threshold.
+
+    Parameters:
+    df (DataFrame): Database with metabarcoding results after Blast.
+    thresholds_perc (list): Percentage values for threshold calculation (a list, range or array).
+
+    Returns:
+    df_varredura (DataFrame): Dataframe with the threshold value and the retained OTUs/ASVs and reads per sequencing sample and threshold percentage.
+    """
+    verifica_colunas(df.columns, COLUNAS_THRESHOLD)
+    if 'amostra_sequenciamento' in df.columns:
+        coluna_corrida = 'amostra_sequenciamento'
+    elif 'sequencing_sample' in df.columns:
+        coluna_corrida = 'sequencing_sample'
+
+    percentuais = np.asarray(list(thresholds_perc), dtype=float)
+
+    tabelas = []
+    for corrida, reads in df.groupby(coluna_corrida, sort=False, observed=True)['n_reads']:
+        reads_ordenados = np.sort(reads.dropna().to_numpy(dtype='int64'))
+        reads_acumulados = np.concatenate(([0], np.cumsum(reads_ordenados)))
+        total_reads = reads_acumulados[-1]
+
+        thresholds = total_reads * percentuais / 100
+        removidos = np.searchsorted(reads_ordenados, thresholds, side='right')
+
+        tabelas.append(pd.DataFrame({coluna_corrida: corrida,
+                                     'Threshold (%)': percentuais,
+                                     'Threshold': thresholds,
+                                     'OTUs/ASVs': len(reads_ordenados) - removidos,
+                                     'Reads': total_reads - reads_acumulados[removidos]}))
+
+    df_varredura = pd.concat(tabelas, ignore_index=True)
+    return df_varredura
+
+
 def concatena_dfs(dfs):
     """Concatenates dataframes from a dictionary.
 
@@ -82,12 +874,12 @@ def define_areas(df):
     df (DataFrame): Dataframe with taxonomic assignment results and OTUs/ASVs equal or below the read threshold removed.
 
     Returns:
-    lista_areas (list): List of sampling areas.
+    lista_areas (list): List of sampling areas, in sorted order.
     """
     if 'area_amostrador' in df.columns:
-        lista_amostras = df['area_amostrador'].unique()
+        lista_amostras = list(df['area_amostrador'].unique())
     elif 'area_sampler' in df.columns:
-        lista_amostras = df['area_sampler'].unique()
+        lista_amostras = list(df['area_sampler'].unique())
 
     for i in range(len(lista_amostras)):
         lista_amostras[i] = tuple(lista_amostras[i].split('_'))
@@ -97,27 +889,93 @@ def define_areas(df):
     for area, amostrador in lista_amostras:
         lista_areas.append(area)
 
-    lista_areas = list(set(lista_areas))
+    lista_areas = sorted(set(lista_areas))
 
     return lista_areas
 
 
-def separa_amostradores(df, amostradores):
+def adiciona_chaves_area_amostrador(df):
+    """Splits the area/sampler column once into separate area and sampler key columns.
+
+    Parameters:
+    df (DataFrame): Dataframe with taxonomic assignment results.
+
+    Returns:
+    df (DataFrame): Dataframe with the area and sampler key columns added.
+    """
+    if 'area_amostrador' in df.columns:
+        origem, coluna_area, coluna_amostrador = 'area_amostrador', 'area', 'amostrador'
+    elif 'area_sampler' in df.columns:
+        origem, coluna_area, coluna_amostrador = 'area_sampler', 'area', 'sampler'
+
+    if coluna_area in df.columns and coluna_amostrador in df.columns:
+        return df
+
+    partes = {valor: [parte.strip() for parte in valor.split('_', 1)] for valor in df[origem].dropna().unique()}
+    areas = {valor: parte[0] for valor, parte in partes.items()}
+    amostradores = {valor: parte[-1] for valor, parte in partes.items()}
+
+    df = df.assign(**{coluna_area: df[origem].map(areas).astype('category'),
+                      coluna_amostrador: df[origem].map(amostradores).astype('category')})
+    return df
+
+
+def indexa_particoes(df):
+    """Builds a reusable index of row positions per sequencing sample, area, sampler and point.
+
+    The table is grouped once and the positions of each partition are combined into lookups by area, by
+    sampler, by sampler and area and by area and point, so the split functions can select rows without
+    scanning the whole table. Keys keep their order of first appearance in the table.
+
+    Parameters:
+    df (DataFrame): Dataframe with taxonomic assignment results.
+
+    Returns:
+    indice (dict): Dictionary with the row positions of each partition ("particoes") and of each area ("areas"), sampler ("amostradores"), sampler and area ("amostradores_areas") and area and point ("areas_pontos").
+    """
+    df = adiciona_chaves_area_amostrador(df)
+    if 'area_amostrador' in df.columns:
+        coluna_corrida, coluna_amostrador, coluna_ponto = 'amostra_sequenciamento', 'amostrador', 'ponto'
+    elif 'area_sampler' in df.columns:
+        coluna_corrida, coluna_amostrador, coluna_ponto = 'sequencing_sample', 'sampler', 'point'
+
+    colunas = [coluna for coluna in (coluna_corrida, 'area', coluna_amostrador, coluna_ponto) if coluna in df.columns]
+    particoes = df.groupby(colunas, sort=False, observed=True).indices
+    if len(colunas) < 4:
+        particoes = {(None,) + chave: posicoes for chave, posicoes in particoes.items()}
+
+    niveis = {'areas': lambda corrida, area, amostrador, ponto: area,
+              'amostradores': lambda corrida, area, amostrador, ponto: amostrador,
+              'amostradores_areas': lambda corrida, area, amostrador, ponto: (amostrador, area),
+              'areas_pontos': lambda corrida, area, amostrador, ponto: (area, ponto)}
+
+    indice = {'particoes': particoes}
+    for nivel, chave_nivel in niveis.items():
+        agrupado = {}
+        for chave, posicoes in particoes.items():
+            agrupado.setdefault(chave_nivel(*chave), []).append(posicoes)
+        indice[nivel] = {chave: np.sort(np.concatenate(posicoes)) for chave, posicoes in agrupado.items()}
+
+    return indice
+
+
+def separa_amostradores(df, amostradores, indice=None):
     """Filters the OTU/ASV table according to the sampler.
 
     Parameters:
     df (DataFrame): Dataframe with taxonomic assignment results and OTUs/ASVs equal or below the read threshold removed.
     amostradores (list): List with sampler designations.
+    indice (dict): Partition index of df built by indexa_particoes (built on the fly when not given).
 
     Returns:
     amst (dict): Dictionary with dataframes separated by sampler.
     """
+    if indice is None:
+        indice = indexa_particoes(df)
+
     amst = {}
     for amostrador in amostradores:
-        if 'area_amostrador' in df.columns:
-            amst[amostrador] = df[df['area_amostrador'].str.contains(amostrador)]
-        elif 'area_sampler' in df.columns:
-            amst[amostrador] = df[df['area_sampler'].str.contains(amostrador)]
+        amst[amostrador] = df.iloc[indice['amostradores'].get(amostrador, SEM_POSICOES)]
 
     return amst
 
@@ -125,6 +983,9 @@ def separa_amostradores(df, amostradores):
 def conta_ocorrencias_gerais(df, lista_areas):
     """Counts general taxon detections.
 
+    Each taxon is counted once per point of each area, by dropping duplicated (area, point, taxon) rows and
+    counting the remaining taxa once.
+
     Parameters:
     df (DataFrame): Dataframe with taxonomic assignment results and OTUs/ASVs equal or below the read threshold removed.
     lista_areas (list): List of sampling areas.
@@ -132,42 +993,24 @@ def conta_ocorrencias_gerais(df, lista_areas):
     Returns:
     cont_ocorr (DataFrame): Dataframe with general detection counts per taxon.
     """
-    contagens = []
+    df = adiciona_chaves_area_amostrador(df)
     if 'area_amostrador' in df.columns:
-        for area in lista_areas:
-            amst_areas = df[df['area_amostrador'].str.startswith(area)]
-
-            lista_pontos = list(amst_areas['ponto'].unique())
-
-            for ponto in lista_pontos:
-                areas_ponto = amst_areas[amst_areas['ponto'] == ponto]
-                taxons = areas_ponto['taxon_final_curada'].to_frame()
-                taxons = pd.DataFrame(taxons['taxon_final_curada'].unique())
-                contagens.append(taxons)
-
-            cont_ocorr = pd.concat(contagens, ignore_index=True)
-            cont_ocorr = cont_ocorr.value_counts()
-            cont_ocorr = pd.DataFrame(cont_ocorr)
-            cont_ocorr = cont_ocorr.sort_values(by='count', ascending=False).reset_index()
-            cont_ocorr = cont_ocorr.rename(columns={0: 'taxon', 'count': f'Detecções'})
-
+        coluna_ponto, coluna_taxon, rotulo = 'ponto', 'taxon_final_curada', 'Detecções'
     elif 'area_sampler' in df.columns:
-        for area in lista_areas:
-            amst_areas = df[df['area_sampler'].str.startswith(area)]
+        coluna_ponto, coluna_taxon, rotulo = 'point', 'final_taxon_curated', 'Detections'
 
-            lista_pontos = list(amst_areas['point'].unique())
+    taxons = df.loc[df['area'].isin(lista_areas) & df[coluna_ponto].notna(), ['area', coluna_ponto, coluna_taxon]]
 
-            for ponto in lista_pontos:
-                areas_ponto = amst_areas[amst_areas['point'] == ponto]
-                taxons = areas_ponto['final_taxon_curated'].to_frame()
-                taxons = pd.DataFrame(taxons['final_taxon_curated'].unique())
-                contagens.append(taxons)
+    ordem_areas = taxons['area'].map({area: i for i, area in enumerate(lista_areas)}).to_numpy()
+    ordem_pontos = taxons.groupby(['area', coluna_ponto], sort=False, observed=True).ngroup().to_numpy()
+    taxons = taxons.iloc[np.lexsort((ordem_pontos, ordem_areas))]
+    taxons = taxons.drop_duplicates(['area', coluna_ponto, coluna_taxon])
 
-        cont_ocorr = pd.concat(contagens, ignore_index=True)
-        cont_ocorr = cont_ocorr.value_counts()
-        cont_ocorr = pd.DataFrame(cont_ocorr)
-        cont_ocorr = cont_ocorr.sort_values(by='count', ascending=False).reset_index()
-        cont_ocorr = cont_ocorr.rename(columns={0: 'taxon', 'count': f'Detections'})
+    cont_ocorr = pd.DataFrame(np.asarray(taxons[coluna_taxon]))
+    cont_ocorr = cont_ocorr.value_counts()
+    cont_ocorr = pd.DataFrame(cont_ocorr)
+    cont_ocorr = cont_ocorr.sort_values(by='count', ascending=False).reset_index()
+    cont_ocorr = cont_ocorr.rename(columns={0: 'taxon', 'count': rotulo})
 
     return cont_ocorr
 
@@ -183,12 +1026,12 @@ def conta_reads_gerais(df):
     """
     if 'taxon_final_curada' in df.columns:
         df_read_sp = df[['n_reads', 'taxon_final_curada']]
-        df_read_sp = df_read_sp.groupby(by='taxon_final_curada').sum()
+        df_read_sp = df_read_sp.groupby(by='taxon_final_curada', observed=True).sum()
         df_read_sp = df_read_sp.sort_values(by='n_reads', ascending=False).reset_index()
         df_read_sp = df_read_sp.rename(columns={'taxon_final_curada': 'taxon', 'n_reads': 'Reads'})
     elif 'final_taxon_curated' in df.columns:
         df_read_sp = df[['n_reads', 'final_taxon_curated']]
-        df_read_sp = df_read_sp.groupby(by='final_taxon_curated').sum()
+        df_read_sp = df_read_sp.groupby(by='final_taxon_curated', observed=True).sum()
         df_read_sp = df_read_sp.sort_values(by='n_reads', ascending=False).reset_index()
         df_read_sp = df_read_sp.rename(columns={'final_taxon_curated': 'taxon', 'n_reads': 'Reads'})
 
@@ -212,13 +1055,40 @@ def cria_lista_geral(ocorrencias, reads):
     return lista_geral
 
 
-def separa_areas(lista_areas, amostradores=None, df=None):
+def lista_geral_agregada(ocorrencias, reads, rotulo, tipo_taxon, tipo_n_reads):
+    """Builds the general list from the detections and reads per taxon aggregated outside pandas.
+
+    Gives the same list as conta_ocorrencias_gerais, conta_reads_gerais and cria_lista_geral; the read sums keep
+    the dtype of the n_reads column when they fit in it, as the pandas grouped sum does (float when it has empty cells).
+
+    Parameters:
+    ocorrencias (DataFrame): Number of points where each taxon was detected, in the taxon and deteccoes columns.
+    reads (DataFrame): Total reads of each taxon, in the taxon and reads columns.
+    rotulo (str): Name of the detections column, "Detecções" or "Detections".
+    tipo_taxon (CategoricalDtype): Dtype of the taxon column of the table.
+    tipo_n_reads (dtype): Dtype of the n_reads column of the table.
+
+    Returns:
+    lista_geral (DataFrame): Final dataframe with detection and read counts for each taxon.
+    """
+    ocorrencias = pd.DataFrame({'taxon': np.asarray(ocorrencias['taxon'], dtype=object),
+                                rotulo: np.asarray(ocorrencias['deteccoes'], dtype='int64')})
+    reads = pd.DataFrame({'taxon': pd.Categorical(reads['taxon'], dtype=tipo_taxon),
+                          'Reads': np.asarray(reads['reads'], dtype=np.result_type(tipo_n_reads, 'int64'))})
+    if (reads['Reads'] == reads['Reads'].astype(tipo_n_reads)).all():
+        reads['Reads'] = reads['Reads'].astype(tipo_n_reads)
+
+    return cria_lista_geral(ocorrencias, reads)
+
+
+def separa_areas(lista_areas, amostradores=None, df=None, indice=None):
     """Filters the OTU/ASV table according to the areas.
 
     Parameters:
     lista_areas (list): List of area designations.
     amostradores (list): List with sampler designations.
     df (DataFrame): Dataframe with taxonomic assignment results and OTUs/ASVs equal or below the read threshold removed.
+    indice (dict): Partition index of df built by indexa_particoes (built on the fly when not given).
 
     Returns:
     amst (dict): Dictionary with dataframes separated by sampler.
@@ -226,21 +1096,20 @@ def separa_areas(lista_areas, amostradores=None, df=None):
     if amostradores is not None:
         areas_amostradores = {}
         for amostrador in amostradores:
-            tabela_amst = amostradores[amostrador]
+            tabela_amst = adiciona_chaves_area_amostrador(amostradores[amostrador])
+            posicoes_areas = tabela_amst.groupby('area', sort=False, observed=True).indices
             for area in lista_areas:
-                if 'area_amostrador' in tabela_amst.columns:
-                    areas_amostradores.setdefault(amostrador, []).append({area: tabela_amst[tabela_amst['area_amostrador'].str.contains(area)]})
-                elif 'area_sampler' in tabela_amst.columns:
-                    areas_amostradores.setdefault(amostrador, []).append({area: tabela_amst[tabela_amst['area_sampler'].str.contains(area)]})
+                tabela_area = amostradores[amostrador].iloc[posicoes_areas.get(area, SEM_POSICOES)]
+                areas_amostradores.setdefault(amostrador, []).append({area: tabela_area})
 
         return areas_amostradores
     elif df is not None:
+        if indice is None:
+            indice = indexa_particoes(df)
+
         areas = {}
         for area in lista_areas:
-            if 'area_amostrador' in df.columns:
-                areas[area] = df[df['area_amostrador'].str.contains(area)]
-            elif 'area_sampler' in df.columns:
-                areas[area] = df[df['area_sampler'].str.contains(area)]
+            areas[area] = df.iloc[indice['areas'].get(area, SEM_POSICOES)]
 
         return areas
 
@@ -269,7 +1138,7 @@ def conta_ocorrencias(dfs, amostradores=False, areas=False):
                         tabelas_taxons = []
                         for ponto in pontos:
                             df_ponto = tabela.loc[tabela['ponto'] == ponto]
-                            taxons = df_ponto['taxon_final_curada'].unique()
+                            taxons = np.asarray(df_ponto['taxon_final_curada'].unique())
                             df_taxons = pd.DataFrame(taxons, columns=[f'taxon'])
                             tabelas_taxons.append(df_taxons)
 
@@ -284,7 +1153,7 @@ def conta_ocorrencias(dfs, amostradores=False, areas=False):
                         tabelas_taxons = []
                         for ponto in pontos:
                             df_ponto = tabela.loc[tabela['point'] == ponto]
-                            taxons = df_ponto['final_taxon_curated'].unique()
+                            taxons = np.asarray(df_ponto['final_taxon_curated'].unique())
                             df_taxons = pd.DataFrame(taxons, columns=[f'taxon'])
                             tabelas_taxons.append(df_taxons)
 
@@ -304,7 +1173,7 @@ def conta_ocorrencias(dfs, amostradores=False, areas=False):
                 tabelas_taxons = []
                 for ponto in pontos:
                     df_ponto = tabela.loc[tabela['ponto'] == ponto]
-                    taxons = df_ponto['taxon_final_curada'].unique()
+                    taxons = np.asarray(df_ponto['taxon_final_curada'].unique())
                     df_taxons = pd.DataFrame(taxons, columns=[f'taxon'])
                     tabelas_taxons.append(df_taxons)
                 try:
@@ -321,7 +1190,7 @@ def conta_ocorrencias(dfs, amostradores=False, areas=False):
                 tabelas_taxons = []
                 for ponto in pontos:
                     df_ponto = tabela.loc[tabela['point'] == ponto]
-                    taxons = df_ponto['final_taxon_curated'].unique()
+                    taxons = np.asarray(df_ponto['final_taxon_curated'].unique())
                     df_taxons = pd.DataFrame(taxons, columns=[f'taxon'])
                     tabelas_taxons.append(df_taxons)
                 try:
@@ -344,7 +1213,7 @@ def conta_ocorrencias(dfs, amostradores=False, areas=False):
                 tabelas_taxons = []
                 for ponto in pontos:
                     df_ponto = tabela.loc[tabela['ponto'] == ponto]
-                    taxons = df_ponto['taxon_final_curada'].unique()
+                    taxons = np.asarray(df_ponto['taxon_final_curada'].unique())
                     df_taxons = pd.DataFrame(taxons, columns=[f'taxon'])
                     tabelas_taxons.append(df_taxons)
                 try:
@@ -361,7 +1230,7 @@ def conta_ocorrencias(dfs, amostradores=False, areas=False):
                 tabelas_taxons = []
                 for ponto in pontos:
                     df_ponto = tabela.loc[tabela['point'] == ponto]
-                    taxons = df_ponto['final_taxon_curated'].unique()
+                    taxons = np.asarray(df_ponto['final_taxon_curated'].unique())
                     df_taxons = pd.DataFrame(taxons, columns=[f'taxon'])
                     tabelas_taxons.append(df_taxons)
                 try:
@@ -397,13 +1266,13 @@ def calcula_reads_especie(dfs, amostrador=False, area=False):
                 for area, tabela in tabela_area.items():
                     if 'taxon_final_curada' in tabela.columns:
                         df_read_sp = tabela[['n_reads', 'taxon_final_curada']]
-                        df_read_sp = df_read_sp.groupby(by='taxon_final_curada').sum()
+                        df_read_sp = df_read_sp.groupby(by='taxon_final_curada', observed=True).sum()
                         df_read_sp = df_read_sp.sort_values(by='n_reads', ascending=False).reset_index()
                         df_read_sp = df_read_sp.rename(columns={'taxon_final_curada': 'Taxon', 'n_reads': 'Reads'})
                         reads_especie.setdefault(amostrador, []).append({area: df_read_sp})
                     elif 'final_taxon_curated' in tabela.columns:
                         df_read_sp = tabela[['n_reads', 'final_taxon_curated']]
-                        df_read_sp = df_read_sp.groupby(by='final_taxon_curated').sum()
+                        df_read_sp = df_read_sp.groupby(by='final_taxon_curated', observed=True).sum()
                         df_read_sp = df_read_sp.sort_values(by='n_reads', ascending=False).reset_index()
                         df_read_sp = df_read_sp.rename(columns={'final_taxon_curated': 'Taxon', 'n_reads': 'Reads'})
                         reads_especie.setdefault(amostrador, []).append({area: df_read_sp})
@@ -414,13 +1283,13 @@ def calcula_reads_especie(dfs, amostrador=False, area=False):
             tabela = dfs[amostrador]
             if 'taxon_final_curada' in tabela.columns:
                 df_read_sp = tabela[['n_reads', 'taxon_final_curada']]
-                df_read_sp = df_read_sp.groupby(by='taxon_final_curada').sum()
+                df_read_sp = df_read_sp.groupby(by='taxon_final_curada', observed=True).sum()
                 df_read_sp = df_read_sp.sort_values(by='n_reads', ascending=False).reset_index()
                 df_read_sp = df_read_sp.rename(columns={'taxon_final_curada': 'Taxon', 'n_reads': 'Reads'})
                 reads_especie.setdefault(amostrador, df_read_sp)
             elif 'final_taxon_curated' in tabela.columns:
                 df_read_sp = tabela[['n_reads', 'final_taxon_curated']]
-                df_read_sp = df_read_sp.groupby(by='final_taxon_curated').sum()
+                df_read_sp = df_read_sp.groupby(by='final_taxon_curated', observed=True).sum()
                 df_read_sp = df_read_sp.sort_values(by='n_reads', ascending=False).reset_index()
                 df_read_sp = df_read_sp.rename(columns={'final_taxon_curated': 'Taxon', 'n_reads': 'Reads'})
                 reads_especie.setdefault(amostrador, df_read_sp)
@@ -432,13 +1301,13 @@ def calcula_reads_especie(dfs, amostrador=False, area=False):
             tabela = dfs[area]
             if 'taxon_final_curada' in tabela.columns:
                 df_read_sp = tabela[['n_reads', 'taxon_final_curada']]
-                df_read_sp = df_read_sp.groupby(by='taxon_final_curada').sum()
+                df_read_sp = df_read_sp.groupby(by='taxon_final_curada', observed=True).sum()
                 df_read_sp = df_read_sp.sort_values(by='n_reads', ascending=False).reset_index()
                 df_read_sp = df_read_sp.rename(columns={'taxon_final_curada': 'Taxon', 'n_reads': 'Reads'})
                 reads_especie.setdefault(area, df_read_sp)
             elif 'final_taxon_curated' in tabela.columns:
                 df_read_sp = tabela[['n_reads', 'final_taxon_curated']]
-                df_read_sp = df_read_sp.groupby(by='final_taxon_curated').sum()
+                df_read_sp = df_read_sp.groupby(by='final_taxon_curated', observed=True).sum()
                 df_read_sp = df_read_sp.sort_values(by='n_reads', ascending=False).reset_index()
                 df_read_sp = df_read_sp.rename(columns={'final_taxon_curated': 'Taxon', 'n_reads': 'Reads'})
                 reads_especie.setdefault(area, df_read_sp)
@@ -498,98 +1367,1784 @@ def constroi_tabela_final(df_reads_sp, df_deteccoes, amostradores=False, areas=F
         return tabelas_finais
 
 
-def salva_resultados(tabelas_finais, caminho_salvar, amostrador=False, area=False):
-    """Saves result tables.
+def agrega_consolidacao_polars(df, chaves, coluna_ponto):
+    """Computes the reads and detections of each group of the consolidation with Polars.
+
+    Gives the same table as the pandas grouped aggregation in consolida_resultados: groups with a missing key are
+    dropped, keys are sorted as pandas sorts them (categories in category order) and the key columns keep
+    their dtypes. Keys and points are passed to Polars as integer codes.
 
     Parameters:
-    tabelas_finais (dict): Dictionary with dataframes representing the final tables with results displayed according to the filters.
-    caminho_salvar (str): Path where the file will be saved.
-    amostrador (bool): Indicates filtering by sampler.
-    area (bool): Indicates filtering by area.
+    df (DataFrame): Dataframe with taxonomic assignment results and the area and sampler key columns.
+    chaves (list): Key columns of the groups, the taxon column last.
+    coluna_ponto (str): Point column.
+
+    Returns:
+    agregado (DataFrame): Reads (sum of n_reads) and Deteccoes (number of distinct points) indexed by the keys.
     """
-    if amostrador and area:
-        for amostrador in tabelas_finais:
-            i = 0
-            tbls_fns = tabelas_finais[amostrador]
-            for tabela in tbls_fns:
-                area = list(tabela.keys())[0]
-                tabela_final = tabela[area]
-
-                if '.xlsx' in caminho_salvar:
-                    caminho_salvar_tratado = caminho_salvar.replace('.xlsx', '')
-                    if i == 0:
-                        with pd.ExcelWriter(caminho_salvar_tratado + f'_{amostrador}.xlsx', engine='openpyxl') as arquivo:
-                            tabela_final.to_excel(arquivo, sheet_name=area)
-                    else:
-                        with pd.ExcelWriter(caminho_salvar_tratado + f'_{amostrador}.xlsx', engine='openpyxl', mode='a') as arquivo:
-                            tabela_final.to_excel(arquivo, sheet_name=area)
-
-                elif '.zip' in caminho_salvar:
-                    caminho_salvar_tratado = caminho_salvar.replace('.zip', '')
-                    if i == 0:
-                        with zipfile.ZipFile(caminho_salvar_tratado + f'_{amostrador}.zip', "w") as zf:
-                            with zf.open(f"{amostrador}_{area}.csv", "w") as buffer:
-                                tabela_final.to_csv(buffer, sep=';', encoding='utf-8-sig')
-                    else:
-                        with zipfile.ZipFile(caminho_salvar_tratado + f'_{amostrador}.zip', "a") as zf:
-                            with zf.open(f"{amostrador}_{area}.csv", "w") as buffer:
-                                tabela_final.to_csv(buffer, sep=';', encoding='utf-8-sig')
-                i += 1
+    import polars as pl
+
+    df = df.dropna(subset=chaves)
+    colunas, rotulos = {}, {}
+    for chave in chaves:
+        if isinstance(df[chave].dtype, pd.CategoricalDtype):
+            colunas[chave] = df[chave].cat.codes.to_numpy()
+            rotulos[chave] = lambda codigos, serie=df[chave]: pd.Categorical.from_codes(codigos, dtype=serie.dtype)
+        else:
+            codigos, valores = pd.factorize(df[chave], sort=True)
+            colunas[chave] = codigos
+            rotulos[chave] = lambda codigos, valores=valores: valores.take(codigos)
+    colunas = {f'chave_{i}': codigos for i, codigos in enumerate(colunas.values())}
+    nomes = list(colunas)
+
+    agregado = (pl.LazyFrame({**colunas, 'n_reads': pl.Series(df['n_reads'].to_numpy(), nan_to_null=True),
+                              'ponto': pd.factorize(df[coluna_ponto])[0]})
+                .group_by(nomes)
+                .agg(pl.col('n_reads').sum().alias('Reads'),
+                     pl.col('ponto').filter(pl.col('ponto') >= 0).n_unique().cast(pl.Int64).alias('Deteccoes'))
+                .sort(nomes)
+                .collect())
+
+    indice = pd.MultiIndex.from_arrays([rotulos[chave](agregado[nome].to_numpy()) for chave, nome in zip(chaves, nomes)], names=chaves)
+    return pd.DataFrame({'Reads': agregado['Reads'].to_numpy(), 'Deteccoes': agregado['Deteccoes'].to_numpy()}, index=indice)
+
+
+def consolida_resultados(df, lista_areas=None, lista_amostradores=None, amostradores=False, areas=False, progresso=None, motor=None):
+    """Builds the consolidated result tables with a single grouped aggregation.
+
+    Reads (sum of n_reads) and detections (number of distinct points) are computed for every sampler, area
+    and taxon at once, and the result is split into the same tables returned by constroi_tabela_final after
+    separa_amostradores/separa_areas, conta_ocorrencias and calcula_reads_especie.
 
+    Parameters:
+    df (DataFrame): Dataframe with taxonomic assignment results and OTUs/ASVs equal or below the read threshold removed.
+    lista_areas (list): List of sampling areas (all areas in df when not given).
+    lista_amostradores (list): List with sampler designations (all samplers in df when not given).
+    amostradores (bool): Indicates filtering by sampler.
+    areas (bool): Indicates filtering by area.
+    progresso (callable): Receives the progress events of the "consolidacao" stage, counted in final tables (see emite_progresso).
+    motor (str): Engine of the grouped aggregation, "pandas" or "polars" (MOTOR_PROCESSAMENTO when None).
 
-    elif amostrador and not area:
-        i = 0
+    Returns:
+    tabelas_finais (dict): Dictionary with dataframes representing the final tables with results displayed according to the filters.
+    """
+    df = adiciona_chaves_area_amostrador(df)
+    if 'area_amostrador' in df.columns:
+        coluna_taxon, coluna_ponto, coluna_amostrador = 'taxon_final_curada', 'ponto', 'amostrador'
+    elif 'area_sampler' in df.columns:
+        coluna_taxon, coluna_ponto, coluna_amostrador = 'final_taxon_curated', 'point', 'sampler'
+
+    if lista_areas is None:
+        lista_areas = define_areas(df)
+    if lista_amostradores is None:
+        lista_amostradores = list(df[coluna_amostrador].dropna().unique())
+
+    if amostradores and areas:
+        chaves = [coluna_amostrador, 'area']
+    elif amostradores:
+        chaves = [coluna_amostrador]
+    elif areas:
+        chaves = ['area']
+
+    if amostradores:
+        df = df[df[coluna_amostrador].isin(lista_amostradores)]
+
+    if (motor or MOTOR_PROCESSAMENTO) == 'polars':
+        agregado = agrega_consolidacao_polars(df, chaves + [coluna_taxon], coluna_ponto)
+    else:
+        agregado = df.groupby(chaves + [coluna_taxon], sort=True, observed=True).agg(Reads=('n_reads', 'sum'),
+                                                                                    Deteccoes=(coluna_ponto, 'nunique'))
+
+    return divide_consolidacao(agregado, chaves, lista_areas, lista_amostradores, amostradores, areas, progresso, len(df))
+
+
+def divide_consolidacao(agregado, chaves, lista_areas, lista_amostradores, amostradores=False, areas=False, progresso=None, linhas=None):
+    """Splits the reads and detections of every group into the final tables by sampler and/or area.
+
+    Parameters:
+    agregado (DataFrame): Reads and Deteccoes indexed by the keys and the taxon, sorted by the keys.
+    chaves (list): Key columns of the groups (sampler and/or area).
+    lista_areas (list): List of sampling areas.
+    lista_amostradores (list): List with sampler designations.
+    amostradores (bool): Indicates filtering by sampler.
+    areas (bool): Indicates filtering by area.
+    progresso (callable): Receives the progress events of the "consolidacao" stage, counted in final tables (see emite_progresso).
+    linhas (int): Rows of the aggregated table, reported in the progress events.
+
+    Returns:
+    tabelas_finais (dict): Dictionary with dataframes representing the final tables with results displayed according to the filters.
+    """
+    if 'taxon_final_curada' in agregado.index.names:
+        coluna_taxon, rotulo_amostrador, rotulo_area = 'taxon_final_curada', 'Detecções por {}', 'Detecções em {}'
+    elif 'final_taxon_curated' in agregado.index.names:
+        coluna_taxon, rotulo_amostrador, rotulo_area = 'final_taxon_curated', 'Detections by {}', 'Detections in {}'
+
+    if pd.api.types.is_integer_dtype(agregado['Reads']):
+        agregado['Reads'] = agregado['Reads'].astype('int64')
+
+    grupos = {}
+    for chave, tabela in agregado.groupby(level=chaves if len(chaves) > 1 else chaves[0], sort=False, observed=True):
+        tabela = tabela.reset_index(level=chaves, drop=True).reset_index()
+        grupos[chave] = tabela.rename(columns={coluna_taxon: 'Taxon'})
+
+    if amostradores and areas:
+        total = sum((amostrador, area) in grupos for amostrador in lista_amostradores for area in lista_areas)
+    elif amostradores:
+        total = len(lista_amostradores)
+    else:
+        total = sum(area in grupos for area in lista_areas)
+    feitos = [0]
+    emite_progresso(progresso, 'consolidacao', 0, total, linhas)
+
+    def tabela_final(chave, rotulo):
+        tabela = grupos[chave].rename(columns={'Deteccoes': rotulo})
+        feitos[0] += 1
+        emite_progresso(progresso, 'consolidacao', feitos[0], total, linhas)
+        return tabela.sort_values('Reads', ascending=False).reset_index(drop=True)
+
+    tabelas_finais = {}
+    if amostradores and areas:
+        for amostrador in lista_amostradores:
+            presentes = [area for area in lista_areas if (amostrador, area) in grupos]
+            if not presentes:
+                raise KeyError(amostrador)
+            for area in presentes:
+                tabelas_finais.setdefault(amostrador, []).append({area: tabela_final((amostrador, area), rotulo_area.format(area))})
+
+    elif amostradores:
+        for amostrador in lista_amostradores:
+            tabelas_finais[amostrador] = tabela_final(amostrador, rotulo_amostrador.format(amostrador))
+
+    elif areas:
+        for area in lista_areas:
+            if area in grupos:
+                tabelas_finais[area] = tabela_final(area, rotulo_area.format(area))
+
+    return tabelas_finais
+
+
+def salva_xlsx(planilhas, caminho_salvar, index=True, streaming=None):
+    """Saves several dataframes as the sheets of one workbook, opening the file only once.
+
+    In streaming mode the rows are appended to a write-only openpyxl workbook one at a time, so memory use
+    does not grow with the size of the sheets.
+
+    Parameters:
+    planilhas (dict): Dataframes to be saved, identified by sheet name.
+    caminho_salvar (str): Path where the file will be saved.
+    index (bool): Indicates whether the dataframe index is written.
+    streaming (bool): Indicates row-streaming mode (used automatically for sheets above LIMITE_LINHAS_XLSX rows when not given).
+    """
+    if streaming is None:
+        streaming = any(len(tabela) > LIMITE_LINHAS_XLSX for tabela in planilhas.values())
+
+    if not streaming:
+        with pd.ExcelWriter(caminho_salvar, engine=MOTOR_XLSX) as arquivo:
+            for nome, tabela in planilhas.items():
+                tabela.to_excel(arquivo, sheet_name=nome, index=index)
+        return
+
+    from openpyxl import Workbook
+    livro = Workbook(write_only=True)
+    for nome, tabela in planilhas.items():
+        planilha = livro.create_sheet(title=nome)
+        planilha.append(([tabela.index.name] if index else []) + list(tabela.columns))
+        for linha in tabela.itertuples(index=index, name=None):
+            planilha.append([None if pd.isna(valor) else valor for valor in linha])
+    livro.save(caminho_salvar)
+
+
+def salva_colunar(df, caminho_salvar, index=True):
+    """Saves a table in Parquet, Feather or Arrow IPC format, keeping its dtypes and categoricals.
+
+    Parameters:
+    df (DataFrame): Table to be saved.
+    caminho_salvar (str): Path where the file will be saved, ending in .parquet, .feather or .arrow.
+    index (bool): Indicates whether the dataframe index is written.
+    """
+    import pyarrow
+    tabela = pyarrow.Table.from_pandas(df, preserve_index=None if index else False)
+
+    if '.parquet' in caminho_salvar:
+        from pyarrow import parquet
+        parquet.write_table(tabela, caminho_salvar)
+    elif '.feather' in caminho_salvar:
+        from pyarrow import feather
+        feather.write_feather(tabela, caminho_salvar)
+    elif '.arrow' in caminho_salvar:
+        with pyarrow.ipc.new_file(caminho_salvar, tabela.schema) as arquivo:
+            arquivo.write_table(tabela)
+
+
+def salva_tabela(df, caminho_salvar, index=True):
+    """Saves a single table in the format given by the file extension (.xlsx, .csv, .parquet, .feather, .arrow or .otus).
+
+    Parameters:
+    df (DataFrame): Table to be saved.
+    caminho_salvar (str): Path where the file will be saved.
+    index (bool): Indicates whether the dataframe index is written (.otus tables keep only the columns).
+    """
+    if '.xlsx' in caminho_salvar:
+        salva_xlsx({'Sheet1': df}, caminho_salvar, index=index)
+    elif '.csv' in caminho_salvar:
+        df.to_csv(caminho_salvar, sep=';', encoding='utf-8-sig', index=index)
+    elif '.parquet' in caminho_salvar or '.feather' in caminho_salvar or '.arrow' in caminho_salvar:
+        salva_colunar(df, caminho_salvar, index=index)
+    elif EXTENSAO_COMPACTA in caminho_salvar:
+        salva_compacta(compacta_tabela(df), caminho_salvar)
+
+
+class TabelaCompacta:
+    """OTU/ASV table kept as integer codes into sorted dictionaries plus contiguous numeric arrays.
+
+    Text columns (sequencing sample, area/sampler, point, taxon...) are stored as the codes of their values in a
+    dictionary sorted as pandas sorts the categories, with -1 for missing values, and numeric columns (reads,
+    identity...) as plain arrays. Saved by salva_compacta, the arrays are memory-mapped back by le_compacta.
+
+    Attributes:
+    colunas (dict): Columns in table order, each a tuple (kind, array, dictionary) where kind is "categoria" (decoded as a
+    categorical), "texto" (decoded as an object column) or "numero" (dictionary None).
+    linhas (int): Number of rows.
+    """
+
+    def __init__(self, colunas, linhas):
+        self.colunas = colunas
+        self.linhas = linhas
+
+    def __len__(self):
+        return self.linhas
+
+    def codigos(self, coluna):
+        """Returns the codes of a dictionary-coded column.
+
+        Parameters:
+        coluna (str): Column name.
+
+        Returns:
+        codigos (ndarray): Code of each row into the dictionary of the column, -1 for missing values.
+        """
+        return self.colunas[coluna][1]
+
+    def dicionario(self, coluna):
+        """Returns the sorted values of a dictionary-coded column.
+
+        Parameters:
+        coluna (str): Column name.
+
+        Returns:
+        dicionario (Index): Value of each code.
+        """
+        return self.colunas[coluna][2]
+
+    def para_dataframe(self, posicoes=None):
+        """Decodes the table, or some of its rows, into a dataframe with the schema of normaliza_tabela.
+
+        Parameters:
+        posicoes (ndarray): Positions of the rows to decode, in the output order (all rows when None).
+
+        Returns:
+        df (DataFrame): Dataframe with the decoded rows.
+        """
+        dados = {}
+        for coluna, (tipo, valores, dicionario) in self.colunas.items():
+            valores = np.asarray(valores) if posicoes is None else np.asarray(valores)[posicoes]
+            if tipo == 'categoria':
+                dados[coluna] = pd.Categorical.from_codes(valores, dtype=pd.CategoricalDtype(dicionario))
+            elif tipo == 'texto':
+                dados[coluna] = np.append(dicionario.to_numpy(dtype=object), np.nan)[valores]
+            else:
+                dados[coluna] = np.array(valores)
+        return pd.DataFrame(dados, index=pd.RangeIndex(len(self) if posicoes is None else len(posicoes)))
+
+
+def compacta_tabela(df):
+    """Converts a dataframe into a TabelaCompacta.
+
+    Parameters:
+    df (DataFrame): Dataframe with metabarcoding results.
+
+    Returns:
+    tabela (TabelaCompacta): Table with dictionary-coded text columns and contiguous numeric columns.
+    """
+    df = normaliza_tabela(df)
+    colunas = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            colunas[coluna] = ('categoria', serie.cat.codes.to_numpy(), serie.cat.categories)
+        elif pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_extension_array_dtype(serie):
+            colunas[coluna] = ('numero', serie.to_numpy(), None)
+        else:
+            serie = serie.astype('category')
+            colunas[coluna] = ('texto', serie.cat.codes.to_numpy(), serie.cat.categories)
+
+    return TabelaCompacta(colunas, len(df))
+
+
+def salva_compacta(tabela, caminho_salvar):
+    """Saves a TabelaCompacta to a single .otus file that le_compacta can memory-map.
+
+    The file starts with MAGICO_COMPACTA, the length of a JSON header (8 bytes, little-endian) and the header,
+    which holds the dictionaries, the dtype and offset of each array and a SHA-256 signature of the contents.
+    The raw arrays follow, each aligned to ALINHAMENTO_COMPACTA bytes.
+
+    Parameters:
+    tabela (TabelaCompacta): Table to be saved.
+    caminho_salvar (str): Path where the file will be saved.
+    """
+    colunas = []
+    arrays = []
+    deslocamento = 0
+    for coluna, (tipo, valores, dicionario) in tabela.colunas.items():
+        valores = np.ascontiguousarray(valores)
+        deslocamento = -(-deslocamento // ALINHAMENTO_COMPACTA) * ALINHAMENTO_COMPACTA
+        descricao = {'nome': coluna, 'tipo': tipo, 'dtype': valores.dtype.str, 'deslocamento': deslocamento}
+        if dicionario is not None:
+            descricao['dicionario'] = dicionario.tolist()
+            descricao['tipo_dicionario'] = str(dicionario.dtype)
+        colunas.append(descricao)
+        arrays.append((deslocamento, valores))
+        deslocamento += valores.nbytes
+
+    cabecalho = {'versao': 1, 'linhas': len(tabela), 'colunas': colunas}
+    assinatura = hashlib.sha256(json.dumps(cabecalho, default=str).encode())
+    for _, valores in arrays:
+        assinatura.update(memoryview(valores).cast('B'))
+    cabecalho['assinatura'] = assinatura.hexdigest()
+
+    texto = json.dumps(cabecalho, default=str).encode()
+    inicio = -(-(16 + len(texto)) // ALINHAMENTO_COMPACTA) * ALINHAMENTO_COMPACTA
+
+    caminho_temporario = f'{caminho_salvar}.{os.getpid()}.tmp'
+    with open(caminho_temporario, 'wb') as arquivo:
+        arquivo.write(MAGICO_COMPACTA + len(texto).to_bytes(8, 'little') + texto)
+        for deslocamento, valores in arrays:
+            arquivo.write(b'\0' * (inicio + deslocamento - arquivo.tell()))
+            arquivo.write(memoryview(valores).cast('B'))
+    os.replace(caminho_temporario, caminho_salvar)
+
+
+def le_cabecalho_compacta(caminho_arquivo):
+    """Reads the JSON header of a .otus file.
 
+    Parameters:
+    caminho_arquivo (str): Path to the .otus file.
+
+    Returns:
+    cabecalho (dict): Header with the dictionaries, dtypes, offsets and signature of the table.
+    inicio (int): Position of the first array in the file.
+    """
+    with open(caminho_arquivo, 'rb') as arquivo:
+        if arquivo.read(len(MAGICO_COMPACTA)) != MAGICO_COMPACTA:
+            raise ValueError(f'{caminho_arquivo} is not a compact OTU table')
+        tamanho = int.from_bytes(arquivo.read(8), 'little')
+        cabecalho = json.loads(arquivo.read(tamanho))
+
+    inicio = -(-(16 + tamanho) // ALINHAMENTO_COMPACTA) * ALINHAMENTO_COMPACTA
+    return cabecalho, inicio
+
+
+def le_compacta(caminho_arquivo):
+    """Opens a .otus file saved by salva_compacta, memory-mapping its arrays instead of reading them.
+
+    Parameters:
+    caminho_arquivo (str): Path to the .otus file.
+
+    Returns:
+    tabela (TabelaCompacta): Table whose arrays are read-only memory maps of the file.
+    """
+    cabecalho, inicio = le_cabecalho_compacta(caminho_arquivo)
+    linhas = cabecalho['linhas']
+
+    colunas = {}
+    for descricao in cabecalho['colunas']:
+        tipo_array = np.dtype(descricao['dtype'])
+        if linhas:
+            valores = np.memmap(caminho_arquivo, dtype=tipo_array, mode='r', offset=inicio + descricao['deslocamento'], shape=(linhas,))
+        else:
+            valores = np.empty(0, dtype=tipo_array)
+        dicionario = None
+        if 'dicionario' in descricao:
+            dicionario = pd.Index(descricao['dicionario'], dtype=descricao['tipo_dicionario'])
+        colunas[descricao['nome']] = (descricao['tipo'], valores, dicionario)
+
+    return TabelaCompacta(colunas, linhas)
+
+
+def serializa_csv(tabela):
+    """Serializes a result table to CSV bytes in the format used for the .zip exports.
+
+    Parameters:
+    tabela (DataFrame): Table to be serialized.
+
+    Returns:
+    conteudo (bytes): CSV contents.
+    """
+    buffer = io.BytesIO()
+    tabela.to_csv(buffer, sep=';', encoding='utf-8-sig')
+    conteudo = buffer.getvalue()
+    return conteudo
+
+
+def salva_zip(arquivos, caminho_salvar, compressao=zipfile.ZIP_STORED, nivel_compressao=None, trabalhadores=None):
+    """Saves several dataframes as CSV files inside one .zip archive, opening it only once.
+
+    The tables are serialized in parallel by a thread pool and written to the archive in the given order.
+
+    Parameters:
+    arquivos (dict): Dataframes to be saved, identified by the name of the CSV file inside the archive.
+    caminho_salvar (str): Path where the file will be saved.
+    compressao (int): Compression method (zipfile.ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2 or ZIP_LZMA).
+    nivel_compressao (int): Compression level, when supported by the method.
+    trabalhadores (int): Number of serialization threads (chosen by concurrent.futures when not given).
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=trabalhadores) as executor, \
+            zipfile.ZipFile(caminho_salvar, 'w', compression=compressao, compresslevel=nivel_compressao) as zf:
+        for nome, conteudo in zip(arquivos, executor.map(serializa_csv, arquivos.values())):
+            zf.writestr(nome, conteudo)
+
+
+def salva_resultados(tabelas_finais, caminho_salvar, amostrador=False, area=False, streaming=None, compressao=zipfile.ZIP_STORED, nivel_compressao=None):
+    """Saves result tables.
+
+    Parameters:
+    tabelas_finais (dict): Dictionary with dataframes representing the final tables with results displayed according to the filters.
+    caminho_salvar (str): Path where the file will be saved.
+    amostrador (bool): Indicates filtering by sampler.
+    area (bool): Indicates filtering by area.
+    streaming (bool): Indicates row-streaming mode for .xlsx files (see salva_xlsx).
+    compressao (int): Compression method for .zip files (see salva_zip).
+    nivel_compressao (int): Compression level for .zip files (see salva_zip).
+
+    Parquet, Feather and Arrow IPC files hold a single table, so with these formats each table is saved to
+    its own file, named after the chosen path plus the sampler and/or area.
+    """
+    caminho_salvar_tratado, extensao = os.path.splitext(caminho_salvar)
+
+    if amostrador and area:
         for amostrador in tabelas_finais:
-            tabela_final = tabelas_finais[amostrador]
+            planilhas = {}
+            for tabela in tabelas_finais[amostrador]:
+                planilhas.update(tabela)
 
             if '.xlsx' in caminho_salvar:
-                if i == 0:
-                    with pd.ExcelWriter(caminho_salvar, engine='openpyxl') as arquivo:
-                        tabela_final.to_excel(arquivo, sheet_name=amostrador)
-                else:
-                    with pd.ExcelWriter(caminho_salvar, engine='openpyxl', mode='a') as arquivo:
-                        tabela_final.to_excel(arquivo, sheet_name=amostrador)
+                caminho_salvar_tratado = caminho_salvar.replace('.xlsx', '')
+                salva_xlsx(planilhas, caminho_salvar_tratado + f'_{amostrador}.xlsx', streaming=streaming)
+
             elif '.zip' in caminho_salvar:
-                if i == 0:
-                    with zipfile.ZipFile(caminho_salvar, "w") as zf:
-                        with zf.open(f"{amostrador}.csv", "w") as buffer:
-                            tabela_final.to_csv(buffer, sep=';', encoding='utf-8-sig')
-                else:
-                    with zipfile.ZipFile(caminho_salvar, "a") as zf:
-                        with zf.open(f"{amostrador}.csv", "w") as buffer:
-                            tabela_final.to_csv(buffer, sep=';', encoding='utf-8-sig')
+                caminho_salvar_tratado = caminho_salvar.replace('.zip', '')
+                arquivos = {f"{amostrador}_{area}.csv": tabela_final for area, tabela_final in planilhas.items()}
+                salva_zip(arquivos, caminho_salvar_tratado + f'_{amostrador}.zip', compressao, nivel_compressao)
 
-            i += 1
+            elif extensao in EXTENSOES_COLUNARES:
+                for area, tabela_final in planilhas.items():
+                    salva_colunar(tabela_final, caminho_salvar_tratado + f'_{amostrador}_{area}{extensao}')
+
+    elif (amostrador and not area) or (not amostrador and area):
+        if '.xlsx' in caminho_salvar:
+            salva_xlsx(tabelas_finais, caminho_salvar, streaming=streaming)
+
+        elif '.zip' in caminho_salvar:
+            arquivos = {f"{nome}.csv": tabela_final for nome, tabela_final in tabelas_finais.items()}
+            salva_zip(arquivos, caminho_salvar, compressao, nivel_compressao)
+
+        elif extensao in EXTENSOES_COLUNARES:
+            for nome, tabela_final in tabelas_finais.items():
+                salva_colunar(tabela_final, caminho_salvar_tratado + f'_{nome}{extensao}')
+
+
+def executa_threshold(caminho_arquivo, threshold_perc, progresso=None, instrumentacao=None, motor=None):
+    """Reads a table and applies the read threshold, returning the joined tables without saving them.
+
+    Parameters:
+    caminho_arquivo (str): Path to the file with metabarcoding results after Blast.
+    threshold_perc (float): Percentage value for threshold calculation.
+    progresso (callable): Receives the progress events of the "leitura", "threshold" and "concatenacao" stages (see emite_progresso).
+    instrumentacao (Instrumentacao): Records the measurements of the same stages (see mede_etapa).
+    motor (str): Engine of the grouped aggregations, "pandas" or "polars" (MOTOR_PROCESSAMENTO when None); .otus tables
+    always use the NumPy kernels of executa_threshold_compacta.
+
+    Returns:
+    resultado_tratado_geral (DataFrame): OTUs/ASVs selected, above the threshold.
+    nao_selecionados_geral (DataFrame): OTUs/ASVs removed, under or equal the threshold.
+    thresholds (DataFrame): Dataframe with calculated threshold values per sequencing sample.
+    tempo_leitura (float): Seconds spent reading the file.
+    linhas_por_segundo (float): Rows read per second.
+    """
+    if EXTENSAO_COMPACTA in caminho_arquivo:
+        return executa_threshold_compacta(caminho_arquivo, threshold_perc, progresso, instrumentacao)
+
+    with mede_etapa(instrumentacao, 'leitura') as registro:
+        emite_progresso(progresso, 'leitura', 0, 1)
+        inicio_leitura = time.perf_counter()
+        df = le_tabela(caminho_arquivo)
+        tempo_leitura = time.perf_counter() - inicio_leitura
+        linhas_por_segundo = len(df) / tempo_leitura if tempo_leitura > 0 else 0
+        verifica_colunas(df.columns, COLUNAS_THRESHOLD)
+        df = normaliza_tabela(df)
+        emite_progresso(progresso, 'leitura', 1, 1, len(df))
+        registro['linhas_saida'] = len(df)
+
+    with mede_etapa(instrumentacao, 'threshold', len(df)) as registro:
+        selecionados, nao_selecionados, thresholds = aplica_threshold_agrupado(df, threshold_perc, progresso, motor)
+        registro['grupos_saida'] = len(thresholds)
+        registro['linhas_saida'] = conta_tabelas(selecionados)[1]
+
+    with mede_etapa(instrumentacao, 'concatenacao', grupos_entrada=len(selecionados) + len(nao_selecionados)) as registro:
+        emite_progresso(progresso, 'concatenacao', 0, 2)
+        resultado_tratado_geral = concatena_dfs(selecionados)
+        emite_progresso(progresso, 'concatenacao', 1, 2, len(resultado_tratado_geral))
+        nao_selecionados_geral = concatena_dfs(nao_selecionados)
+        emite_progresso(progresso, 'concatenacao', 2, 2, len(resultado_tratado_geral) + len(nao_selecionados_geral))
+        registro['linhas_saida'] = len(resultado_tratado_geral) + len(nao_selecionados_geral)
+        registro['grupos_saida'] = 2
+
+    return resultado_tratado_geral, nao_selecionados_geral, thresholds, tempo_leitura, linhas_por_segundo
+
+
+def executa_consolidacao(caminho_arquivo, lista_amostradores=None, amostradores=False, areas=False, progresso=None, instrumentacao=None,
+                         motor=None, limite_memoria=None):
+    """Reads a curated table and builds the general list and the tables by sampler and/or area, without saving them.
+
+    Parameters:
+    caminho_arquivo (str): Path to the file with the curated taxonomic assignments.
+    lista_amostradores (list): Designations for the samplers.
+    amostradores (bool): Indicates filtering by samplers.
+    areas (bool): Indicates filtering by areas.
+    progresso (callable): Receives the progress events of the "leitura", "lista_geral" and "consolidacao" stages (see emite_progresso).
+    instrumentacao (Instrumentacao): Records the measurements of the same stages (see mede_etapa).
+    motor (str): Engine of the grouped aggregations, "pandas", "polars" or "duckdb" (MOTOR_PROCESSAMENTO when None); with
+    "duckdb" the table is not loaded into pandas (see executa_consolidacao_duckdb), and .otus tables always use the NumPy
+    kernels of executa_consolidacao_compacta.
+    limite_memoria (str): Memory limit of the duckdb engine, e.g. "2GB" (LIMITE_MEMORIA_DUCKDB when None).
+
+    Returns:
+    lista_geral (DataFrame): A general list of the taxa.
+    tabelas_finais (dict): Dictionary with the final tables (None when no filter is chosen).
+    tempo_leitura (float): Seconds spent reading the file.
+    linhas_por_segundo (float): Rows read per second.
+    """
+    if EXTENSAO_COMPACTA in caminho_arquivo:
+        return executa_consolidacao_compacta(caminho_arquivo, lista_amostradores, amostradores, areas, progresso, instrumentacao)
+    if (motor or MOTOR_PROCESSAMENTO) == 'duckdb':
+        return executa_consolidacao_duckdb(caminho_arquivo, lista_amostradores, amostradores, areas, progresso, instrumentacao,
+                                           limite_memoria or LIMITE_MEMORIA_DUCKDB)
+
+    with mede_etapa(instrumentacao, 'leitura') as registro:
+        emite_progresso(progresso, 'leitura', 0, 1)
+        inicio_leitura = time.perf_counter()
+        df = le_tabela(caminho_arquivo)
+        tempo_leitura = time.perf_counter() - inicio_leitura
+        linhas_por_segundo = len(df) / tempo_leitura if tempo_leitura > 0 else 0
+        verifica_colunas(df.columns, COLUNAS_CONSOLIDACAO)
+        df = normaliza_tabela(df)
+        emite_progresso(progresso, 'leitura', 1, 1, len(df))
+        registro['linhas_saida'] = len(df)
+
+    lista_geral, tabelas_finais = consolida_tabela(df, lista_amostradores, amostradores, areas, progresso, instrumentacao, motor)
+
+    return lista_geral, tabelas_finais, tempo_leitura, linhas_por_segundo
 
-    elif not amostrador and area:
-        i = 0
-
-        for area in tabelas_finais:
-            tabela_final = tabelas_finais[area]
-
-            if 'xlsx' in caminho_salvar:
-                if i == 0:
-                    with pd.ExcelWriter(caminho_salvar, engine='openpyxl') as arquivo:
-                        tabela_final.to_excel(arquivo, sheet_name=area)
-                else:
-                    with pd.ExcelWriter(caminho_salvar, engine='openpyxl', mode='a') as arquivo:
-                        tabela_final.to_excel(arquivo, sheet_name=area)
-            elif '.zip' in caminho_salvar:
-                if i == 0:
-                    with zipfile.ZipFile(caminho_salvar, "w") as zf:
-                        with zf.open(f"{area}.csv", "w") as buffer:
-                            tabela_final.to_csv(buffer, sep=';', encoding='utf-8-sig')
-                else:
-                    with zipfile.ZipFile(caminho_salvar, "a") as zf:
-                        with zf.open(f"{area}.csv", "w") as buffer:
-                            tabela_final.to_csv(buffer, sep=';', encoding='utf-8-sig')
-            i += 1
 
+def consolida_tabela(df, lista_amostradores=None, amostradores=False, areas=False, progresso=None, instrumentacao=None, motor=None):
+    """Builds the general list and the tables by sampler and/or area from a curated dataframe already in memory.
+
+    Parameters:
+    df (DataFrame): Dataframe with the curated taxonomic assignments.
+    lista_amostradores (list): Designations for the samplers.
+    amostradores (bool): Indicates filtering by samplers.
+    areas (bool): Indicates filtering by areas.
+    progresso (callable): Receives the progress events of the "lista_geral" and "consolidacao" stages (see emite_progresso).
+    instrumentacao (Instrumentacao): Records the measurements of the same stages (see mede_etapa).
+    motor (str): Engine of the tables by sampler and/or area, "pandas" or "polars" (MOTOR_PROCESSAMENTO when None); the
+    general list is always built with pandas.
+
+    Returns:
+    lista_geral (DataFrame): A general list of the taxa.
+    tabelas_finais (dict): Dictionary with the final tables (None when no filter is chosen).
+    """
+    with mede_etapa(instrumentacao, 'lista_geral', len(df)) as registro:
+        df = adiciona_chaves_area_amostrador(df)
+        lista_areas = define_areas(df)
+        registro['grupos_entrada'] = len(lista_areas)
+
+        emite_progresso(progresso, 'lista_geral', 0, 1, len(df))
+        ocorrencias_geral = conta_ocorrencias_gerais(df, lista_areas)
+        reads_gerais = conta_reads_gerais(df)
+        lista_geral = cria_lista_geral(ocorrencias_geral, reads_gerais)
+        emite_progresso(progresso, 'lista_geral', 1, 1, len(df))
+        registro['linhas_saida'] = len(lista_geral)
+
+    tabelas_finais = None
+    if amostradores or areas:
+        with mede_etapa(instrumentacao, 'consolidacao', len(df), len(lista_areas)) as registro:
+            tabelas_finais = consolida_resultados(df, lista_areas, lista_amostradores, amostradores=amostradores, areas=areas,
+                                                  progresso=progresso, motor=motor)
+            registro['grupos_saida'], registro['linhas_saida'] = conta_tabelas(tabelas_finais)
+
+    return lista_geral, tabelas_finais
+
+
+def abre_tabela_duckdb(conexao, caminho_arquivo):
+    """Makes an input table available to a DuckDB connection as the "tabela" relation.
+
+    CSV files are loaded into the database with the column types and missing values used by le_csv, Parquet files
+    are queried in place and the other formats are read with le_tabela.
+
+    Parameters:
+    conexao (DuckDBPyConnection): Connection to the database of the consolidation.
+    caminho_arquivo (str): Path to the file with the curated taxonomic assignments.
+    """
+    if '.csv' in caminho_arquivo:
+        separador = detecta_separador(caminho_arquivo)
+        with open(caminho_arquivo, encoding='utf-8-sig', newline='') as arquivo:
+            colunas = next(csv.reader(arquivo, delimiter=separador), [])
+        tipos = {coluna: TIPOS_DUCKDB[TIPOS_COLUNAS[coluna]] for coluna in colunas if coluna in TIPOS_COLUNAS}
+        conexao.read_csv(caminho_arquivo, sep=separador, header=True, dtype=tipos, na_values=VALORES_NULOS_CSV).to_table('tabela')
+    elif '.parquet' in caminho_arquivo:
+        conexao.read_parquet(caminho_arquivo).to_view('tabela')
+    else:
+        conexao.register('tabela', le_tabela(caminho_arquivo))
+
+
+def executa_consolidacao_duckdb(caminho_arquivo, lista_amostradores=None, amostradores=False, areas=False, progresso=None,
+                                instrumentacao=None, limite_memoria=LIMITE_MEMORIA_DUCKDB):
+    """Builds the general list and the tables by sampler and/or area with SQL queries in an embedded DuckDB database.
+
+    The table is never loaded into pandas: the detections and reads are aggregated by DuckDB in a temporary database
+    on disk, which spills to its folder when the memory limit is reached, and only the aggregated counts are turned
+    into the same tables returned by executa_consolidacao. Samplers not given are taken in sorted order.
+
+    Parameters:
+    caminho_arquivo (str): Path to the file with the curated taxonomic assignments (.csv and .parquet are read by DuckDB).
+    lista_amostradores (list): Designations for the samplers.
+    amostradores (bool): Indicates filtering by samplers.
+    areas (bool): Indicates filtering by areas.
+    progresso (callable): Receives the progress events of the "leitura", "lista_geral" and "consolidacao" stages (see emite_progresso).
+    instrumentacao (Instrumentacao): Records the measurements of the same stages (see mede_etapa).
+    limite_memoria (str): DuckDB memory limit, e.g. "2GB" (DuckDB's default when None).
+
+    Returns:
+    lista_geral (DataFrame): A general list of the taxa.
+    tabelas_finais (dict): Dictionary with the final tables (None when no filter is chosen).
+    tempo_leitura (float): Seconds spent loading the file.
+    linhas_por_segundo (float): Rows loaded per second.
+    """
+    import duckdb
+
+    pasta_temporaria = tempfile.mkdtemp(prefix='ednanalyzer_duckdb_')
+    configuracao = {'temp_directory': pasta_temporaria, 'preserve_insertion_order': False}
+    if limite_memoria:
+        configuracao['memory_limit'] = limite_memoria
+    conexao = duckdb.connect(os.path.join(pasta_temporaria, 'consolidacao.duckdb'), config=configuracao)
+
+    try:
+        with mede_etapa(instrumentacao, 'leitura') as registro:
+            emite_progresso(progresso, 'leitura', 0, 1)
+            inicio_leitura = time.perf_counter()
+            abre_tabela_duckdb(conexao, caminho_arquivo)
+            n_linhas, reads_nulos, minimo_reads, maximo_reads = conexao.execute(
+                'SELECT count(*), count(*) - count(n_reads), min(n_reads), max(n_reads) FROM tabela').fetchone()
+            tempo_leitura = time.perf_counter() - inicio_leitura
+            linhas_por_segundo = n_linhas / tempo_leitura if tempo_leitura > 0 else 0
+            emite_progresso(progresso, 'leitura', 1, 1, n_linhas)
+            registro['linhas_saida'] = n_linhas
+
+        colunas = conexao.table('tabela').columns
+        verifica_colunas(colunas, COLUNAS_CONSOLIDACAO)
+        if 'area_amostrador' in colunas:
+            coluna_origem, coluna_ponto, coluna_taxon, coluna_amostrador, rotulo = \
+                'area_amostrador', 'ponto', 'taxon_final_curada', 'amostrador', 'Detecções'
+        elif 'area_sampler' in colunas:
+            coluna_origem, coluna_ponto, coluna_taxon, coluna_amostrador, rotulo = \
+                'area_sampler', 'point', 'final_taxon_curated', 'sampler', 'Detections'
+
+        # like pandas, read sums are float when n_reads has empty cells, and a group of empty cells sums to 0
+        tipo_reads = 'DOUBLE' if reads_nulos else 'BIGINT'
+        juncao = f'tabela t JOIN mapa m ON CAST(t."{coluna_origem}" AS VARCHAR) = m."{coluna_origem}"'
+
+        with mede_etapa(instrumentacao, 'lista_geral', n_linhas) as registro:
+            emite_progresso(progresso, 'lista_geral', 0, 1, n_linhas)
+            valores = conexao.execute(f'SELECT DISTINCT CAST("{coluna_origem}" AS VARCHAR) AS "{coluna_origem}" FROM tabela '
+                                      f'WHERE "{coluna_origem}" IS NOT NULL ORDER BY 1').fetchdf()
+            mapa = adiciona_chaves_area_amostrador(valores)
+            tipos_chaves = {'area': mapa['area'].dtype, coluna_amostrador: mapa[coluna_amostrador].dtype}
+            mapa = mapa.astype(object)
+            lista_areas = define_areas(mapa)
+            registro['grupos_entrada'] = len(lista_areas)
+            if lista_amostradores is None:
+                lista_amostradores = list(mapa[coluna_amostrador].unique())
+            mapa['geral'] = mapa['area'].isin(lista_areas)
+            mapa['selecionado'] = mapa[coluna_amostrador].isin(lista_amostradores) if amostradores else True
+            conexao.register('mapa', mapa)
+
+            ocorrencias = conexao.execute(f'''
+                SELECT taxon, count(*) AS deteccoes
+                FROM (SELECT DISTINCT m.area, t."{coluna_ponto}", CAST(t."{coluna_taxon}" AS VARCHAR) AS taxon FROM {juncao}
+                      WHERE m.geral AND t."{coluna_ponto}" IS NOT NULL AND t."{coluna_taxon}" IS NOT NULL)
+                GROUP BY taxon''').fetchdf()
+            reads = conexao.execute(f'''
+                SELECT CAST("{coluna_taxon}" AS VARCHAR) AS taxon, CAST(coalesce(sum(n_reads), 0) AS {tipo_reads}) AS reads
+                FROM tabela WHERE "{coluna_taxon}" IS NOT NULL GROUP BY 1''').fetchdf()
+
+            tipo_taxon = reads['taxon'].astype('category').dtype
+            if reads_nulos:
+                tipo_n_reads = np.dtype('float64')
+            else:
+                tipo_n_reads = pd.to_numeric(pd.Series([minimo_reads, maximo_reads]).dropna(), downcast='integer').dtype
+            lista_geral = lista_geral_agregada(ocorrencias, reads, rotulo, tipo_taxon, tipo_n_reads)
+            emite_progresso(progresso, 'lista_geral', 1, 1, n_linhas)
+            registro['linhas_saida'] = len(lista_geral)
+
+        tabelas_finais = None
+        if amostradores or areas:
+            if amostradores and areas:
+                chaves = [coluna_amostrador, 'area']
+            elif amostradores:
+                chaves = [coluna_amostrador]
+            elif areas:
+                chaves = ['area']
+            tipos_chaves[coluna_taxon] = tipo_taxon
+
+            linhas = n_linhas
+            if amostradores:
+                linhas = conexao.execute(f'SELECT count(*) FROM {juncao} WHERE m.selecionado').fetchone()[0]
+
+            with mede_etapa(instrumentacao, 'consolidacao', linhas, len(lista_areas)) as registro:
+                selecao = ', '.join(f'm."{chave}"' for chave in chaves)
+                agregado = conexao.execute(f'''
+                    SELECT {selecao}, CAST(t."{coluna_taxon}" AS VARCHAR) AS "{coluna_taxon}",
+                           CAST(coalesce(sum(t.n_reads), 0) AS {tipo_reads}) AS Reads, count(DISTINCT t."{coluna_ponto}") AS Deteccoes
+                    FROM {juncao} WHERE m.selecionado AND t."{coluna_taxon}" IS NOT NULL
+                    GROUP BY ALL''').fetchdf()
+
+                indice = pd.MultiIndex.from_arrays([pd.Categorical(agregado[chave], dtype=tipos_chaves[chave]) for chave in chaves + [coluna_taxon]],
+                                                   names=chaves + [coluna_taxon])
+                agregado = pd.DataFrame({'Reads': agregado['Reads'].to_numpy(dtype=np.result_type(tipo_n_reads, 'int64')),
+                                         'Deteccoes': agregado['Deteccoes'].to_numpy(dtype='int64')}, index=indice).sort_index()
+                tabelas_finais = divide_consolidacao(agregado, chaves, lista_areas, lista_amostradores, amostradores, areas, progresso,
+                                                     linhas)
+                registro['grupos_saida'], registro['linhas_saida'] = conta_tabelas(tabelas_finais)
+
+    finally:
+        conexao.close()
+        shutil.rmtree(pasta_temporaria, ignore_errors=True)
+
+    return lista_geral, tabelas_finais, tempo_leitura, linhas_por_segundo
+
+
+def primeiras_ocorrencias(codigos):
+    """Returns the codes present in an array in order of first appearance.
+
+    Parameters:
+    codigos (ndarray): Dictionary codes, -1 for missing values.
 
-def main():
-    pass
+    Returns:
+    presentes (ndarray): Each code other than -1 once, in order of first appearance.
+    """
+    presentes, primeiras = np.unique(codigos, return_index=True)
+    presentes = presentes[np.argsort(primeiras)]
+    return presentes[presentes >= 0]
+
+
+def abre_compacta(caminho_arquivo, progresso=None, instrumentacao=None):
+    """Opens a .otus table as the "leitura" stage of the compact kernels.
+
+    Parameters:
+    caminho_arquivo (str): Path to the .otus file.
+    progresso (callable): Receives the progress events of the "leitura" stage (see emite_progresso).
+    instrumentacao (Instrumentacao): Records the measurements of the stage (see mede_etapa).
+
+    Returns:
+    tabela (TabelaCompacta): Table memory-mapped from the file.
+    tempo_leitura (float): Seconds spent opening the file.
+    linhas_por_segundo (float): Rows opened per second.
+    """
+    with mede_etapa(instrumentacao, 'leitura') as registro:
+        emite_progresso(progresso, 'leitura', 0, 1)
+        inicio_leitura = time.perf_counter()
+        tabela = le_compacta(caminho_arquivo)
+        tempo_leitura = time.perf_counter() - inicio_leitura
+        linhas_por_segundo = len(tabela) / tempo_leitura if tempo_leitura > 0 else 0
+        emite_progresso(progresso, 'leitura', 1, 1, len(tabela))
+        registro['linhas_saida'] = len(tabela)
+
+    return tabela, tempo_leitura, linhas_por_segundo
+
+
+def executa_threshold_compacta(caminho_arquivo, threshold_perc, progresso=None, instrumentacao=None):
+    """Applies the read threshold to a .otus table with bincount and sort kernels over its codes.
+
+    Gives the same tables as executa_threshold: the total reads of every sequencing sample come from one
+    bincount over the sample codes and the rows of each output are ordered by sample with one stable sort, so
+    only the selected and removed rows are decoded.
+
+    Parameters:
+    caminho_arquivo (str): Path to the .otus file with metabarcoding results after Blast.
+    threshold_perc (float): Percentage value for threshold calculation.
+    progresso (callable): Receives the progress events of the "leitura", "threshold" and "concatenacao" stages (see emite_progresso).
+    instrumentacao (Instrumentacao): Records the measurements of the same stages (see mede_etapa).
+
+    Returns:
+    resultado_tratado_geral (DataFrame): OTUs/ASVs selected, above the threshold.
+    nao_selecionados_geral (DataFrame): OTUs/ASVs removed, under or equal the threshold.
+    thresholds (DataFrame): Dataframe with calculated threshold values per sequencing sample.
+    tempo_leitura (float): Seconds spent opening the file.
+    linhas_por_segundo (float): Rows opened per second.
+    """
+    tabela, tempo_leitura, linhas_por_segundo = abre_compacta(caminho_arquivo, progresso, instrumentacao)
+    verifica_colunas(tabela.colunas, COLUNAS_THRESHOLD)
+    if 'amostra_sequenciamento' in tabela.colunas:
+        coluna_corrida = 'amostra_sequenciamento'
+    elif 'sequencing_sample' in tabela.colunas:
+        coluna_corrida = 'sequencing_sample'
+
+    with mede_etapa(instrumentacao, 'threshold', len(tabela)) as registro:
+        codigos = np.asarray(tabela.codigos(coluna_corrida))
+        reads = np.asarray(tabela.colunas['n_reads'][1])
+        corridas = primeiras_ocorrencias(codigos)
+        total = 2 * len(corridas)
+        emite_progresso(progresso, 'threshold', 0, total, 0)
+
+        validas = codigos >= 0
+        totais = np.bincount(codigos[validas], weights=np.nan_to_num(reads[validas], copy=False),
+                             minlength=len(tabela.dicionario(coluna_corrida)))
+        mascara = validas & (reads > (totais * threshold_perc / 100)[codigos])
+
+        ordem = np.zeros(len(totais), dtype=np.intp)
+        ordem[corridas] = np.arange(len(corridas))
+        posicoes = []
+        for parte in (mascara, validas & ~mascara):
+            linhas_parte = np.flatnonzero(parte)
+            posicoes.append(linhas_parte[np.argsort(ordem[codigos[linhas_parte]], kind='stable')])
+        emite_progresso(progresso, 'threshold', total, total, len(posicoes[0]) + len(posicoes[1]))
+
+        indice = pd.CategoricalIndex(pd.Categorical.from_codes(corridas, dtype=pd.CategoricalDtype(tabela.dicionario(coluna_corrida))))
+        thresholds = pd.DataFrame({'Threshold': totais[corridas] * threshold_perc / 100}, index=indice)
+        registro['grupos_saida'] = len(corridas)
+        registro['linhas_saida'] = len(posicoes[0])
+
+    with mede_etapa(instrumentacao, 'concatenacao', grupos_entrada=total) as registro:
+        emite_progresso(progresso, 'concatenacao', 0, 2)
+        resultado_tratado_geral = tabela.para_dataframe(posicoes[0])
+        emite_progresso(progresso, 'concatenacao', 1, 2, len(resultado_tratado_geral))
+        nao_selecionados_geral = tabela.para_dataframe(posicoes[1])
+        emite_progresso(progresso, 'concatenacao', 2, 2, len(resultado_tratado_geral) + len(nao_selecionados_geral))
+        registro['linhas_saida'] = len(resultado_tratado_geral) + len(nao_selecionados_geral)
+        registro['grupos_saida'] = 2
+
+    return resultado_tratado_geral, nao_selecionados_geral, thresholds, tempo_leitura, linhas_por_segundo
+
+
+def executa_consolidacao_compacta(caminho_arquivo, lista_amostradores=None, amostradores=False, areas=False, progresso=None,
+                                  instrumentacao=None):
+    """Builds the general list and the tables by sampler and/or area of a .otus table with bincount and sort kernels.
+
+    Gives the same results as executa_consolidacao without decoding the table: the area and sampler codes come
+    from the dictionary of the area/sampler column, the distinct points of each group are found with np.unique
+    over combined integer codes and the reads are summed with np.bincount.
+
+    Parameters:
+    caminho_arquivo (str): Path to the .otus file with the curated taxonomic assignments.
+    lista_amostradores (list): Designations for the samplers.
+    amostradores (bool): Indicates filtering by samplers.
+    areas (bool): Indicates filtering by areas.
+    progresso (callable): Receives the progress events of the "leitura", "lista_geral" and "consolidacao" stages (see emite_progresso).
+    instrumentacao (Instrumentacao): Records the measurements of the same stages (see mede_etapa).
+
+    Returns:
+    lista_geral (DataFrame): A general list of the taxa.
+    tabelas_finais (dict): Dictionary with the final tables (None when no filter is chosen).
+    tempo_leitura (float): Seconds spent opening the file.
+    linhas_por_segundo (float): Rows opened per second.
+    """
+    tabela, tempo_leitura, linhas_por_segundo = abre_compacta(caminho_arquivo, progresso, instrumentacao)
+    verifica_colunas(tabela.colunas, COLUNAS_CONSOLIDACAO)
+    if 'area_amostrador' in tabela.colunas:
+        coluna_origem, coluna_ponto, coluna_taxon, coluna_amostrador, rotulo = \
+            'area_amostrador', 'ponto', 'taxon_final_curada', 'amostrador', 'Detecções'
+    elif 'area_sampler' in tabela.colunas:
+        coluna_origem, coluna_ponto, coluna_taxon, coluna_amostrador, rotulo = \
+            'area_sampler', 'point', 'final_taxon_curated', 'sampler', 'Detections'
+
+    with mede_etapa(instrumentacao, 'lista_geral', len(tabela)) as registro:
+        emite_progresso(progresso, 'lista_geral', 0, 1, len(tabela))
+        codigos_origem = np.asarray(tabela.codigos(coluna_origem))
+        presentes = primeiras_ocorrencias(codigos_origem)
+        mapa = adiciona_chaves_area_amostrador(pd.DataFrame({coluna_origem: tabela.dicionario(coluna_origem)[presentes]}))
+        lista_areas = define_areas(mapa)
+        registro['grupos_entrada'] = len(lista_areas)
+        if lista_amostradores is None:
+            lista_amostradores = list(mapa[coluna_amostrador].unique())
+
+        codigos = {coluna_ponto: np.asarray(tabela.codigos(coluna_ponto)), coluna_taxon: np.asarray(tabela.codigos(coluna_taxon))}
+        tipos = {coluna_taxon: pd.CategoricalDtype(tabela.dicionario(coluna_taxon))}
+        for chave in ('area', coluna_amostrador):
+            por_valor = np.full(len(tabela.dicionario(coluna_origem)) + 1, -1, dtype=np.int64)
+            por_valor[presentes] = mapa[chave].cat.codes.to_numpy()
+            codigos[chave] = por_valor[codigos_origem]
+            tipos[chave] = mapa[chave].dtype
+        reads = np.asarray(tabela.colunas['n_reads'][1])
+        n_pontos, n_taxons = len(tabela.dicionario(coluna_ponto)), len(tipos[coluna_taxon].categories)
+        area, ponto, taxon = codigos['area'], codigos[coluna_ponto], codigos[coluna_taxon]
+
+        na_lista = np.append(tipos['area'].categories.isin(lista_areas), False)
+        validas = na_lista[area] & (ponto >= 0) & (taxon >= 0)
+        combinados = (area[validas] * n_pontos + ponto[validas]) * n_taxons + taxon[validas]
+        deteccoes = np.bincount(np.unique(combinados) % n_taxons, minlength=n_taxons)
+
+        com_taxon = taxon >= 0
+        linhas_taxon = np.bincount(taxon[com_taxon], minlength=n_taxons)
+        soma_reads = np.bincount(taxon[com_taxon], weights=np.nan_to_num(reads[com_taxon], copy=False), minlength=n_taxons)
+
+        detectados, lidos = np.flatnonzero(deteccoes), np.flatnonzero(linhas_taxon)
+        lista_geral = lista_geral_agregada(pd.DataFrame({'taxon': tipos[coluna_taxon].categories[detectados], 'deteccoes': deteccoes[detectados]}),
+                                           pd.DataFrame({'taxon': tipos[coluna_taxon].categories[lidos], 'reads': soma_reads[lidos]}),
+                                           rotulo, tipos[coluna_taxon], reads.dtype)
+        emite_progresso(progresso, 'lista_geral', 1, 1, len(tabela))
+        registro['linhas_saida'] = len(lista_geral)
+
+    tabelas_finais = None
+    if amostradores or areas:
+        if amostradores and areas:
+            chaves = [coluna_amostrador, 'area']
+        elif amostradores:
+            chaves = [coluna_amostrador]
+        elif areas:
+            chaves = ['area']
+
+        linhas = len(tabela)
+        selecionadas = com_taxon.copy()
+        if amostradores:
+            filtro = np.append(tipos[coluna_amostrador].categories.isin(lista_amostradores), False)[codigos[coluna_amostrador]]
+            linhas = int(filtro.sum())
+            selecionadas &= filtro
+        for chave in chaves:
+            selecionadas &= codigos[chave] >= 0
+
+        with mede_etapa(instrumentacao, 'consolidacao', linhas, len(lista_areas)) as registro:
+            tamanhos = [len(tipos[chave].categories) for chave in chaves + [coluna_taxon]]
+            combinados = np.zeros(int(selecionadas.sum()), dtype=np.int64)
+            for chave, tamanho in zip(chaves + [coluna_taxon], tamanhos):
+                combinados = combinados * tamanho + codigos[chave][selecionadas]
+            grupos, inverso = np.unique(combinados, return_inverse=True)
+
+            soma_grupos = np.bincount(inverso, weights=np.nan_to_num(reads[selecionadas], copy=False), minlength=len(grupos))
+            pontos = ponto[selecionadas]
+            com_ponto = pontos >= 0
+            pares = np.unique(inverso[com_ponto].astype(np.int64) * n_pontos + pontos[com_ponto])
+            deteccoes_grupos = np.bincount(pares // n_pontos, minlength=len(grupos))
+
+            niveis = []
+            for tamanho in reversed(tamanhos):
+                niveis.insert(0, grupos % tamanho)
+                grupos = grupos // tamanho
+            indice = pd.MultiIndex.from_arrays([pd.Categorical.from_codes(nivel, dtype=tipos[chave]) for chave, nivel in zip(chaves + [coluna_taxon], niveis)],
+                                               names=chaves + [coluna_taxon])
+            agregado = pd.DataFrame({'Reads': soma_grupos.astype(np.result_type(reads.dtype, 'int64')), 'Deteccoes': deteccoes_grupos}, index=indice)
+
+            tabelas_finais = divide_consolidacao(agregado, chaves, lista_areas, lista_amostradores, amostradores, areas, progresso, linhas)
+            registro['grupos_saida'], registro['linhas_saida'] = conta_tabelas(tabelas_finais)
+
+    return lista_geral, tabelas_finais, tempo_leitura, linhas_por_segundo
+
+
+def le_curadoria(caminho_arquivo):
+    """Reads a curation table, whose first column holds the taxa as assigned and the second the curated taxa.
+
+    Parameters:
+    caminho_arquivo (str): Path to the curation table (.xlsx, .csv, .parquet, .feather or .arrow).
+
+    Returns:
+    curadoria (Series): Curated taxon indexed by the assigned taxon (the last row wins for repeated taxa, empty cells become '').
+    """
+    df = le_tabela(caminho_arquivo, usar_cache=False)
+    df = df.iloc[:, :2].dropna(subset=[df.columns[0]])
+    df = df.drop_duplicates(subset=[df.columns[0]], keep='last')
+
+    curadoria = pd.Series(df.iloc[:, 1].fillna('').to_numpy(), index=df.iloc[:, 0].astype(str).to_numpy())
+    return curadoria
+
+
+def aplica_curadoria(df, curadoria=None):
+    """Fills the curated taxon column by joining the assigned taxa with a curation table.
+
+    Taxa missing from the curation table keep their assigned name and taxa curated to an empty value are removed,
+    like the rows deleted by hand when the table is curated in a spreadsheet.
+
+    Parameters:
+    df (DataFrame): Dataframe with OTUs/ASVs selected by the threshold.
+    curadoria (Series): Curated taxon indexed by the assigned taxon (see le_curadoria); None keeps every assigned name.
+
+    Returns:
+    df_curado (DataFrame): Dataframe with the curated taxon column filled.
+    """
+    if 'amostra_sequenciamento' in df.columns:
+        coluna_curada = 'taxon_final_curada'
+    elif 'sequencing_sample' in df.columns:
+        coluna_curada = 'final_taxon_curated'
+
+    taxons = df['taxon'].astype(str).where(df['taxon'].notna())
+    curados = taxons.map(curadoria) if curadoria is not None else pd.Series(np.nan, index=df.index, dtype=object)
+    curados = curados.where(curados.notna(), taxons)
+    mantidos = curados.notna() & (curados.astype(str).str.strip() != '')
+
+    df_curado = df[mantidos].assign(**{coluna_curada: curados[mantidos].astype('category')})
+    return df_curado
+
+
+def executa_pipeline(caminho_arquivo, threshold_perc, caminho_curadoria=None, lista_amostradores=None, amostradores=False, areas=False,
+                     progresso=None, instrumentacao=None, motor=None):
+    """Applies the read threshold and consolidates the results in one run, passing the selected OTUs/ASVs in memory.
+
+    Parameters:
+    caminho_arquivo (str): Path to the file with metabarcoding results after Blast.
+    threshold_perc (float): Percentage value for threshold calculation.
+    caminho_curadoria (str): Path to the curation table (see le_curadoria); without it the assigned taxa are used as curated.
+    lista_amostradores (list): Designations for the samplers.
+    amostradores (bool): Indicates filtering by samplers.
+    areas (bool): Indicates filtering by areas.
+    progresso (callable): Receives the progress events of every stage (see emite_progresso).
+    instrumentacao (Instrumentacao): Records the measurements of every stage, including "curadoria" (see mede_etapa).
+    motor (str): Engine of the grouped aggregations, "pandas" or "polars" (MOTOR_PROCESSAMENTO when None).
+
+    Returns:
+    resultado_curado (DataFrame): OTUs/ASVs selected by the threshold, with the curated taxon column filled.
+    nao_selecionados_geral (DataFrame): OTUs/ASVs removed, under or equal the threshold.
+    thresholds (DataFrame): Dataframe with calculated threshold values per sequencing sample.
+    lista_geral (DataFrame): A general list of the taxa.
+    tabelas_finais (dict): Dictionary with the final tables (None when no filter is chosen).
+    tempo_leitura (float): Seconds spent reading the file.
+    linhas_por_segundo (float): Rows read per second.
+    """
+    resultado_tratado_geral, nao_selecionados_geral, thresholds, tempo_leitura, linhas_por_segundo = \
+        executa_threshold(caminho_arquivo, threshold_perc, progresso, instrumentacao, motor)
+
+    with mede_etapa(instrumentacao, 'curadoria', len(resultado_tratado_geral)) as registro:
+        curadoria = le_curadoria(caminho_curadoria) if caminho_curadoria else None
+        resultado_curado = aplica_curadoria(resultado_tratado_geral, curadoria)
+        registro['linhas_saida'] = len(resultado_curado)
+
+    lista_geral, tabelas_finais = consolida_tabela(resultado_curado, lista_amostradores, amostradores, areas, progresso, instrumentacao,
+                                                   motor)
+
+    return resultado_curado, nao_selecionados_geral, thresholds, lista_geral, tabelas_finais, tempo_leitura, linhas_por_segundo
+
+
+def processa_threshold(caminho_arquivo, threshold_perc, caminho_selecionados, caminho_nao_selecionados, caminho_thresholds=None,
+                       streaming=False, progresso=None, instrumentacao=None, motor=None):
+    """Runs the threshold stage for one file, from reading the table to saving the results.
+
+    Parameters:
+    caminho_arquivo (str): Path to the file with metabarcoding results after Blast.
+    threshold_perc (float): Percentage value for threshold calculation.
+    caminho_selecionados (str): Path where the table with the selected OTUs/ASVs will be saved.
+    caminho_nao_selecionados (str): Path where the table with the removed OTUs/ASVs will be saved.
+    caminho_thresholds (str): Path where the thresholds table will be saved (not saved when None).
+    streaming (bool): Indicates that a CSV input is processed in chunks with CSV outputs.
+    progresso (callable): Receives the progress events of every stage (see emite_progresso).
+    instrumentacao (Instrumentacao): Records the measurements of every stage (see mede_etapa).
+    motor (str): Engine of the grouped sums, "pandas" or "polars" (MOTOR_PROCESSAMENTO when None; not used in streaming mode).
+
+    Returns:
+    thresholds (DataFrame): Dataframe with calculated threshold values per sequencing sample.
+    """
+    if streaming:
+        with mede_etapa(instrumentacao, 'threshold') as registro:
+            thresholds = aplica_threshold_streaming(caminho_arquivo, threshold_perc, caminho_selecionados, caminho_nao_selecionados,
+                                                    progresso=progresso)
+            registro['grupos_saida'] = len(thresholds)
+    else:
+        resultado_tratado_geral, nao_selecionados_geral, thresholds, _, _ = \
+            executa_threshold(caminho_arquivo, threshold_perc, progresso, instrumentacao, motor)
+
+        if 'amostra_sequenciamento' in resultado_tratado_geral.columns:
+            resultado_tratado_geral['taxon_final_curada'] = ''
+        elif 'sequencing_sample' in resultado_tratado_geral.columns:
+            resultado_tratado_geral['final_taxon_curated'] = ''
+
+        with mede_etapa(instrumentacao, 'gravacao', len(resultado_tratado_geral) + len(nao_selecionados_geral), 2):
+            emite_progresso(progresso, 'gravacao', 0, 2)
+            salva_tabela(resultado_tratado_geral, caminho_selecionados, index=False)
+            emite_progresso(progresso, 'gravacao', 1, 2, len(resultado_tratado_geral))
+            salva_tabela(nao_selecionados_geral, caminho_nao_selecionados, index=False)
+            emite_progresso(progresso, 'gravacao', 2, 2, len(resultado_tratado_geral) + len(nao_selecionados_geral))
+
+    if caminho_thresholds:
+        with mede_etapa(instrumentacao, 'gravacao', len(thresholds), 1):
+            salva_tabela(thresholds, caminho_thresholds)
+
+    return thresholds
+
+
+def processa_consolidacao(caminho_arquivo, caminho_lista_geral, caminho_resultados=None, lista_amostradores=None, amostradores=False,
+                          areas=False, compressao=zipfile.ZIP_STORED, nivel_compressao=None, progresso=None, instrumentacao=None,
+                          motor=None, limite_memoria=None):
+    """Runs the consolidation stage for one file, from reading the curated table to saving the results.
+
+    Parameters:
+    caminho_arquivo (str): Path to the file with the curated taxonomic assignments.
+    caminho_lista_geral (str): Path where the general list will be saved.
+    caminho_resultados (str): Path where the tables filtered by samplers and/or areas will be saved.
+    lista_amostradores (list): Designations for the samplers.
+    amostradores (bool): Indicates filtering by samplers.
+    areas (bool): Indicates filtering by areas.
+    compressao (int): zipfile compression method used for .zip results.
+    nivel_compressao (int): Compression level for .zip results (None uses the method's default).
+    progresso (callable): Receives the progress events of every stage (see emite_progresso).
+    instrumentacao (Instrumentacao): Records the measurements of every stage (see mede_etapa).
+    motor (str): Engine of the grouped aggregations, "pandas", "polars" or "duckdb" (MOTOR_PROCESSAMENTO when None).
+    limite_memoria (str): Memory limit of the duckdb engine, e.g. "2GB" (LIMITE_MEMORIA_DUCKDB when None).
+
+    Returns:
+    lista_geral (DataFrame): A general list of the taxa.
+    tabelas_finais (dict): Dictionary with the final tables (None when no filter is chosen).
+    """
+    lista_geral, tabelas_finais, _, _ = executa_consolidacao(caminho_arquivo, lista_amostradores, amostradores, areas, progresso,
+                                                             instrumentacao, motor, limite_memoria)
+    with mede_etapa(instrumentacao, 'gravacao', len(lista_geral), 1):
+        salva_tabela(lista_geral, caminho_lista_geral)
+
+    if tabelas_finais is not None:
+        if caminho_resultados:
+            n_tabelas, n_linhas = conta_tabelas(tabelas_finais)
+            with mede_etapa(instrumentacao, 'gravacao', n_linhas, n_tabelas):
+                emite_progresso(progresso, 'gravacao', 0, 1)
+                salva_resultados(tabelas_finais, caminho_resultados, amostrador=amostradores, area=areas,
+                                 compressao=compressao, nivel_compressao=nivel_compressao)
+                emite_progresso(progresso, 'gravacao', 1, 1)
+
+    return lista_geral, tabelas_finais
+
+
+class TabelaCompartilhada:
+    """Reference to a dataframe that a worker process wrote to an uncompressed Arrow IPC file."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+
+def exporta_tabelas(objeto, pasta_transferencia):
+    """Replaces every dataframe inside a result (tuples, lists and dicts are walked) by an Arrow IPC file reference.
+
+    Tables that Arrow cannot represent are kept as they are and travel pickled.
+
+    Parameters:
+    objeto: Result of a stage function.
+    pasta_transferencia (str): Folder where the Arrow files are written.
+
+    Returns:
+    objeto: The same structure with TabelaCompartilhada references in place of the dataframes.
+    """
+    if isinstance(objeto, pd.DataFrame):
+        caminho = os.path.join(pasta_transferencia, f'{len(os.listdir(pasta_transferencia))}.arrow')
+        try:
+            salva_colunar(objeto, caminho)
+        except Exception:
+            return objeto
+        return TabelaCompartilhada(caminho)
+    if isinstance(objeto, dict):
+        return {chave: exporta_tabelas(valor, pasta_transferencia) for chave, valor in objeto.items()}
+    if isinstance(objeto, (list, tuple)):
+        return type(objeto)(exporta_tabelas(valor, pasta_transferencia) for valor in objeto)
+    return objeto
+
+
+def importa_tabelas(objeto, pasta=None):
+    """Loads back the dataframes referenced by exporta_tabelas, memory-mapping each Arrow file.
+
+    Parameters:
+    objeto: Result with TabelaCompartilhada references (other values are returned unchanged).
+    pasta (str): Folder the Arrow files were moved to after being written (None reads them where they were written).
+
+    Returns:
+    objeto: The same structure with the dataframes.
+    """
+    if isinstance(objeto, TabelaCompartilhada):
+        return le_colunar(objeto.caminho if pasta is None else os.path.join(pasta, os.path.basename(objeto.caminho)))
+    if isinstance(objeto, dict):
+        return {chave: importa_tabelas(valor, pasta) for chave, valor in objeto.items()}
+    if isinstance(objeto, (list, tuple)):
+        return type(objeto)(importa_tabelas(valor, pasta) for valor in objeto)
+    return objeto
+
+
+def versao_codigo():
+    """Returns a fingerprint of the processing code, so cached results are not reused after it changes.
+
+    Returns:
+    versao (str): Hash of this module's source (VERSAO_CACHE when the source is not available, e.g. in a frozen build).
+    """
+    try:
+        with open(__file__, 'rb') as arquivo:
+            return hashlib.sha256(arquivo.read()).hexdigest()[:16]
+    except OSError:
+        return str(VERSAO_CACHE)
+
+
+def chave_resultado(funcao, argumentos):
+    """Builds the cache key of a stage run from the stage, its arguments and the code version.
+
+    File arguments (the input table and the curation table) enter the key by their contents, so editing a file
+    invalidates its results while moving or renaming it does not; .otus tables enter by the content signature stored in
+    their header, so they are not read to build the key.
+
+    Parameters:
+    funcao (callable): Stage function.
+    argumentos (tuple): Positional arguments of the stage function.
+
+    Returns:
+    chave (str): Hexadecimal SHA-256 key.
+    """
+    partes = []
+    for argumento in argumentos:
+        if isinstance(argumento, str) and EXTENSAO_COMPACTA in argumento and os.path.isfile(argumento):
+            partes.append({'tabela_compacta': le_cabecalho_compacta(argumento)[0]['assinatura']})
+        elif isinstance(argumento, str) and os.path.isfile(argumento):
+            partes.append({'arquivo': chave_cache(argumento, {})})
+        else:
+            partes.append(argumento)
+
+    configuracoes = {'funcao': funcao.__name__, 'argumentos': partes, 'versao': versao_codigo()}
+    chave = hashlib.sha256(json.dumps(configuracoes, sort_keys=True, default=str).encode()).hexdigest()
+    return chave
+
+
+def le_resultado_cache(chave, pasta_resultados=PASTA_RESULTADOS):
+    """Loads a stage result stored on disk by salva_resultado_cache.
+
+    Parameters:
+    chave (str): Cache key of the result.
+    pasta_resultados (str): Folder of the on-disk result cache.
+
+    Returns:
+    resultado (tuple): Cached result, or None when the key is not in the cache.
+    """
+    pasta = os.path.join(pasta_resultados, chave)
+    caminho_estrutura = os.path.join(pasta, 'resultado.pkl')
+    if not os.path.exists(caminho_estrutura):
+        return None
+
+    try:
+        with open(caminho_estrutura, 'rb') as arquivo:
+            resultado = importa_tabelas(pickle.load(arquivo), pasta)
+    except Exception:
+        shutil.rmtree(pasta, ignore_errors=True)
+        return None
+    os.utime(pasta)
+    return resultado
+
+
+def salva_resultado_cache(chave, resultado, pasta_resultados=PASTA_RESULTADOS, limite_cache=LIMITE_CACHE):
+    """Stores a stage result on disk and evicts the least recently used results above the size limit.
+
+    The dataframes are kept as uncompressed Arrow files (memory-mapped when loaded) and the rest of the result
+    is pickled.
+
+    Parameters:
+    chave (str): Cache key of the result.
+    resultado (tuple): Result of the stage function.
+    pasta_resultados (str): Folder of the on-disk result cache.
+    limite_cache (int): Maximum size of the result cache in bytes.
+    """
+    os.makedirs(pasta_resultados, exist_ok=True)
+    pasta = os.path.join(pasta_resultados, chave)
+    if os.path.exists(pasta):
+        return
+
+    pasta_temporaria = tempfile.mkdtemp(dir=pasta_resultados, suffix='.tmp')
+    try:
+        estrutura = exporta_tabelas(resultado, pasta_temporaria) if MOTOR_CSV == 'pyarrow' else resultado
+        with open(os.path.join(pasta_temporaria, 'resultado.pkl'), 'wb') as arquivo:
+            pickle.dump(estrutura, arquivo)
+        os.replace(pasta_temporaria, pasta)
+    except Exception:
+        shutil.rmtree(pasta_temporaria, ignore_errors=True)
+        return
+
+    entradas = [entrada for entrada in os.scandir(pasta_resultados) if entrada.is_dir() and not entrada.name.endswith('.tmp')]
+    entradas.sort(key=lambda entrada: entrada.stat().st_mtime, reverse=True)
+    tamanho_total = 0
+    for entrada in entradas:
+        tamanho_total += sum(arquivo.stat().st_size for arquivo in os.scandir(entrada.path))
+        if tamanho_total > limite_cache and entrada.path != pasta:
+            shutil.rmtree(entrada.path, ignore_errors=True)
+
+
+def executa_com_cache(funcao, argumentos, progresso=None, usar_cache=True, pasta_resultados=PASTA_RESULTADOS, instrumentacao=None,
+                      motor=None):
+    """Runs a stage function (executa_threshold, executa_consolidacao or executa_pipeline), reusing a previous result
+    for the same input contents, parameters and code version.
+
+    Results are looked up in memory first (the last LIMITE_RESULTADOS_MEMORIA runs of the session, returned as
+    copies so callers can change them) and then on disk, where they persist between sessions.
+
+    Parameters:
+    funcao (callable): Stage function, called with progresso as keyword argument.
+    argumentos (tuple): Positional arguments of the stage function.
+    progresso (callable): Receives the progress events of the run (none are sent for a cached result).
+    usar_cache (bool): Indicates whether the result cache is used.
+    pasta_resultados (str): Folder of the on-disk result cache.
+    instrumentacao (Instrumentacao): Records the measurements of the run; a cached result is recorded as the "cache" stage.
+    motor (str): Engine of the stage function (not part of the cache key, since both engines give the same results).
+
+    Returns:
+    resultado (tuple): Result of the stage function.
+    origem (str): "memoria" or "disco" when the result came from the cache, "" when it was computed.
+    """
+    if not usar_cache:
+        return funcao(*argumentos, progresso=progresso, instrumentacao=instrumentacao, motor=motor), ''
+
+    with mede_etapa(instrumentacao, 'cache') as registro:
+        chave = chave_resultado(funcao, argumentos)
+        if chave in RESULTADOS_MEMORIA:
+            RESULTADOS_MEMORIA.move_to_end(chave)
+            resultado = copy.deepcopy(RESULTADOS_MEMORIA[chave])
+            registro['grupos_saida'], registro['linhas_saida'] = conta_tabelas(resultado)
+            return resultado, 'memoria'
+
+        resultado = le_resultado_cache(chave, pasta_resultados)
+        if resultado is not None:
+            registro['grupos_saida'], registro['linhas_saida'] = conta_tabelas(resultado)
+
+    origem = 'disco'
+    if resultado is None:
+        resultado = funcao(*argumentos, progresso=progresso, instrumentacao=instrumentacao, motor=motor)
+        with mede_etapa(instrumentacao, 'cache'):
+            salva_resultado_cache(chave, resultado, pasta_resultados)
+        origem = ''
+
+    RESULTADOS_MEMORIA[chave] = copy.deepcopy(resultado)
+    while len(RESULTADOS_MEMORIA) > LIMITE_RESULTADOS_MEMORIA:
+        RESULTADOS_MEMORIA.popitem(last=False)
+    return resultado, origem
+
+
+def processa_pipeline(caminho_arquivo, threshold_perc, caminho_lista_geral, caminho_resultados=None, caminho_curadoria=None,
+                      lista_amostradores=None, amostradores=False, areas=False, caminho_selecionados=None, caminho_nao_selecionados=None,
+                      caminho_thresholds=None, compressao=zipfile.ZIP_STORED, nivel_compressao=None, progresso=None, instrumentacao=None,
+                      motor=None):
+    """Runs the threshold and consolidation stages for one file without intermediate files, saving only the chosen outputs.
+
+    Parameters:
+    caminho_arquivo (str): Path to the file with metabarcoding results after Blast.
+    threshold_perc (float): Percentage value for threshold calculation.
+    caminho_lista_geral (str): Path where the general list will be saved.
+    caminho_resultados (str): Path where the tables filtered by samplers and/or areas will be saved.
+    caminho_curadoria (str): Path to the curation table (see le_curadoria).
+    lista_amostradores (list): Designations for the samplers.
+    amostradores (bool): Indicates filtering by samplers.
+    areas (bool): Indicates filtering by areas.
+    caminho_selecionados (str): Path where the curated selected OTUs/ASVs will be saved (not saved when None).
+    caminho_nao_selecionados (str): Path where the removed OTUs/ASVs will be saved (not saved when None).
+    caminho_thresholds (str): Path where the thresholds table will be saved (not saved when None).
+    compressao (int): zipfile compression method used for .zip results.
+    nivel_compressao (int): Compression level for .zip results (None uses the method's default).
+    progresso (callable): Receives the progress events of every stage (see emite_progresso).
+    instrumentacao (Instrumentacao): Records the measurements of every stage (see mede_etapa).
+    motor (str): Engine of the grouped aggregations, "pandas" or "polars" (MOTOR_PROCESSAMENTO when None).
+
+    Returns:
+    lista_geral (DataFrame): A general list of the taxa.
+    tabelas_finais (dict): Dictionary with the final tables (None when no filter is chosen).
+    """
+    resultado_curado, nao_selecionados_geral, thresholds, lista_geral, tabelas_finais, _, _ = \
+        executa_pipeline(caminho_arquivo, threshold_perc, caminho_curadoria, lista_amostradores, amostradores, areas, progresso,
+                         instrumentacao, motor)
+
+    tabelas = [(resultado_curado, caminho_selecionados, False), (nao_selecionados_geral, caminho_nao_selecionados, False),
+               (thresholds, caminho_thresholds, True), (lista_geral, caminho_lista_geral, True)]
+    for tabela, caminho, indice in tabelas:
+        if caminho:
+            with mede_etapa(instrumentacao, 'gravacao', len(tabela), 1):
+                salva_tabela(tabela, caminho, index=indice)
+
+    if tabelas_finais is not None and caminho_resultados:
+        n_tabelas, n_linhas = conta_tabelas(tabelas_finais)
+        with mede_etapa(instrumentacao, 'gravacao', n_linhas, n_tabelas):
+            emite_progresso(progresso, 'gravacao', 0, 1)
+            salva_resultados(tabelas_finais, caminho_resultados, amostrador=amostradores, area=areas,
+                             compressao=compressao, nivel_compressao=nivel_compressao)
+            emite_progresso(progresso, 'gravacao', 1, 1)
+
+    return lista_geral, tabelas_finais
+
+
+def executa_em_processo(funcao, argumentos, fila, pasta_transferencia=None, usar_cache=True, caminho_perfil=None, motor=None):
+    """Runs a stage function (executa_threshold, executa_consolidacao or executa_pipeline) as the target of a worker process.
+
+    Progress events are sent as ("progresso", event) and the end of the run as ("sucesso", origin, *result) or
+    ("erro", exception name), where origin is the value returned by executa_com_cache. The stage measurements
+    of the worker are sent just before, as ("instrumentacao", stages). When pyarrow is installed and
+    pasta_transferencia is given, the dataframes of the result are written there as Arrow files instead of
+    being pickled through the queue.
+
+    Parameters:
+    funcao (callable): Stage function, called with progresso as keyword argument.
+    argumentos (tuple): Positional arguments of the stage function.
+    fila (multiprocessing Queue): Queue read by the parent process.
+    pasta_transferencia (str): Folder for the Arrow files of the result.
+    usar_cache (bool): Indicates whether the result cache is used (only its disk tier outlives the worker).
+    caminho_perfil (str): Path where the cProfile statistics of the worker are saved (not profiled when None).
+    motor (str): Engine of the stage function, "pandas" or "polars" (MOTOR_PROCESSAMENTO when None).
+    """
+    def progresso(evento):
+        fila.put(('progresso', evento))
+
+    instrumentacao = Instrumentacao(perfil=caminho_perfil is not None)
+    try:
+        resultado, origem = executa_com_cache(funcao, argumentos, progresso, usar_cache, instrumentacao=instrumentacao, motor=motor)
+        if pasta_transferencia and MOTOR_CSV == 'pyarrow':
+            with mede_etapa(instrumentacao, 'transferencia') as registro:
+                registro['grupos_saida'], registro['linhas_saida'] = conta_tabelas(resultado)
+                resultado = exporta_tabelas(resultado, pasta_transferencia)
+        fila.put(('instrumentacao', instrumentacao.etapas))
+        if caminho_perfil:
+            instrumentacao.perfil.dump_stats(caminho_perfil)
+        fila.put(('sucesso', origem, *resultado))
+    except Exception as e:
+        fila.put(('instrumentacao', instrumentacao.etapas))
+        fila.put(('erro', type(e).__name__))
+
+
+def lista_entradas(padroes):
+    """Expands directories and glob patterns into the list of input files.
+
+    Parameters:
+    padroes (list): Files, directories or glob patterns.
+
+    Returns:
+    caminhos (list): Paths of the supported input files, without repetitions, in the given order.
+    """
+    extensoes = ['.xlsx', '.csv'] + EXTENSOES_COLUNARES + [EXTENSAO_COMPACTA]
+    caminhos = []
+    for padrao in padroes:
+        if os.path.isdir(padrao):
+            candidatos = sorted(os.path.join(padrao, nome) for nome in os.listdir(padrao))
+        elif glob.has_magic(padrao):
+            candidatos = sorted(glob.glob(padrao))
+        else:
+            candidatos = [padrao]
+        explicito = candidatos == [padrao]
+
+        for candidato in candidatos:
+            if os.path.isdir(candidato) or candidato in caminhos:
+                continue
+            if explicito or os.path.splitext(candidato)[1].lower() in extensoes:
+                caminhos.append(candidato)
+    return caminhos
+
+
+def nomeia_saida(modelo_nome, caminho_arquivo, saida, extensao, pasta_saida):
+    """Builds the path of a batch output from the name template.
+
+    Parameters:
+    modelo_nome (str): Name template with the {nome} (input file name without extension) and {saida} (output kind) fields.
+    caminho_arquivo (str): Path to the input file.
+    saida (str): Output kind, e.g. "selected" or "general_list".
+    extensao (str): Extension of the output file, with the dot.
+    pasta_saida (str): Folder where the outputs are saved.
+
+    Returns:
+    caminho_saida (str): Path of the output file.
+    """
+    nome = os.path.splitext(os.path.basename(caminho_arquivo))[0]
+    caminho_saida = os.path.join(pasta_saida, modelo_nome.format(nome=nome, saida=saida) + extensao)
+    return caminho_saida
+
+
+def processa_arquivo_lote(caminho_arquivo, etapa, pasta_saida, modelo_nome='{nome}_{saida}', formato='xlsx', threshold_perc=0.05,
+                          lista_amostradores=None, amostradores=False, areas=False, compressao=zipfile.ZIP_STORED, nivel_compressao=None):
+    """Runs one stage for one file of a batch, recording its runtime and any failure instead of raising it.
+
+    Parameters:
+    caminho_arquivo (str): Path to the input file.
+    etapa (str): Stage to run, "threshold" or "consolidate".
+    pasta_saida (str): Folder where the outputs are saved.
+    modelo_nome (str): Name template for the outputs (see nomeia_saida).
+    formato (str): Output format, "xlsx", "csv", "parquet", "feather" or "arrow" (results by sampler/area use .zip for "csv").
+    threshold_perc (float): Percentage value for threshold calculation.
+    lista_amostradores (list): Designations for the samplers.
+    amostradores (bool): Indicates filtering by samplers.
+    areas (bool): Indicates filtering by areas.
+    compressao (int): zipfile compression method used for .zip results.
+    nivel_compressao (int): Compression level for .zip results.
+
+    Returns:
+    resumo (dict): File, stage, status, runtime in seconds and error message.
+    """
+    extensao = f'.{formato}'
+    inicio = time.perf_counter()
+    erro = ''
+    try:
+        if etapa == 'threshold':
+            processa_threshold(caminho_arquivo, threshold_perc,
+                               nomeia_saida(modelo_nome, caminho_arquivo, 'selected', extensao, pasta_saida),
+                               nomeia_saida(modelo_nome, caminho_arquivo, 'deleted', extensao, pasta_saida),
+                               nomeia_saida(modelo_nome, caminho_arquivo, 'thresholds', extensao, pasta_saida))
+        elif etapa == 'consolidate':
+            extensao_resultados = '.zip' if formato == 'csv' else extensao
+            processa_consolidacao(caminho_arquivo,
+                                  nomeia_saida(modelo_nome, caminho_arquivo, 'general_list', extensao, pasta_saida),
+                                  nomeia_saida(modelo_nome, caminho_arquivo, 'results', extensao_resultados, pasta_saida),
+                                  lista_amostradores, amostradores=amostradores, areas=areas,
+                                  compressao=compressao, nivel_compressao=nivel_compressao)
+    except Exception as e:
+        erro = f'{type(e).__name__}: {e}'
+
+    resumo = {'File': caminho_arquivo, 'Stage': etapa, 'Status': 'error' if erro else 'ok',
+              'Time (s)': round(time.perf_counter() - inicio, 3), 'Error': erro}
+    return resumo
+
+
+def processa_lote(caminhos, etapas, pasta_saida, trabalhadores=None, **configuracoes):
+    """Runs the chosen stages on several files in a process pool.
+
+    Each file and stage is an independent task, so the throughput grows with the number of worker processes
+    until the disk becomes the bottleneck.
+
+    Parameters:
+    caminhos (list): Paths to the input files.
+    etapas (list): Stages to run on every file, "threshold" and/or "consolidate".
+    pasta_saida (str): Folder where the outputs are saved (created when missing).
+    trabalhadores (int): Number of worker processes (None uses the number of processors).
+    configuracoes: Options passed on to processa_arquivo_lote.
+
+    Returns:
+    df_resumo (DataFrame): Dataframe with the status and runtime of each file and stage, in the input order.
+    """
+    os.makedirs(pasta_saida, exist_ok=True)
+    tarefas = [(caminho, etapa) for caminho in caminhos for etapa in etapas]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=trabalhadores) as executor:
+        futuros = [executor.submit(processa_arquivo_lote, caminho, etapa, pasta_saida, **configuracoes) for caminho, etapa in tarefas]
+        resumos = [futuro.result() for futuro in futuros]
+
+    df_resumo = pd.DataFrame(resumos, columns=['File', 'Stage', 'Status', 'Time (s)', 'Error'])
+    return df_resumo
+
+
+def cria_parser():
+    """Builds the command line parser with the threshold and consolidate subcommands.
+
+    Returns:
+    parser (ArgumentParser): Parser for the command line arguments.
+    """
+    parser = argparse.ArgumentParser(prog='metabar',
+                                     description='Applies the reads threshold and consolidates taxonomic assignment tables without the graphical interface.')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    parser_threshold = subparsers.add_parser('threshold', help='Applies the reads threshold per sequencing sample.')
+    parser_threshold.add_argument('entrada', metavar='INPUT', help='Table with metabarcoding results after Blast.')
+    parser_threshold.add_argument('-p', '--threshold', dest='threshold_perc', type=float, default=0.05,
+                                  help='Threshold percentage (default: 0.05).')
+    parser_threshold.add_argument('-s', '--selected', dest='selecionados',
+                                  help='Output table with the selected OTUs/ASVs (required unless only --sweep is run).')
+    parser_threshold.add_argument('-d', '--deleted', dest='nao_selecionados',
+                                  help='Output table with the deleted OTUs/ASVs (required unless only --sweep is run).')
+    parser_threshold.add_argument('-t', '--thresholds', dest='thresholds', help='Output table with the thresholds per sequencing sample.')
+    parser_threshold.add_argument('--streaming', action='store_true',
+                                  help='Processes a CSV input in chunks (the selected and deleted outputs are written as CSV).')
+    parser_threshold.add_argument('--sweep', dest='varredura', type=float, nargs='+', metavar='PERC',
+                                  help='Threshold percentages to evaluate at once, saved to --sweep-output.')
+    parser_threshold.add_argument('--sweep-output', dest='saida_varredura', help='Output table for the threshold sweep.')
+    parser_threshold.add_argument('--progress', dest='progresso', action='store_true',
+                                  help='Prints the progress events to stderr, one JSON object per line.')
+    parser_threshold.add_argument('--run-log', dest='log_execucao',
+                                  help='JSON file with the wall time, CPU time, peak memory and rows of each stage.')
+    parser_threshold.add_argument('--profile', dest='perfil', help='File where the cProfile statistics of the run are saved.')
+    parser_threshold.add_argument('--engine', dest='motor', choices=['pandas', 'polars'], default=MOTOR_PROCESSAMENTO,
+                                  help=f'Engine of the grouped aggregations (default: {MOTOR_PROCESSAMENTO}; polars needs the polars package).')
+
+    parser_consolidacao = subparsers.add_parser('consolidate', help='Builds the general list and the tables by sampler and/or area.')
+    parser_consolidacao.add_argument('entrada', metavar='INPUT', help='Table with the curated taxonomic assignments.')
+    parser_consolidacao.add_argument('-g', '--general-list', dest='lista_geral', required=True, help='Output table with the general list.')
+    parser_consolidacao.add_argument('-r', '--results', dest='resultados', help='Output for the tables by sampler and/or area (.xlsx, .zip or columnar).')
+    parser_consolidacao.add_argument('--by-sampler', dest='amostradores', action='store_true', help='Filters by samplers.')
+    parser_consolidacao.add_argument('--by-area', dest='areas', action='store_true', help='Filters by areas.')
+    parser_consolidacao.add_argument('--samplers', dest='lista_amostradores', nargs='+', default=[], metavar='SAMPLER',
+                                     help='Designations for the samplers.')
+    parser_consolidacao.add_argument('--compression', dest='compressao', choices=list(COMPRESSOES_CLI), default='stored',
+                                     help='Compression of .zip results (default: stored).')
+    parser_consolidacao.add_argument('--level', dest='nivel_compressao', type=int, help='Compression level of .zip results.')
+    parser_consolidacao.add_argument('--progress', dest='progresso', action='store_true',
+                                     help='Prints the progress events to stderr, one JSON object per line.')
+    parser_consolidacao.add_argument('--run-log', dest='log_execucao',
+                                     help='JSON file with the wall time, CPU time, peak memory and rows of each stage.')
+    parser_consolidacao.add_argument('--profile', dest='perfil', help='File where the cProfile statistics of the run are saved.')
+    parser_consolidacao.add_argument('--engine', dest='motor', choices=['pandas', 'polars', 'duckdb'], default=MOTOR_PROCESSAMENTO,
+                                     help=f'Engine of the grouped aggregations (default: {MOTOR_PROCESSAMENTO}; polars and duckdb need their '
+                                          'packages; duckdb runs the consolidation as SQL over the file without loading it into memory).')
+    parser_consolidacao.add_argument('--memory-limit', dest='limite_memoria',
+                                     help='Memory limit of the duckdb engine, e.g. 2GB (larger intermediate data spills to disk).')
+
+    parser_pipeline = subparsers.add_parser('pipeline', help='Applies the threshold and consolidates the results in one run, without intermediate files.')
+    parser_pipeline.add_argument('entrada', metavar='INPUT', help='Table with metabarcoding results after Blast.')
+    parser_pipeline.add_argument('-p', '--threshold', dest='threshold_perc', type=float, default=0.05, help='Threshold percentage (default: 0.05).')
+    parser_pipeline.add_argument('-c', '--curation', dest='curadoria',
+                                 help='Table with the assigned taxon in the first column and the curated taxon in the second '
+                                      '(unlisted taxa keep their name, taxa curated to an empty value are removed).')
+    parser_pipeline.add_argument('-g', '--general-list', dest='lista_geral', required=True, help='Output table with the general list.')
+    parser_pipeline.add_argument('-r', '--results', dest='resultados', help='Output for the tables by sampler and/or area (.xlsx, .zip or columnar).')
+    parser_pipeline.add_argument('--by-sampler', dest='amostradores', action='store_true', help='Filters by samplers.')
+    parser_pipeline.add_argument('--by-area', dest='areas', action='store_true', help='Filters by areas.')
+    parser_pipeline.add_argument('--samplers', dest='lista_amostradores', nargs='+', default=[], metavar='SAMPLER',
+                                 help='Designations for the samplers.')
+    parser_pipeline.add_argument('-s', '--selected', dest='selecionados', help='Optional output with the curated selected OTUs/ASVs.')
+    parser_pipeline.add_argument('-d', '--deleted', dest='nao_selecionados', help='Optional output with the deleted OTUs/ASVs.')
+    parser_pipeline.add_argument('-t', '--thresholds', dest='thresholds', help='Optional output with the thresholds per sequencing sample.')
+    parser_pipeline.add_argument('--compression', dest='compressao', choices=list(COMPRESSOES_CLI), default='stored',
+                                 help='Compression of .zip results (default: stored).')
+    parser_pipeline.add_argument('--level', dest='nivel_compressao', type=int, help='Compression level of .zip results.')
+    parser_pipeline.add_argument('--progress', dest='progresso', action='store_true',
+                                 help='Prints the progress events to stderr, one JSON object per line.')
+    parser_pipeline.add_argument('--run-log', dest='log_execucao',
+                                 help='JSON file with the wall time, CPU time, peak memory and rows of each stage.')
+    parser_pipeline.add_argument('--profile', dest='perfil', help='File where the cProfile statistics of the run are saved.')
+    parser_pipeline.add_argument('--engine', dest='motor', choices=['pandas', 'polars'], default=MOTOR_PROCESSAMENTO,
+                                 help=f'Engine of the grouped aggregations (default: {MOTOR_PROCESSAMENTO}; polars needs the polars package).')
+
+    parser_compacta = subparsers.add_parser('compact', help='Converts a table to the compact .otus format, opened memory-mapped by the other commands.')
+    parser_compacta.add_argument('entrada', metavar='INPUT', help='Table to convert.')
+    parser_compacta.add_argument('-o', '--output', dest='saida', required=True, help='Output .otus file.')
+
+    parser_lote = subparsers.add_parser('batch', help='Runs the stages on every file of directories or glob patterns in parallel.')
+    parser_lote.add_argument('entradas', metavar='INPUT', nargs='+', help='Input files, directories or glob patterns.')
+    parser_lote.add_argument('-o', '--output-dir', dest='pasta_saida', required=True, help='Folder where the outputs are saved.')
+    parser_lote.add_argument('--stages', dest='etapas', nargs='+', choices=['threshold', 'consolidate'], default=['threshold'],
+                             help='Stages to run on every file (default: threshold).')
+    parser_lote.add_argument('-j', '--workers', dest='trabalhadores', type=int, help='Number of worker processes (default: number of processors).')
+    parser_lote.add_argument('--template', dest='modelo_nome', default='{nome}_{saida}',
+                             help='Output name template with the {nome} (input name) and {saida} (output kind) fields (default: {nome}_{saida}).')
+    parser_lote.add_argument('--format', dest='formato', choices=['xlsx', 'csv', 'parquet', 'feather', 'arrow'], default='xlsx',
+                             help='Output format (default: xlsx; results by sampler/area are saved as .zip for csv).')
+    parser_lote.add_argument('-p', '--threshold', dest='threshold_perc', type=float, default=0.05, help='Threshold percentage (default: 0.05).')
+    parser_lote.add_argument('--by-sampler', dest='amostradores', action='store_true', help='Filters by samplers in the consolidation.')
+    parser_lote.add_argument('--by-area', dest='areas', action='store_true', help='Filters by areas in the consolidation.')
+    parser_lote.add_argument('--samplers', dest='lista_amostradores', nargs='+', default=[], metavar='SAMPLER',
+                             help='Designations for the samplers.')
+    parser_lote.add_argument('--compression', dest='compressao', choices=list(COMPRESSOES_CLI), default='stored',
+                             help='Compression of .zip results (default: stored).')
+    parser_lote.add_argument('--level', dest='nivel_compressao', type=int, help='Compression level of .zip results.')
+    parser_lote.add_argument('--summary', dest='resumo', help='Output table with the runtime and status of each file.')
+
+    return parser
+
+
+def main(argv=None):
+    """Runs the program from the command line.
+
+    Parameters:
+    argv (list): Command line arguments (sys.argv is used when None).
+
+    Returns:
+    codigo (int): Exit status, 0 on success.
+    """
+    parser = cria_parser()
+    argumentos = parser.parse_args(argv)
+
+    if argumentos.comando == 'threshold':
+        if argumentos.varredura and not argumentos.saida_varredura:
+            parser.error('--sweep requires --sweep-output')
+        aplica = argumentos.selecionados or argumentos.nao_selecionados or argumentos.thresholds or argumentos.streaming
+        if (aplica or not argumentos.varredura) and not (argumentos.selecionados and argumentos.nao_selecionados):
+            parser.error('the following arguments are required: -s/--selected, -d/--deleted (unless only --sweep is run)')
+        if argumentos.streaming and any(os.path.splitext(caminho)[1].lower() != '.csv'
+                                        for caminho in (argumentos.selecionados, argumentos.nao_selecionados)):
+            parser.error('--streaming writes CSV, so --selected and --deleted must be .csv files')
+    elif argumentos.comando in ('consolidate', 'pipeline'):
+        if argumentos.amostradores and not argumentos.lista_amostradores:
+            parser.error('--by-sampler requires --samplers')
+        if (argumentos.amostradores or argumentos.areas) and not argumentos.resultados:
+            parser.error('--by-sampler and --by-area require --results')
+    elif argumentos.comando == 'batch':
+        if argumentos.amostradores and not argumentos.lista_amostradores:
+            parser.error('--by-sampler requires --samplers')
+    elif argumentos.comando == 'compact':
+        if EXTENSAO_COMPACTA not in argumentos.saida:
+            parser.error(f'the output of compact must be a {EXTENSAO_COMPACTA} file')
+    if getattr(argumentos, 'motor', 'pandas') not in MOTORES_PROCESSAMENTO:
+        parser.error(f'--engine {argumentos.motor} requires the {argumentos.motor} package')
+    if getattr(argumentos, 'limite_memoria', None):
+        if argumentos.motor != 'duckdb':
+            parser.error('--memory-limit requires --engine duckdb')
+
+    progresso = None
+    if getattr(argumentos, 'progresso', False):
+        def progresso(evento):
+            print(json.dumps(evento), file=sys.stderr, flush=True)
+
+    instrumentacao = None
+    if getattr(argumentos, 'log_execucao', None) or getattr(argumentos, 'perfil', None):
+        instrumentacao = Instrumentacao(perfil=bool(argumentos.perfil))
+
+    try:
+        if argumentos.comando == 'threshold':
+            if argumentos.selecionados:
+                processa_threshold(argumentos.entrada, argumentos.threshold_perc, argumentos.selecionados, argumentos.nao_selecionados,
+                                   argumentos.thresholds, streaming=argumentos.streaming, progresso=progresso,
+                                   instrumentacao=instrumentacao, motor=argumentos.motor)
+            if argumentos.varredura:
+                df = normaliza_tabela(le_tabela(argumentos.entrada))
+                salva_tabela(varredura_threshold(df, argumentos.varredura), argumentos.saida_varredura, index=False)
+
+        elif argumentos.comando == 'consolidate':
+            processa_consolidacao(argumentos.entrada, argumentos.lista_geral, argumentos.resultados, argumentos.lista_amostradores,
+                                  amostradores=argumentos.amostradores, areas=argumentos.areas,
+                                  compressao=COMPRESSOES_CLI[argumentos.compressao], nivel_compressao=argumentos.nivel_compressao,
+                                  progresso=progresso, instrumentacao=instrumentacao, motor=argumentos.motor,
+                                  limite_memoria=argumentos.limite_memoria)
+
+        elif argumentos.comando == 'pipeline':
+            processa_pipeline(argumentos.entrada, argumentos.threshold_perc, argumentos.lista_geral, argumentos.resultados,
+                              argumentos.curadoria, argumentos.lista_amostradores, amostradores=argumentos.amostradores,
+                              areas=argumentos.areas, caminho_selecionados=argumentos.selecionados,
+                              caminho_nao_selecionados=argumentos.nao_selecionados, caminho_thresholds=argumentos.thresholds,
+                              compressao=COMPRESSOES_CLI[argumentos.compressao], nivel_compressao=argumentos.nivel_compressao,
+                              progresso=progresso, instrumentacao=instrumentacao, motor=argumentos.motor)
+
+        elif argumentos.comando == 'compact':
+            salva_tabela(le_tabela(argumentos.entrada), argumentos.saida)
+
+        elif argumentos.comando == 'batch':
+            caminhos = lista_entradas(argumentos.entradas)
+            if not caminhos:
+                parser.error('no input files found')
+
+            inicio = time.perf_counter()
+            df_resumo = processa_lote(caminhos, argumentos.etapas, argumentos.pasta_saida, argumentos.trabalhadores,
+                                      modelo_nome=argumentos.modelo_nome, formato=argumentos.formato,
+                                      threshold_perc=argumentos.threshold_perc, lista_amostradores=argumentos.lista_amostradores,
+                                      amostradores=argumentos.amostradores, areas=argumentos.areas,
+                                      compressao=COMPRESSOES_CLI[argumentos.compressao], nivel_compressao=argumentos.nivel_compressao)
+            tempo_total = time.perf_counter() - inicio
+
+            print(df_resumo.to_string(index=False))
+            falhas = int((df_resumo['Status'] == 'error').sum())
+            print(f'{len(df_resumo) - falhas} succeeded, {falhas} failed in {tempo_total:.2f} s')
+            if argumentos.resumo:
+                salva_tabela(df_resumo, argumentos.resumo, index=False)
+            if falhas:
+                return 1
+
+        if instrumentacao is not None:
+            if argumentos.log_execucao:
+                instrumentacao.salva(argumentos.log_execucao, argumentos.perfil, comando=argumentos.comando, entrada=argumentos.entrada)
+            else:
+                instrumentacao.perfil.dump_stats(argumentos.perfil)
+
+    except ValueError as e:
+        print(f'{parser.prog}: error: {e}', file=sys.stderr)
+        return 1
+    except KeyError as e:
+        print(f'{parser.prog}: error: column or sampler not found in the table: {e}', file=sys.stderr)
+        return 1
+    except FileNotFoundError as e:
+        print(f'{parser.prog}: error: {e}', file=sys.stderr)
+        return 1
+
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())